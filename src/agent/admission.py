@@ -0,0 +1,219 @@
+"""
+Admission control for agent requests - bounded concurrency with a bounded wait queue.
+
+At most `max_concurrency` agent runs execute at once. Further requests wait in a queue
+of at most `max_queue` entries; when the queue is full, or a request waits too long,
+it is rejected straight away with a Retry-After hint instead of piling more LLM and MCP
+calls onto an overloaded server. Every admitted run gets a deadline after which it is
+cancelled, and `DisconnectWatcher` cancels runs whose client has gone away.
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from metrics import Counter, Histogram
+
+T = TypeVar("T")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an admitted agent run takes longer than the request deadline"""
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before its agent run finished"""
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded wait queue and per-request deadline"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout_seconds: float,
+        deadline_seconds: float
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Metrics
+        self.waiting = 0
+        self.waiting_background = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+        self.deadline_exceeded = 0
+        self.queue_time = Histogram()
+        self.run_time = Histogram()
+
+    def retry_after(self) -> int:
+        """Estimate in seconds when a rejected client should try again"""
+        backlog = (self.waiting + self.running) / self.max_concurrency
+        return max(1, math.ceil(backlog * self.run_time.mean))
+
+    async def acquire(self, background: bool = False) -> float:
+        """Wait for a free slot, returning the time the run was admitted
+
+        Background work (jobs) already waited in a bounded queue of its own: it waits for
+        a slot as long as it takes and doesn't use up the queue of interactive requests.
+        """
+        queued_at = time.monotonic()
+        if background:
+            self.waiting_background += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting_background -= 1
+        else:
+            # Counters rather than the semaphore state: they are updated before any await
+            if self.waiting + self.running >= self.max_concurrency + self.max_queue:
+                self.rejected["queue_full"] += 1
+                raise AdmissionRejected(429, "Too many requests in the queue, please retry later", self.retry_after())
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                self.rejected["queue_timeout"] += 1
+                raise AdmissionRejected(503, "Server is busy, please retry later", self.retry_after())
+            finally:
+                self.waiting -= 1
+
+        admitted_at = time.monotonic()
+        self.queue_time.observe(admitted_at - queued_at)
+        self.running += 1
+        self.admitted += 1
+        return admitted_at
+
+    def release(self, admitted_at: float) -> None:
+        """Free the slot taken by `acquire`"""
+        self.run_time.observe(time.monotonic() - admitted_at)
+        self.running -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a concurrency slot for the duration of the block"""
+        admitted_at = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(admitted_at)
+
+    @asynccontextmanager
+    async def deadline(self):
+        """Cancel the block when it runs past the request deadline"""
+        try:
+            async with asyncio.timeout(self.deadline_seconds):
+                yield
+        except TimeoutError:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded(f"Request took longer than {self.deadline_seconds:g}s")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue and run metrics"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            "waiting_background": self.waiting_background,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "deadline_exceeded": self.deadline_exceeded,
+            "queue_time_seconds": self.queue_time.snapshot(),
+            "run_time_seconds": self.run_time.snapshot()
+        }
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Streaming response that frees its admission slot when it is done sending, however that ends
+
+    The slot is taken before the response starts, so a rejection can still be a 429/503.
+    Freeing it here rather than in the body generator also covers a client that goes away
+    before the generator is first iterated, when the generator's own cleanup never runs.
+    """
+
+    def __init__(self, content: Any, admission: AdmissionController, admitted_at: float, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+        self.admitted_at = admitted_at
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.admission.release(self.admitted_at)
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+class DisconnectWatcher:
+    """Cancels agent runs whose HTTP client disconnected, and counts the work saved"""
+
+    def __init__(self, poll_seconds: float, typical_run_seconds: Callable[[], float]):
+        self.poll_seconds = poll_seconds
+        self.typical_run_seconds = typical_run_seconds
+
+        # Metrics
+        self.cancelled = Counter(("endpoint",))
+        self.run_time = Histogram()
+        self.estimated_seconds_saved = 0.0
+
+    def record(self, endpoint: str, started: float) -> None:
+        """Count a run cancelled after running since `started`"""
+        seconds = time.monotonic() - started
+        self.cancelled.inc(endpoint)
+        self.run_time.observe(seconds)
+        # What the run would probably still have spent on LLM and tool calls
+        self.estimated_seconds_saved += max(self.typical_run_seconds() - seconds, 0.0)
+
+    async def run(self, request: Request, endpoint: str, work: Awaitable[T]) -> T:
+        """Await `work`, cancelling it (and raising ClientDisconnected) if the client disconnects first"""
+        started = time.monotonic()
+        task = asyncio.ensure_future(work)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.poll_seconds)
+                if done:
+                    return task.result()
+                if await request.is_disconnected():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    self.record(endpoint, started)
+                    raise ClientDisconnected()
+        finally:
+            # The handler itself was cancelled, e.g. at shutdown
+            if not task.done():
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cancelled": {labels[0]: int(count) for labels, count in self.cancelled.values.items()},
+            "run_seconds_before_cancel": self.run_time.snapshot(),
+            "estimated_seconds_saved": round(self.estimated_seconds_saved, 3)
+        }
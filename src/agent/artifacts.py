@@ -0,0 +1,231 @@
+"""
+Artifact store - keeps large tool results out of the LLM context.
+
+Some tools return far more than the model needs to read at once: `search_attractions`
+can return a hundred full records, `get_endorsements` returns the list twice (as data
+and as `formatted_display`) and `retrieve_saved_packing_list` the whole file. Results
+over a size threshold are stored here and the LLM gets a compact summary with a handle
+instead; the `read_artifact` tool lets it page through the full text when it needs to.
+
+Handles are derived from the tool name and content, so repeated identical results share
+one artifact.
+
+The store also measures each agent turn: its prompt tokens and LLM time, split by
+whether any result was offloaded during the turn, and for turns that offloaded, the
+prompt tokens the turn would have used with the full results inlined.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from pydantic import BaseModel, Field
+
+from callbacks import TOKEN_BUCKETS, RequestMetricsHandler
+from metrics import Histogram
+from tool_wrappers import ToolCall, wrap_tool
+
+READ_ARTIFACT_TOOL = "read_artifact"
+
+OFFLOADED = "offloaded"
+NOT_OFFLOADED = "not_offloaded"
+
+
+@dataclass
+class ArtifactTurn:
+    """Results offloaded during one agent turn"""
+    usage: RequestMetricsHandler
+    # (tokens kept out of the prompt, LLM calls the turn had made before) per offloaded result
+    offloads: List[Tuple[int, int]] = field(default_factory=list)
+
+
+# The turn being answered, for the tool wrapper (tool calls run in tasks copying the context)
+current_turn: ContextVar[Optional[ArtifactTurn]] = ContextVar("current_artifact_turn", default=None)
+
+
+def result_text(result: Any) -> Tuple[str, Any]:
+    """Split a tool result into its text and the (content_and_artifact) artifact part"""
+    content, artifact = result if isinstance(result, tuple) and len(result) == 2 else (result, None)
+    if isinstance(content, list):
+        content = "\n".join(str(part) for part in content)
+    return (content if isinstance(content, str) else json.dumps(content, default=str)), artifact
+
+
+def describe_value(value: Any, names_limit: int = 20) -> List[str]:
+    """Short outline of a JSON value: sizes of lists, keys of objects, names of items"""
+    if isinstance(value, list):
+        lines = [f"list of {len(value)} items"]
+        if value and isinstance(value[0], dict):
+            lines.append(f"item fields: {', '.join(value[0].keys())}")
+            names = [str(item.get("name") or item.get("id")) for item in value[:names_limit] if isinstance(item, dict)]
+            if any(name != "None" for name in names):
+                more = f" (+{len(value) - names_limit} more)" if len(value) > names_limit else ""
+                lines.append(f"items: {', '.join(names)}{more}")
+        return lines
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            if isinstance(item, list):
+                lines.append(f"{key}: {len(item)} items")
+                lines.extend(f"  {line}" for line in describe_value(item, names_limit)[1:])
+            elif isinstance(item, dict):
+                lines.append(f"{key}: object with keys {', '.join(item.keys())}")
+            elif isinstance(item, str) and len(item) > 120:
+                lines.append(f"{key}: text of {len(item)} characters")
+            else:
+                lines.append(f"{key}: {json.dumps(item, default=str)}")
+        return lines
+    return []
+
+
+class ReadArtifactInput(BaseModel):
+    handle: str = Field(description="Artifact handle from a tool result, e.g. art_1a2b3c4d5e6f")
+    offset: int = Field(default=0, description="Character offset to start reading from")
+    limit: Optional[int] = Field(default=None, description="Number of characters to read (default: one page)")
+
+
+class ArtifactStore:
+    """LRU store of large tool results, with a TTL"""
+
+    def __init__(self, threshold_chars: int, preview_chars: int, page_chars: int, max_entries: int, ttl_seconds: float):
+        self.threshold_chars = threshold_chars
+        self.preview_chars = preview_chars
+        self.page_chars = page_chars
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+
+        # Metrics
+        self.stored: Dict[str, int] = {}
+        self.chars_offloaded = 0
+        self.reads = 0
+        self.misses = 0
+        self.turn_prompt_tokens = {kind: Histogram(TOKEN_BUCKETS) for kind in (OFFLOADED, NOT_OFFLOADED)}
+        self.turn_llm_seconds = {kind: Histogram() for kind in (OFFLOADED, NOT_OFFLOADED)}
+        # Prompt tokens of offloading turns had the full results been inlined
+        self.turn_prompt_tokens_inlined = Histogram(TOKEN_BUCKETS)
+
+    def put(self, tool_name: str, text: str) -> str:
+        """Store a result and return its handle"""
+        handle = "art_" + hashlib.sha256(f"{tool_name}\0{text}".encode()).hexdigest()[:12]
+        self._entries[handle] = (time.monotonic() + self.ttl_seconds, tool_name, text)
+        self._entries.move_to_end(handle)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        entry = self._entries.get(handle)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(handle, None)
+            return None
+        self._entries.move_to_end(handle)
+        return entry[2]
+
+    def summarize(self, tool_name: str, handle: str, text: str) -> str:
+        """What the LLM sees instead of a stored result"""
+        try:
+            outline = describe_value(json.loads(text))
+        except ValueError:
+            outline = [f"{text.count(chr(10)) + 1} lines of text"]
+        preview = text[:self.preview_chars]
+        return "\n".join([
+            f"[{tool_name} returned {len(text)} characters, stored as artifact {handle}]",
+            *outline,
+            f"Preview:\n{preview}{'...' if len(text) > len(preview) else ''}",
+            f"Call {READ_ARTIFACT_TOOL} with handle \"{handle}\" and offset {len(preview)} to read more."
+        ])
+
+    def read(self, handle: str, offset: int = 0, limit: Optional[int] = None) -> str:
+        """One page of a stored result"""
+        text = self.get(handle)
+        if text is None:
+            self.misses += 1
+            raise ToolException(f"Artifact {handle} not found or expired; call the original tool again")
+        self.reads += 1
+        offset = max(offset, 0)
+        end = min(offset + min(limit or self.page_chars, self.page_chars), len(text))
+        page = text[offset:end]
+        footer = (f"[characters {offset}-{end} of {len(text)}; next offset {end}]" if end < len(text)
+                  else f"[characters {offset}-{end} of {len(text)}; end of artifact]")
+        return f"{page}\n{footer}"
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """Return a copy of `tool` whose large results are stored here and summarized"""
+
+        async def offload_large_result(tool_name: str, arguments: Dict[str, Any], call_next: ToolCall) -> Any:
+            result = await call_next(arguments)
+            text, artifact = result_text(result)
+            if len(text) <= self.threshold_chars:
+                return result
+            handle = self.put(tool_name, text)
+            self.stored[tool_name] = self.stored.get(tool_name, 0) + 1
+            summary = self.summarize(tool_name, handle, text)
+            self.chars_offloaded += len(text) - len(summary)
+            turn = current_turn.get()
+            if turn is not None:
+                turn.offloads.append(((len(text) - len(summary)) // 4, turn.usage.llm_calls))
+            return (summary, artifact) if tool.response_format == "content_and_artifact" else summary
+
+        return wrap_tool(tool, offload_large_result)
+
+    def start_turn(self, usage: RequestMetricsHandler) -> ArtifactTurn:
+        """Start measuring an agent turn; results offloaded in this context are added to it"""
+        turn = ArtifactTurn(usage)
+        current_turn.set(turn)
+        return turn
+
+    def finish_turn(self, turn: ArtifactTurn) -> None:
+        """Record a finished turn's prompt tokens and LLM time"""
+        if current_turn.get() is turn:
+            current_turn.set(None)
+        usage = turn.usage
+        kind = OFFLOADED if turn.offloads else NOT_OFFLOADED
+        self.turn_prompt_tokens[kind].observe(usage.prompt_tokens)
+        self.turn_llm_seconds[kind].observe(usage.llm_seconds)
+        if turn.offloads:
+            # Every LLM call after an offload would have read the whole result again
+            inlined = sum(tokens * max(usage.llm_calls - calls_before, 0) for tokens, calls_before in turn.offloads)
+            self.turn_prompt_tokens_inlined.observe(usage.prompt_tokens + inlined)
+
+    def read_tool(self) -> BaseTool:
+        """Tool for the LLM to page through a stored result"""
+
+        async def read_artifact(handle: str, offset: int = 0, limit: Optional[int] = None) -> str:
+            return self.read(handle.strip(), offset, limit)
+
+        return StructuredTool(
+            name=READ_ARTIFACT_TOOL,
+            description=(
+                "Read part of a large tool result that was stored as an artifact. "
+                f"Returns up to {self.page_chars} characters starting at `offset`."
+            ),
+            args_schema=ReadArtifactInput,
+            coroutine=read_artifact,
+            handle_tool_error=True
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "stored": sum(self.stored.values()),
+            "per_tool": dict(self.stored),
+            "reads": self.reads,
+            "expired_reads": self.misses,
+            # ~4 characters per token, like the memory's estimate
+            "estimated_tokens_offloaded": self.chars_offloaded // 4,
+            "turns": {
+                kind: {
+                    "prompt_tokens": self.turn_prompt_tokens[kind].snapshot(),
+                    "llm_seconds": self.turn_llm_seconds[kind].snapshot()
+                }
+                for kind in (OFFLOADED, NOT_OFFLOADED)
+            },
+            # The same offloading turns with their results inlined, estimated
+            "offloaded_turns_estimated_prompt_tokens_inlined": self.turn_prompt_tokens_inlined.snapshot()
+        }
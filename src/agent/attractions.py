@@ -8,6 +8,7 @@ import os
 from dotenv import load_dotenv
 import asyncio
 import json
+from contextlib import asynccontextmanager
 import requests
 from typing import Dict, Any, List
 
@@ -16,12 +17,105 @@ from langchain_openai import ChatOpenAI, AzureChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
 
 # Official MCP adapter imports for HTTP transport
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_mcp_adapters.tools import load_mcp_tools
 
+from config import (
+    DEFAULT_SESSION_ID,
+    SESSION_MAX_COUNT,
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MAX_TOTAL_BYTES,
+    TOOL_CACHE_ENABLED,
+    TOOL_CACHE_MAX_ENTRIES,
+    TOOL_CACHE_DEFAULT_TTL_SECONDS,
+    TOOL_CACHE_TTL_SECONDS,
+    TOOL_CACHE_NO_CACHE,
+    TOOL_CACHE_INVALIDATES,
+    TOOL_CASE_INSENSITIVE_ARGUMENTS,
+    MCP_SERVER_URLS,
+    MCP_TOOL_MODE,
+    MCP_SERVER_DIRS,
+    MCP_INPROCESS_SERVERS,
+    MCP_INPROCESS_THREADED_SERVERS,
+    MCP_DISCOVERY_TIMEOUT_SECONDS,
+    MCP_DISCOVERY_RETRY_SECONDS,
+    MCP_DISCOVERY_MAX_RETRY_SECONDS,
+    MCP_SCHEMA_CACHE_ENABLED,
+    MCP_SCHEMA_CACHE_PATH,
+    ARTIFACT_STORE_ENABLED,
+    ARTIFACT_THRESHOLD_CHARS,
+    ARTIFACT_PREVIEW_CHARS,
+    ARTIFACT_PAGE_CHARS,
+    ARTIFACT_MAX_ENTRIES,
+    ARTIFACT_TTL_SECONDS,
+    TOOL_SELECTION_ENABLED,
+    TOOL_SELECTION_MIN_SCORE,
+    TOOL_SELECTION_RELATIVE_THRESHOLD,
+    TOOL_SELECTION_COMPANIONS,
+    TOOL_EXECUTION_MODE,
+    TOOL_MAX_CONCURRENCY_PER_STEP,
+    TOOL_TIMEOUT_SECONDS,
+    TOOL_TIMEOUTS,
+    BREAKER_ENABLED,
+    BREAKER_WINDOW_SIZE,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATE,
+    BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_SLOW_CALL_RATE,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_CALLS,
+    AGENT_TIME_BUDGET_SECONDS,
+    AGENT_ANSWER_RESERVE_SECONDS,
+    AGENT_MAX_ITERATIONS,
+    ROUTER_ENABLED,
+    MEMORY_TOKEN_BUDGET,
+    MEMORY_KEEP_LAST_TURNS,
+    CHAT_HISTORY_BACKEND,
+    CHAT_HISTORY_SQLITE_PATH,
+    CHAT_HISTORY_PAGE_SIZE,
+    LOG_SAMPLE_RATE,
+    AGENT_VERBOSE,
+    LLM_PROVIDER,
+    SCRIPTED_LLM_LATENCY_SECONDS,
+    LLM_DEPLOYMENTS,
+    LLM_ROUTER_WINDOW_SIZE,
+    LLM_ROUTER_STALE_SECONDS,
+    LLM_BREAKER_MIN_CALLS,
+    LLM_BREAKER_FAILURE_RATE,
+    LLM_BREAKER_SLOW_CALL_SECONDS,
+    LLM_BREAKER_OPEN_SECONDS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SECONDS,
+    TRACE_RECORD_PATH,
+    TRACE_REPLAY_PATH,
+    TRACE_REPLAY_TOOLS,
+    TRACE_REPLAY_SIMULATE_LATENCY,
+    BATCH_MAX_CONCURRENCY,
+    PREFETCH_ENABLED,
+    PREFETCH_MAX_PLACES
+)
+from artifacts import ArtifactStore
+from breaker import ServerBreakers
+from callbacks import AgentMetrics, RequestMetricsHandler, TokenStats
+from discovery import ToolDiscovery
+from executor import StepStats, ToolStepExecutor
+from history import InMemoryChatStore, InMemorySessionHistory, SQLiteChatStore
+from inprocess import INPROCESS
+from llm_router import DeploymentPool, RoutingChatModel, create_deployment_model
+from memory import RollingSummaryMemory
+from metrics import MetricsRegistry, SampledLogger
+from prefetch import Prefetcher
+from router import IntentRouter
+from schema_cache import ToolSchemaCache
+from scripted_llm import ScriptedChatModel
+from sessions import Session, SessionManager
+from tool_cache import ToolResultCache
+from tool_selection import ToolSelector
+from traces import ReplayChatModel, Trace, TraceRecorder, recorded_tools
+
 # Load environment variables
 load_dotenv()
 
@@ -30,47 +124,123 @@ print("✅ Updated imports with official MCP adapter loaded successfully!")
 # MCP Client Setup using Official Adapter with HTTP Transport
 import subprocess
 import time
+import uuid
 
 # Global MCP client for HTTP
 mcp_client = None
 
+# Results of read-only MCP tool calls, shared by all sessions
+tool_cache = ToolResultCache(
+    max_entries=TOOL_CACHE_MAX_ENTRIES,
+    default_ttl_seconds=TOOL_CACHE_DEFAULT_TTL_SECONDS,
+    ttl_seconds=TOOL_CACHE_TTL_SECONDS,
+    no_cache=TOOL_CACHE_NO_CACHE,
+    invalidates=TOOL_CACHE_INVALIDATES,
+    case_insensitive=TOOL_CASE_INSENSITIVE_ARGUMENTS
+)
+
+# Global MCP tool discovery across all configured servers
+tool_discovery = None
+
+# Request traces: recording to TRACE_RECORD_PATH, and the trace being replayed with LLM_PROVIDER=replay
+trace_recorder = TraceRecorder(TRACE_RECORD_PATH) if TRACE_RECORD_PATH else None
+trace_replay = Trace.load(TRACE_REPLAY_PATH) if LLM_PROVIDER == "replay" else None
+
+# Circuit breakers that fail a sick MCP server's tools fast instead of waiting out timeouts
+server_breakers = ServerBreakers(
+    window_size=BREAKER_WINDOW_SIZE,
+    min_calls=BREAKER_MIN_CALLS,
+    failure_rate=BREAKER_FAILURE_RATE,
+    slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+    slow_call_rate=BREAKER_SLOW_CALL_RATE,
+    open_seconds=BREAKER_OPEN_SECONDS,
+    half_open_calls=BREAKER_HALF_OPEN_CALLS
+) if BREAKER_ENABLED else None
+
+# Azure OpenAI settings shared by the deployments in LLM_DEPLOYMENTS
+AZURE_DEFAULTS = {
+    "deployment_name": os.getenv("DEPLOYMENT_NAME"),
+    "api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+    "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+    "api_version": os.getenv("AZURE_API_VERSION"),
+    "temperature": 1,
+    "stream_usage": True
+}
+
+# LLM deployments the agent's calls are routed between, when more than one is configured
+llm_pool = DeploymentPool(
+    [(deployment.get("name") or f"deployment-{index}", create_deployment_model(deployment, AZURE_DEFAULTS))
+     for index, deployment in enumerate(LLM_DEPLOYMENTS)],
+    window_size=LLM_ROUTER_WINDOW_SIZE,
+    stale_seconds=LLM_ROUTER_STALE_SECONDS,
+    hedge=LLM_HEDGE_ENABLED,
+    hedge_percentile=LLM_HEDGE_PERCENTILE,
+    hedge_min_seconds=LLM_HEDGE_MIN_SECONDS,
+    min_calls=LLM_BREAKER_MIN_CALLS,
+    failure_rate=LLM_BREAKER_FAILURE_RATE,
+    slow_call_seconds=LLM_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=LLM_BREAKER_OPEN_SECONDS
+) if LLM_DEPLOYMENTS and LLM_PROVIDER == "azure" else None
+
+# Large tool results are stored here and the LLM reads them in pages
+artifact_store = ArtifactStore(
+    threshold_chars=ARTIFACT_THRESHOLD_CHARS,
+    preview_chars=ARTIFACT_PREVIEW_CHARS,
+    page_chars=ARTIFACT_PAGE_CHARS,
+    max_entries=ARTIFACT_MAX_ENTRIES,
+    ttl_seconds=ARTIFACT_TTL_SECONDS
+) if ARTIFACT_STORE_ENABLED else None
+# Tools the LLM always gets on top of the MCP tools
+builtin_tools = [artifact_store.read_tool()] if artifact_store else []
+
+# Picks the tools sent to the LLM for each message
+tool_selector = ToolSelector(
+    min_score=TOOL_SELECTION_MIN_SCORE,
+    relative_threshold=TOOL_SELECTION_RELATIVE_THRESHOLD,
+    companions=TOOL_SELECTION_COMPANIONS
+) if TOOL_SELECTION_ENABLED else None
+# Starts the tool calls a message probably needs before the LLM asks for them
+prefetcher = Prefetcher(
+    lambda: direct_tools,
+    max_places=PREFETCH_MAX_PLACES,
+    timeout_seconds=TOOL_TIMEOUT_SECONDS,
+    case_insensitive=TOOL_CASE_INSENSITIVE_ARGUMENTS
+) if PREFETCH_ENABLED else None
+# Agents bound to a subset of the tools, by tool names; rebuilt when the tools change
+subset_agents = {}
+
 async def create_mcp_tools():
     """Create MCP tools using the official LangChain MCP adapter with HTTP transport"""
-    global mcp_client
-
-    try:
-        # Create MultiServerMCPClient with streamable_http transport
-        mcp_client = MultiServerMCPClient({
-            "attractions": {
-                "transport": "streamable_http",
-                "url": os.getenv("ATTRACTIONS_MCP_URL")
-            },
-            "weather": {
-                "transport": "streamable_http",
-                "url": os.getenv("WEATHER_MCP_URL")
-            },
-            "packing_list": {
-                "transport": "streamable_http",
-                "url": os.getenv("PACKING_LIST_MCP_URL")
-            },
-            "endorsements": {
-                "transport": "streamable_http",
-                "url": os.getenv("ENDORSEMENTS_MCP_URL")
-            },
-            "persist": {
-                "transport": "streamable_http",
-                "url": os.getenv("PERSIST_PACKING_LIST_MCP_URL")
-            }
-        })
-
-        # Get tools from the MCP server
-        tools = await mcp_client.get_tools()
-        print(f"Loaded {len(tools)} MCP tools: {[tool.name for tool in tools]}")
-        return tools
+    global mcp_client, tool_discovery
+
+    # Create MultiServerMCPClient with streamable_http transport, one connection per configured server
+    connections = {
+        name: {"transport": "streamable_http", "url": url}
+        for name, url in MCP_SERVER_URLS.items() if url
+    }
+    if MCP_TOOL_MODE == INPROCESS:
+        # Bundled servers run inside the agent process instead
+        for name in MCP_INPROCESS_SERVERS:
+            if name in MCP_SERVER_DIRS:
+                connections[name] = {
+                    "transport": INPROCESS,
+                    "path": MCP_SERVER_DIRS[name],
+                    "threaded": name in MCP_INPROCESS_THREADED_SERVERS
+                }
+    tool_discovery = ToolDiscovery(
+        connections,
+        timeout_seconds=MCP_DISCOVERY_TIMEOUT_SECONDS,
+        retry_seconds=MCP_DISCOVERY_RETRY_SECONDS,
+        max_retry_seconds=MCP_DISCOVERY_MAX_RETRY_SECONDS,
+        on_tools_changed=update_agent_tools,
+        schema_cache=ToolSchemaCache(MCP_SCHEMA_CACHE_PATH) if MCP_SCHEMA_CACHE_ENABLED else None
+    )
+    mcp_client = tool_discovery.client
 
-    except Exception as e:
-        print(f"Error connecting to MCP HTTP server: {e}")
-        return []
+    # Get tools from all MCP servers at once (cached schemas first); failed servers are retried in the background
+    tools = await tool_discovery.discover()
+    print(f"Loaded {len(tools)} MCP tools: {[tool.name for tool in tools]}")
+    return tools
 
 print("🔗 MCP HTTP adapter setup ready!")
 
@@ -79,32 +249,9 @@ print("🔗 MCP HTTP adapter setup ready!")
 # No need to manually create tool wrappers - the adapter handles this automatically
 print("🛠️ Ready to load MCP tools via official adapter!")
 
-async def setup_agent():
-    """Setup LangChain agent with MCP tools using official adapter"""
-
-    # Initialize LLM for Azure OpenAI
-    # can get this from Azure Open Ai service -> Azure Ai Foundary Portal
-    from langchain_openai import AzureChatOpenAI
-
-    llm = AzureChatOpenAI(
-        deployment_name=os.getenv("DEPLOYMENT_NAME"),  # Your Azure deployment name
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_version=os.getenv("AZURE_API_VERSION"),
-        temperature=1
-    )
-
-    # Load MCP tools using official adapter
-    tools = await create_mcp_tools()
-
-    if not tools:
-        print("No MCP tools loaded. Make sure the MCP server is accessible.")
-        return None
-
-    print(f"Loaded {len(tools)} MCP tools: {[tool.name for tool in tools]}")
-
-    # Create system prompt
-    system_prompt = """You are a helpful travel assistant that can help users find and book attractions including weather.
+# Fixed text, the same for every request: it starts every prompt (after the tool schemas), and
+# providers only reuse a cached prompt prefix that matches byte for byte. Nothing per-request goes here.
+SYSTEM_PROMPT = """You are a helpful travel assistant that can help users find and book attractions including weather.
 
     You have access to multiple MCP tools for tourist attractions, including:
     - Searching for attractions by location and category
@@ -124,92 +271,515 @@ async def setup_agent():
     to give endorsements after you have spoken to them. You should give the users the list of endorsers if you ask for it.
     """
 
-    # Create prompt template
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
+async def setup_agent():
+    """Setup LangChain agent with MCP tools using official adapter"""
+
+    global agent_llm, agent_prompt
+
+    if LLM_PROVIDER == "scripted":
+        # Offline stand-in that emits deterministic tool calls, for load tests
+        agent_llm = ScriptedChatModel(latency_seconds=SCRIPTED_LLM_LATENCY_SECONDS)
+    elif LLM_PROVIDER == "replay":
+        # Recorded outputs of the request being replayed, see traces.py
+        agent_llm = ReplayChatModel(simulate_latency=TRACE_REPLAY_SIMULATE_LATENCY)
+    elif llm_pool:
+        # Each call goes to the fastest healthy deployment, see llm_router.py
+        agent_llm = RoutingChatModel(pool=llm_pool)
+    else:
+        # Initialize LLM for Azure OpenAI
+        # can get this from Azure Open Ai service -> Azure Ai Foundary Portal
+        from langchain_openai import AzureChatOpenAI
+
+        agent_llm = AzureChatOpenAI(
+            deployment_name=os.getenv("DEPLOYMENT_NAME"),  # Your Azure deployment name
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_version=os.getenv("AZURE_API_VERSION"),
+            temperature=1,
+            stream_usage=True  # report token usage for streamed responses too
+        )
+
+    # Create prompt template - the fixed parts first, then the conversation and this turn
+    agent_prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
         MessagesPlaceholder(variable_name="chat_history"),
         ("human", "{input}"),
         MessagesPlaceholder(variable_name="agent_scratchpad"),
     ])
 
-    # Create agent
-    agent = create_tool_calling_agent(llm, tools, prompt)
+    # Load MCP tools using official adapter
+    if trace_replay and TRACE_REPLAY_TOOLS == "recorded":
+        tools = recorded_tools(trace_replay, simulate_latency=TRACE_REPLAY_SIMULATE_LATENCY)
+    else:
+        tools = await create_mcp_tools()
+
+    if not tools:
+        print("No MCP tools loaded. Make sure the MCP server is accessible.")
+        return None
 
-    # memory
-    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    return build_agent(tools)
+
+def stable_tool_order(tools):
+    """Tools sorted by name, so the same tool set always gives the same prompt prefix, whatever order the servers answered in"""
+    return sorted(tools, key=lambda tool: tool.name)
+
+def build_agent(tools):
+    """Create the tool-calling agent for a set of MCP tools"""
+    global direct_tools
+    if trace_recorder:
+        # Record what the MCP servers return, below the cache and the artifact store
+        trace_recorder.record_tools(tools)
+        tools = [trace_recorder.wrap(tool) for tool in tools]
+    if server_breakers and tool_discovery:
+        # Inside the cache, so cached results are still served while a server is down
+        servers = tool_discovery.tool_servers
+        tools = [server_breakers.wrap(tool, servers[tool.name]) if tool.name in servers else tool for tool in tools]
+    if TOOL_CACHE_ENABLED:
+        tools = [tool_cache.wrap(tool) for tool in tools]
+    # The fast path renders whole results itself, so it calls the tools before large results are offloaded
+    direct_tools = tools
+    if prefetcher:
+        # Matches the agent's calls with the request's prefetches, which go through direct_tools
+        prefetcher.update()
+        tools = [prefetcher.wrap(tool) for tool in tools]
+    if artifact_store:
+        tools = [artifact_store.wrap(tool) for tool in tools]
+
+    subset_agents.clear()
+    if tool_selector:
+        tool_selector.update(tools, tool_discovery.tool_servers if tool_discovery else None)
+    tools = stable_tool_order(tools + builtin_tools)
+
+    # Create agent - shared by every session, each session only brings its own memory
+    agent = create_tool_calling_agent(agent_llm, tools, agent_prompt)
+
+    return agent, tools
+
+def update_agent_tools(tools):
+    """Swap in a new tool set, e.g. when a failed MCP server comes back"""
+    global agent, agent_tools
+    agent, agent_tools = build_agent(tools)
+    print(f"Agent tools updated: {[tool.name for tool in agent_tools]}")
+
+def create_chat_store():
+    """Create the store that holds every session's chat history"""
+    if CHAT_HISTORY_BACKEND == "sqlite":
+        print(f"Storing chat history in {CHAT_HISTORY_SQLITE_PATH}")
+        return SQLiteChatStore(CHAT_HISTORY_SQLITE_PATH, page_size=CHAT_HISTORY_PAGE_SIZE)
+    return InMemoryChatStore()
+
+chat_store = create_chat_store()
+
+def create_memory(session_id, history=None):
+    """Create the conversation memory of a session, backed by its stored history"""
+    return RollingSummaryMemory(
+        chat_memory=history if history is not None else chat_store.history(session_id),
+        llm=agent_llm,
+        memory_key="chat_history",
+        return_messages=True,
+        max_token_budget=MEMORY_TOKEN_BUDGET,
+        keep_last_turns=MEMORY_KEEP_LAST_TURNS
+    )
 
+def select_agent(user_input, memory):
+    """The agent to answer a message with, bound to only the tools it is likely to need and can reach"""
+    mcp_tools = [tool for tool in agent_tools if tool not in builtin_tools]
+    tools, full_set = mcp_tools, True
+    if tool_selector is not None and user_input is not None:
+        # The previous question helps with follow-ups such as "book the first one"
+        previous = [message.content for message in memory.chat_memory.messages if message.type == "human"][-1:]
+        tools, full_set = tool_selector.select(user_input, previous)
+    # Tools of servers whose circuit breaker is open are left out until it half-opens
+    unavailable = server_breakers.unavailable_servers() if server_breakers and tool_discovery else set()
+    if unavailable:
+        servers = tool_discovery.tool_servers
+        tools = [tool for tool in tools if servers.get(tool.name) not in unavailable]
+        full_set = False
+    if full_set:
+        return agent
+    tools = stable_tool_order(tools + builtin_tools)
+    key = tuple(tool.name for tool in tools)
+    if key not in subset_agents:
+        subset_agents[key] = create_tool_calling_agent(agent_llm, tools, agent_prompt)
+    return subset_agents[key]
+
+def build_agent_executor(memory, user_input=None):
+    """Create an agent executor for one turn of a session's conversation"""
     # Create agent executor with tool logging callback and verbose output
-    agent_executor = AgentExecutor(agent=agent, tools=tools, memory=memory, verbose=True)
-
-    return agent_executor
+    return ToolStepExecutor(
+        agent=select_agent(user_input, memory),
+        # Every tool stays callable, even one the LLM names without having been shown it
+        tools=agent_tools,
+        memory=memory,
+        verbose=AGENT_VERBOSE,
+        tool_execution_mode=TOOL_EXECUTION_MODE,
+        max_concurrent_tools=TOOL_MAX_CONCURRENCY_PER_STEP,
+        default_tool_timeout=TOOL_TIMEOUT_SECONDS,
+        tool_timeouts=TOOL_TIMEOUTS,
+        step_stats=step_stats,
+        max_execution_time=AGENT_TIME_BUDGET_SECONDS,
+        max_iterations=AGENT_MAX_ITERATIONS,
+        answer_llm=agent_llm,
+        answer_reserve_seconds=AGENT_ANSWER_RESERVE_SECONDS
+    )
 
 # Initialize the agent (now async)
-agent_executor = None
+agent = None
+agent_tools = []
+direct_tools = []
+agent_llm = None
+agent_prompt = None
 print("🤖 Agent setup function ready! Run the next cell to initialize.")
 
+# Prometheus metrics and sampled JSON logs of requests, LLM calls and tool calls
+metrics_registry = MetricsRegistry()
+event_log = SampledLogger(LOG_SAMPLE_RATE)
+agent_metrics = AgentMetrics(metrics_registry, event_log)
+metrics_registry.callback_counter("tool_cache_hits", "Tool calls answered from the result cache", lambda: sum(tool_cache.hits.values()))
+metrics_registry.callback_counter("tool_cache_misses", "Cacheable tool calls that went to the MCP server", lambda: sum(tool_cache.misses.values()))
+
+if server_breakers:
+    metrics_registry.gauge("circuit_breakers_open", "MCP servers whose circuit breaker is open", lambda: len(server_breakers.unavailable_servers()))
+    metrics_registry.callback_counter("circuit_breaker_rejected_calls", "Tool calls failed fast by an open circuit breaker", lambda: sum(breaker.rejected for breaker in server_breakers.breakers.values()))
+if artifact_store:
+    metrics_registry.callback_counter("artifacts_stored", "Large tool results stored as artifacts instead of sent to the LLM", lambda: sum(artifact_store.stored.values()))
+    metrics_registry.callback_counter("artifact_reads", "Pages of artifacts read by the LLM", lambda: artifact_store.reads)
+    metrics_registry.callback_counter("artifact_tokens_offloaded", "Estimated tokens kept out of the LLM context by artifacts", lambda: artifact_store.chars_offloaded // 4)
+if tool_selector:
+    metrics_registry.register("tool_schema_tokens_saved", "histogram", "Tool schema tokens left out of the prompt by tool selection", tool_selector.tokens_saved)
+    metrics_registry.callback_counter("tool_selection_fallbacks", "Requests sent with every tool because none matched confidently", lambda: tool_selector.fallbacks)
+
+# Wall time versus summed tool time of every agent step
+step_stats = StepStats(event_log)
+metrics_registry.register("step_wall_seconds", "histogram", "Wall time of the tool calls of one agent step", step_stats.wall_time)
+metrics_registry.register("step_tool_seconds", "histogram", "Summed time of the tool calls of one agent step", step_stats.tool_time)
+metrics_registry.register("budget_exhausted", "counter", "Requests stopped early by the time budget or iteration limit", step_stats.budget_exhausted)
+
+# Prompt tokens per request
+token_stats = TokenStats(event_log)
+metrics_registry.register("request_prompt_tokens", "histogram", "Prompt tokens used by one request", token_stats.prompt_tokens)
+metrics_registry.register("request_cached_prompt_tokens", "histogram", "Prompt tokens of one request served from the provider's prompt cache", token_stats.cached_prompt_tokens)
+metrics_registry.register("request_memory_tokens", "histogram", "Prompt tokens taken by conversation memory", token_stats.memory_tokens)
+
+# Fast path for simple single-tool requests, using the current (cache-wrapped) MCP tools
+intent_router = IntentRouter(lambda: direct_tools) if ROUTER_ENABLED else None
+if intent_router:
+    metrics_registry.register("router_fast_path_seconds", "histogram", "Time of requests answered on the fast path", intent_router.fast_path_time)
+    metrics_registry.register("router_agent_seconds", "histogram", "Time of requests answered by the full agent", intent_router.agent_time)
+    metrics_registry.callback_counter("router_requests", "Requests seen by the fast-path router", lambda: intent_router.requests)
+    metrics_registry.callback_counter("router_hits", "Requests answered on the fast path", lambda: sum(intent_router.hits.values()))
+
+if prefetcher:
+    metrics_registry.callback_counter("prefetch_calls", "Tool calls started speculatively before the LLM asked for them", lambda: sum(prefetcher.prefetched.values()))
+    metrics_registry.callback_counter("prefetch_hits", "Prefetched tool calls the agent then made", lambda: sum(prefetcher.hits.values()))
+    metrics_registry.callback_counter("prefetch_wasted", "Prefetched tool calls the agent never made", lambda: sum(prefetcher.wasted.values()))
+    metrics_registry.callback_counter("prefetch_wasted_completed", "Unused prefetched tool calls that still ran to completion", lambda: sum(prefetcher.wasted_completed.values()))
+
+if llm_pool:
+    metrics_registry.callback_counter("llm_hedged_requests", "LLM calls also sent to a second deployment after running long", lambda: llm_pool.hedged)
+    metrics_registry.callback_counter("llm_hedge_wins", "Hedged LLM calls the second deployment answered first", lambda: llm_pool.hedge_wins)
+    metrics_registry.callback_counter("llm_failovers", "LLM calls retried on another deployment after one failed", lambda: llm_pool.failovers)
+    metrics_registry.gauge("llm_deployments_healthy", "LLM deployments whose circuit breaker is closed", lambda: sum(deployment.healthy for deployment in llm_pool.deployments))
+
+# Background work that must not be garbage collected before it finishes
+background_tasks = set()
+
+def run_in_background(coroutine):
+    """Run a coroutine after the current request without waiting for it"""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def fold_session_memory(session):
+    """Summarize the older turns of a session once its response has been sent"""
+    try:
+        async with session.lock:
+            await session.memory.chat_memory.arefresh()
+            await session.memory.afold()
+        session_manager.record_usage(session)
+    except Exception as e:
+        print(f"Failed to summarize conversation {session.session_id}: {e}")
+
+def start_artifact_turn(usage):
+    """Start measuring the prompt tokens and LLM time of an agent turn, if the artifact store is on"""
+    return artifact_store.start_turn(usage) if artifact_store else None
+
+async def finish_turn(session, usage=None, memory_tokens=0, artifact_turn=None):
+    """Record a finished turn and schedule summarization off the request path"""
+    await session.memory.chat_memory.aflush()
+    session_manager.record_usage(session)
+    if usage is not None:
+        token_stats.record(usage, memory_tokens)
+    if artifact_turn is not None:
+        artifact_store.finish_turn(artifact_turn)
+    if session.memory.needs_fold():
+        run_in_background(fold_session_memory(session))
+
+# Per-user conversation memories
+session_manager = SessionManager(
+    memory_factory=create_memory,
+    max_sessions=SESSION_MAX_COUNT,
+    idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+    max_total_bytes=SESSION_MAX_TOTAL_BYTES
+)
+metrics_registry.gauge("live_sessions", "Conversation sessions held in memory", lambda: session_manager.stats()["live_sessions"])
+
 # Initialize the agent with MCP tools
 async def initialize_agent():
     """Initialize the agent with MCP tools"""
-    global agent_executor
+    global agent, agent_tools
     print("Initializing agent with MCP tools...")
-    agent_executor = await setup_agent()
-    if agent_executor:
+    setup = await setup_agent()
+    if setup:
+        agent, agent_tools = setup
         print("LangChain agent with MCP tools ready!")
     else:
         print("Failed to initialize agent. Check MCP server connection.")
 
+async def answer_fast_path(session, user_input: str):
+    """Answer a simple request without the agent, saving the exchange to the session memory
+
+    Must be called with the session lock held. Returns None when the agent has to answer.
+    """
+    if intent_router is None:
+        return None
+    answer = await intent_router.route(user_input)
+    if answer is not None:
+        session.memory.save_context({"input": user_input}, {"output": answer})
+    return answer
+
+def start_trace(session_id: str, user_input: str):
+    """Start recording a request, if recording is on"""
+    return trace_recorder.request(session_id, user_input) if trace_recorder else None
+
+def start_prefetch(user_input: str):
+    """Start the likely tool calls of a message the agent is about to answer, if prefetching is on"""
+    return prefetcher.start(user_input) if prefetcher else None
+
+def finish_prefetch(prefetch, failed: bool) -> None:
+    """Count the request's unused prefetches, cancelling them if the request was abandoned"""
+    if prefetch:
+        prefetcher.finish(prefetch, cancel=failed)
+
+def request_callbacks(usage, trace):
+    return [usage, trace] if trace else [usage]
+
+async def answer_in_session(session, user_input: str) -> str:
+    """Answer one message in a session's conversation, on the fast path or with the agent"""
+    # One turn at a time per session so the memory sees whole exchanges
+    usage = RequestMetricsHandler(agent_metrics)
+    async with session.lock:
+        # Changes other workers made to the conversation
+        await session.memory.chat_memory.arefresh()
+        trace = start_trace(session.session_id, user_input)
+        answer = None
+        fast_path = False
+        error = None
+        try:
+            answer = await answer_fast_path(session, user_input)
+            fast_path = answer is not None
+            if answer is None:
+                started = time.monotonic()
+                memory_tokens = session.memory.prompt_tokens()
+                prefetch = start_prefetch(user_input)
+                artifact_turn = start_artifact_turn(usage)
+                failed = True
+                try:
+                    agent_executor = build_agent_executor(session.memory, user_input)
+                    # Use the agent to process the input and get intermediate steps
+                    result = await agent_executor.ainvoke({"input": user_input}, config={"callbacks": request_callbacks(usage, trace)})
+                    failed = False
+                finally:
+                    finish_prefetch(prefetch, failed)
+                answer = result.get("output") or result.get("final_output") or ""
+                if intent_router:
+                    intent_router.record_agent(time.monotonic() - started)
+                await finish_turn(session, usage, memory_tokens, artifact_turn)
+            else:
+                await finish_turn(session)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if trace:
+                trace.finish(answer, fast_path=fast_path, error=error)
+    return answer
+
 # User Input Handler + logged agent steps
-async def process_user_input(user_input: str) -> str:
+async def process_user_input(user_input: str, session_id: str = DEFAULT_SESSION_ID) -> str:
     """Process user input and return LLM response using MCP tools"""
-    if not agent_executor:
+    if not agent:
         return "Agent not initialized. Please run the initialization cell first."
 
+    session = session_manager.get(session_id)
     try:
-        # Use the agent to process the input and get intermediate steps
-        result = await agent_executor.ainvoke({"input": user_input})
-        output = result.get("output") or result.get("final_output") or ""
-
-        # Print intermediate steps if present
-        steps = result.get("intermediate_steps") or []
-        for step in steps:
-            action = None
-            observation = None
-            if isinstance(step, tuple) and len(step) == 2:
-                action, observation = step
-            elif isinstance(step, dict) and "action" in step:
-                action = step.get("action")
-                observation = step.get("observation")
-            else:
-                continue
-
-            tool_name = getattr(action, "tool", getattr(action, "tool_name", "unknown"))
-            tool_args = getattr(action, "tool_input", getattr(action, "input", None))
-            print(f"\n--- Tool: {tool_name}")
-            print(f"args: {tool_args}")
-            if observation is not None:
-                print(f"result: {observation}")
-            print("---\n")
-
-        return output
+        return await answer_in_session(session, user_input)
     except Exception as e:
         return f"Error processing request: {str(e)}"
 
+def preview(value: Any, limit: int = 500) -> str:
+    """Shorten a tool input/output for progress events"""
+    text = getattr(value, "content", value)
+    text = text if isinstance(text, str) else str(text)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+# Streaming user input handler - yields progress events while the agent runs
+async def stream_user_input(user_input: str, session_id: str = DEFAULT_SESSION_ID):
+    """Process user input and yield tool_start, tool_end, token and final events as they happen"""
+    if not agent:
+        yield {"type": "error", "message": "Agent not initialized. Please run the initialization cell first."}
+        return
+
+    session = session_manager.get(session_id)
+    trace = None
+    error = None
+    try:
+        usage = RequestMetricsHandler(agent_metrics)
+        async with session.lock:
+            await session.memory.chat_memory.arefresh()
+            trace = start_trace(session_id, user_input)
+            answer = await answer_fast_path(session, user_input)
+            if answer is not None:
+                await finish_turn(session)
+                if trace:
+                    trace.finish(answer, fast_path=True)
+                yield {"type": "final", "output": answer}
+                return
+
+            started = time.monotonic()
+            memory_tokens = session.memory.prompt_tokens()
+            prefetch = start_prefetch(user_input)
+            artifact_turn = start_artifact_turn(usage)
+            failed = True
+            try:
+                agent_executor = build_agent_executor(session.memory, user_input)
+                output = ""
+                events = agent_executor.astream_events(
+                    {"input": user_input}, config={"callbacks": request_callbacks(usage, trace)}, version="v2"
+                )
+                async for event in events:
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream":
+                        content = event["data"]["chunk"].content
+                        # Tool-call chunks carry no text, only the final answer does
+                        if isinstance(content, str) and content:
+                            yield {"type": "token", "content": content}
+                    elif kind == "on_tool_start":
+                        yield {"type": "tool_start", "tool": event["name"], "input": event["data"].get("input")}
+                    elif kind == "on_tool_end":
+                        yield {"type": "tool_end", "tool": event["name"], "output": preview(event["data"].get("output"))}
+                    elif kind == "on_chain_end" and not event["parent_ids"]:
+                        result = event["data"].get("output") or {}
+                        output = result.get("output") or ""
+                failed = False
+            finally:
+                finish_prefetch(prefetch, failed)
+        if intent_router:
+            intent_router.record_agent(time.monotonic() - started)
+        await finish_turn(session, usage, memory_tokens, artifact_turn)
+        if trace:
+            trace.finish(output)
+        yield {"type": "final", "output": output}
+    except Exception as e:
+        error = e
+        yield {"type": "error", "message": f"Error processing request: {str(e)}"}
+    except BaseException as e:
+        # Cancelled, or the caller stopped reading the events
+        error = e
+        raise
+    finally:
+        # Already written on success; otherwise recorded with how it ended
+        if trace:
+            trace.finish(None, error=error)
+
+def health_status():
+    """Whether the agent is up, and the discovery and circuit breaker state of every MCP server"""
+    discovery = tool_discovery.status() if tool_discovery else {}
+    breakers = server_breakers.status() if server_breakers else {}
+    servers = {
+        name: {**discovery.get(name, {}), "circuit": breakers.get(name)}
+        for name in sorted(set(discovery) | set(breakers))
+    }
+    degraded = any(
+        not server.get("healthy", True) or (server["circuit"] or {}).get("state") not in (None, "closed")
+        for server in servers.values()
+    )
+    status = "starting" if agent is None else "degraded" if degraded else "ok"
+    return {"status": status, "servers": servers}
+
 # Interactive function for easy testing
-async def ask_assistant(question: str):
+async def ask_assistant(question: str, session_id: str = DEFAULT_SESSION_ID):
     """Easy-to-use function for asking the travel assistant"""
     print(f"🧳 User: {question}")
     print("🤖 Assistant:")
 
-    response = await process_user_input(question)
+    response = await process_user_input(question, session_id)
     print(response)
     return response
 
+# Shared by all batches, so nightly jobs leave room for interactive requests
+batch_semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+batch_results = metrics_registry.counter("batch_questions", "Batch questions answered, by outcome", ("outcome",))
+
+@asynccontextmanager
+async def admitted(admission):
+    """Hold one of `admission`'s slots, under its deadline, for the block (no limits without one)"""
+    if admission is None:
+        yield
+        return
+    async with admission.admit():
+        async with admission.deadline():
+            yield
+
+async def answer_batch_item(index: int, item, admission=None) -> Dict[str, Any]:
+    """Answer one batch question in a conversation of its own"""
+    item_id = item.get("id") if isinstance(item, dict) else None
+    message = item["message"] if isinstance(item, dict) else item
+    async with batch_semaphore:
+        started = time.monotonic()
+        # Not in the session pool or the chat store: nothing to evict, nothing persisted
+        session_id = f"batch-{uuid.uuid4().hex}"
+        session = Session(session_id=session_id, memory=create_memory(session_id, InMemorySessionHistory()))
+        result = {"index": index, "id": item_id}
+        try:
+            async with admitted(admission):
+                result["output"] = await answer_in_session(session, message)
+            batch_results.inc("ok")
+        except Exception as e:
+            result["error"] = f"Error processing request: {str(e)}"
+            batch_results.inc("error")
+        result["seconds"] = round(time.monotonic() - started, 3)
+        return result
+
+async def ask_batch(questions, admission=None):
+    """Answer many independent questions concurrently, yielding each result as it completes
+
+    `questions` are strings or {"id": ..., "message": ...} dicts. Every question gets its
+    own empty conversation memory; all of them share the tool result cache, so a lookup
+    made for one question answers the same lookup in the others. Results are dicts with
+    the question's `index` and `id`, and its `output` (or `error`) and `seconds`. With an
+    `AdmissionController`, each question also takes one of its slots and runs under its
+    deadline; a question it rejects or cuts off gets an `error` like any other failure.
+    """
+    if not agent:
+        raise RuntimeError("Agent not initialized. Please run the initialization cell first.")
+    tasks = [asyncio.create_task(answer_batch_item(index, item, admission)) for index, item in enumerate(questions)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # The caller stopped reading, e.g. the client disconnected
+        for task in tasks:
+            task.cancel()
+
 print("💬 User input handler ready!")
 
 # Test MCP server connectivity and tools
 async def test_mcp_connection():
     """Test MCP server connection and list available tools"""
-    tools = await create_mcp_tools()
+    # Report what discovery found at startup instead of listing every server again
+    tools = tool_discovery.tools if tool_discovery else []
     if tools:
         print(f"MCP HTTP server connected successfully!")
         print(f"Available tools: {[tool.name for tool in tools]}")
@@ -217,6 +787,14 @@ async def test_mcp_connection():
             print(f"  - {tool.name}: {tool.description}")
     else:
         print("Failed to connect to MCP HTTP server")
+    if tool_discovery and tool_discovery.errors:
+        print(f"Retrying in the background: {list(tool_discovery.errors)}")
+
+async def shutdown():
+    """Stop background work started by the agent"""
+    if tool_discovery:
+        await tool_discovery.stop()
+    await asyncio.to_thread(chat_store.close)
 
 # Test MCP HTTP connection
 
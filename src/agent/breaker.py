@@ -0,0 +1,195 @@
+"""
+Circuit breakers for MCP servers.
+
+Each server gets a breaker that watches its last calls. When too many of them failed
+(connection errors, HTTP errors, calls cut off by the tool timeout) or were slow, the
+breaker opens: calls to that server's tools return at once with a message the LLM can
+act on, instead of each turn waiting out the timeout again, and the agent stops
+offering those tools. After a cool-down the breaker lets a few probe calls through
+(half-open); if they succeed it closes again, otherwise it stays open. A call that
+fails to reach the server is reported to the LLM as a failed result rather than
+failing the whole turn.
+
+Errors the server itself reports for a call (ToolException) show the server is up,
+so they don't count against it.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from langchain_core.tools import BaseTool, ToolException
+
+from tool_wrappers import FallbackResult, ToolCall, timed_out, wrap_tool
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Error-rate and slow-call-rate breaker over a sliding window of calls"""
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        # (ok, seconds) of the most recent calls
+        self.calls: Deque[Tuple[bool, float]] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+
+        # Metrics
+        self.opened = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        # An open breaker turns half-open once the cool-down has passed
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def retry_in(self) -> float:
+        return max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0)
+
+    def allow(self) -> bool:
+        """Whether a call may go to the server now"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self.half_open_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, ok: bool, seconds: float, error: Optional[str] = None) -> None:
+        if error:
+            self.last_error = error
+        if self._state == HALF_OPEN:
+            # The probe decides: close with a fresh window, or open for another cool-down
+            if ok and seconds < self.slow_call_seconds:
+                self._state = CLOSED
+                self.calls.clear()
+                self.calls.append((ok, seconds))
+            else:
+                self._open()
+            return
+
+        self.calls.append((ok, seconds))
+        if self._state == CLOSED and len(self.calls) >= self.min_calls:
+            failed = sum(1 for call_ok, _ in self.calls if not call_ok) / len(self.calls)
+            slow = sum(1 for _, call_seconds in self.calls if call_seconds >= self.slow_call_seconds) / len(self.calls)
+            if failed >= self.failure_rate or slow >= self.slow_call_rate:
+                self._open()
+
+    def release(self) -> None:
+        """A call was abandoned without telling anything about the server; free its probe slot"""
+        if self._state == HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        print(f"Circuit breaker '{self.name}' opened, retrying in {self.open_seconds:g}s")
+
+    def status(self) -> Dict[str, Any]:
+        latencies = sorted(seconds for _, seconds in self.calls)
+        failures = sum(1 for ok, _ in self.calls if not ok)
+        return {
+            "state": self.state,
+            "recent_calls": len(self.calls),
+            "recent_failure_rate": round(failures / len(self.calls), 4) if self.calls else 0.0,
+            "recent_latency_seconds": {
+                "p50": round(latencies[len(latencies) // 2], 4) if latencies else None,
+                "max": round(latencies[-1], 4) if latencies else None
+            },
+            "retry_in_seconds": round(self.retry_in(), 1) if self._state == OPEN else None,
+            "times_opened": self.opened,
+            "rejected_calls": self.rejected,
+            "last_error": self.last_error
+        }
+
+
+class ServerBreakers:
+    """One circuit breaker per MCP server, and the tool wrapper that applies them"""
+
+    def __init__(self, **settings: Any):
+        self.settings = settings
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, server: str) -> CircuitBreaker:
+        if server not in self.breakers:
+            self.breakers[server] = CircuitBreaker(server, **self.settings)
+        return self.breakers[server]
+
+    def unavailable_servers(self) -> set:
+        """Servers whose breaker is open, so their tools should not be offered"""
+        return {name for name, breaker in self.breakers.items() if breaker.state == OPEN}
+
+    def wrap(self, tool: BaseTool, server: str) -> BaseTool:
+        """Return a copy of `tool` whose calls go through its server's breaker"""
+        breaker = self.get(server)
+
+        def unavailable() -> Any:
+            message = FallbackResult(
+                f"The '{server}' service is temporarily unavailable (recent calls failed or timed out), so "
+                f"'{tool.name}' was not run. Try again in about {breaker.retry_in():.0f} seconds; meanwhile "
+                "answer without it and tell the user this information is unavailable right now."
+            )
+            return (message, None) if tool.response_format == "content_and_artifact" else message
+
+        def failed(error: Exception) -> Any:
+            message = FallbackResult(
+                f"'{tool.name}' failed because the '{server}' service could not be reached ({error!r}). "
+                "Answer without it or try again later."
+            )
+            return (message, None) if tool.response_format == "content_and_artifact" else message
+
+        async def guarded_call(tool_name: str, arguments: Dict[str, Any], call_next: ToolCall) -> Any:
+            if not breaker.allow():
+                return unavailable()
+            started = time.monotonic()
+            try:
+                result = await call_next(arguments)
+            except ToolException:
+                # The server answered, just with an error for this call
+                breaker.record(True, time.monotonic() - started)
+                raise
+            except asyncio.CancelledError:
+                # Cut off by the tool timeout counts against the server; a cancelled request does not
+                if timed_out():
+                    breaker.record(False, time.monotonic() - started, error="timed out")
+                else:
+                    breaker.release()
+                raise
+            except Exception as e:
+                breaker.record(False, time.monotonic() - started, error=repr(e))
+                return failed(e)
+            breaker.record(True, time.monotonic() - started)
+            return result
+
+        return wrap_tool(tool, guarded_call)
+
+    def status(self) -> Dict[str, Any]:
+        return {name: breaker.status() for name, breaker in sorted(self.breakers.items())}
@@ -0,0 +1,213 @@
+"""
+LangChain callback handlers used to measure agent requests.
+
+`RequestMetricsHandler` times the whole request, every LLM call and every MCP tool
+call from LangChain's callbacks, records them in the Prometheus metrics served on
+`/metrics`, and logs a sample of the calls as JSON lines.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from metrics import Histogram, MetricsRegistry, SampledLogger
+
+# Buckets for token counts per request
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+# Buckets for tool result sizes in bytes
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def usage_from_result(response: LLMResult) -> Optional[Dict[str, Any]]:
+    """Get the provider's token usage from an LLM result, if it reported any"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return dict(usage)
+    token_usage = (response.llm_output or {}).get("token_usage")
+    if token_usage:
+        return {
+            "input_tokens": token_usage.get("prompt_tokens", 0),
+            "output_tokens": token_usage.get("completion_tokens", 0),
+            "total_tokens": token_usage.get("total_tokens", 0),
+            "input_token_details": {"cache_read": (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)}
+        }
+    return None
+
+
+def cached_input_tokens(usage: Dict[str, Any]) -> int:
+    """Input tokens the provider served from its prompt cache"""
+    return (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+
+class TokenUsageHandler(AsyncCallbackHandler):
+    """Adds up the tokens used by every LLM call of one request"""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        # Of the prompt tokens, those the provider read from its prompt cache
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.llm_calls += 1
+        usage = usage_from_result(response)
+        if usage:
+            self.prompt_tokens += usage.get("input_tokens", 0)
+            self.cached_prompt_tokens += cached_input_tokens(usage)
+            self.completion_tokens += usage.get("output_tokens", 0)
+
+
+class AgentMetrics:
+    """Request, LLM call and tool call metrics shared by all requests"""
+
+    def __init__(self, registry: MetricsRegistry, logger: SampledLogger):
+        self.logger = logger
+        self.request_seconds = registry.histogram(
+            "request_seconds", "Time to run the agent for one user message", ("outcome",))
+        self.llm_seconds = registry.histogram("llm_call_seconds", "Latency of one LLM call")
+        self.llm_tokens = registry.histogram(
+            "llm_call_tokens", "Tokens used by one LLM call", ("type",), buckets=TOKEN_BUCKETS)
+        self.llm_errors = registry.counter("llm_call_errors", "LLM calls that raised an error")
+        self.llm_cancelled = registry.counter("llm_calls_cancelled", "LLM calls abandoned because their request was cancelled")
+        self.tool_seconds = registry.histogram("tool_call_seconds", "Latency of one MCP tool call", ("tool",))
+        self.tool_payload_bytes = registry.histogram(
+            "tool_result_bytes", "Size of MCP tool results", ("tool",), buckets=PAYLOAD_BUCKETS)
+        self.tool_calls = registry.counter("tool_calls", "MCP tool calls by outcome", ("tool", "outcome"))
+
+
+class RequestMetricsHandler(TokenUsageHandler):
+    """Measures one agent request: total time, each LLM call and each tool call"""
+
+    def __init__(self, metrics: AgentMetrics):
+        super().__init__()
+        self.metrics = metrics
+        self.request_run_id: Optional[UUID] = None
+        self.request_started = 0.0
+        # Time spent in LLM calls during the request
+        self.llm_seconds = 0.0
+        self.llm_started: Dict[UUID, float] = {}
+        self.tool_started: Dict[UUID, Tuple[str, float]] = {}
+
+    async def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        if parent_run_id is None and self.request_run_id is None:
+            self.request_run_id = run_id
+            self.request_started = time.monotonic()
+
+    async def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id == self.request_run_id:
+            self._finish_request("ok")
+
+    async def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id == self.request_run_id:
+            # Cancelled by a client disconnect, a WebSocket cancel or the request deadline
+            outcome = "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+            self._finish_request(outcome, message=repr(error))
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self.llm_started[run_id] = time.monotonic()
+
+    async def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self.llm_started[run_id] = time.monotonic()
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        await super().on_llm_end(response, **kwargs)
+        seconds = time.monotonic() - self.llm_started.pop(run_id, time.monotonic())
+        usage = usage_from_result(response) or {}
+        self.llm_seconds += seconds
+        self.metrics.llm_seconds.observe(seconds)
+        self.metrics.llm_tokens.observe(usage.get("input_tokens", 0), "input")
+        self.metrics.llm_tokens.observe(usage.get("output_tokens", 0), "output")
+        self.metrics.llm_tokens.observe(cached_input_tokens(usage), "cached_input")
+        self.metrics.logger.log(
+            "llm_call", seconds=round(seconds, 4), input_tokens=usage.get("input_tokens"),
+            cached_input_tokens=cached_input_tokens(usage), output_tokens=usage.get("output_tokens")
+        )
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.llm_started.pop(run_id, None)
+        if isinstance(error, asyncio.CancelledError):
+            self.metrics.llm_cancelled.inc()
+            return
+        self.metrics.llm_errors.inc()
+        self.metrics.logger.log("llm_call", error=True, outcome="error", message=repr(error))
+
+    async def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self.tool_started[run_id] = ((serialized or {}).get("name") or kwargs.get("name") or "unknown", time.monotonic())
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self.tool_started.pop(run_id, None)
+        if started is None:
+            return
+        tool, start = started
+        content = getattr(output, "content", output)
+        size = len((content if isinstance(content, str) else str(content)).encode("utf-8"))
+        self._finish_tool(tool, start, "ok", bytes=size)
+        self.metrics.tool_payload_bytes.observe(size, tool)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self.tool_started.pop(run_id, None)
+        if started is not None:
+            self._finish_tool(started[0], started[1], "error", message=repr(error))
+
+    def _finish_tool(self, tool: str, start: float, outcome: str, **fields: Any) -> None:
+        seconds = time.monotonic() - start
+        self.metrics.tool_seconds.observe(seconds, tool)
+        self.metrics.tool_calls.inc(tool, outcome)
+        self.metrics.logger.log(
+            "tool_call", error=outcome != "ok", tool=tool, outcome=outcome, seconds=round(seconds, 4), **fields
+        )
+
+    def _finish_request(self, outcome: str, **fields: Any) -> None:
+        # Tool calls that never finished were cut off by the per-tool timeout, or by the request being cancelled
+        for tool, start in list(self.tool_started.values()):
+            self._finish_tool(tool, start, "cancelled" if outcome == "cancelled" else "timeout")
+        self.tool_started.clear()
+        if outcome == "cancelled":
+            for _ in self.llm_started:
+                self.metrics.llm_cancelled.inc()
+            self.llm_started.clear()
+        seconds = time.monotonic() - self.request_started
+        self.metrics.request_seconds.observe(seconds, outcome)
+        self.metrics.logger.log(
+            "agent_request", error=outcome != "ok", outcome=outcome, seconds=round(seconds, 4),
+            llm_calls=self.llm_calls, prompt_tokens=self.prompt_tokens, cached_prompt_tokens=self.cached_prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            **fields
+        )
+
+
+class TokenStats:
+    """Prompt tokens per request, and how many of them came from conversation memory or the prompt cache"""
+
+    def __init__(self, logger: Optional[SampledLogger] = None):
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.cached_prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.memory_tokens = Histogram(TOKEN_BUCKETS)
+        self.logger = logger
+
+    def record(self, handler: TokenUsageHandler, memory_tokens: int) -> None:
+        self.prompt_tokens.observe(handler.prompt_tokens)
+        self.cached_prompt_tokens.observe(handler.cached_prompt_tokens)
+        self.memory_tokens.observe(memory_tokens)
+        if self.logger:
+            self.logger.log(
+                "request_tokens", prompt_tokens=handler.prompt_tokens, cached_prompt_tokens=handler.cached_prompt_tokens,
+                llm_calls=handler.llm_calls, memory_tokens=memory_tokens
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens_per_request": self.prompt_tokens.snapshot(),
+            "cached_prompt_tokens_per_request": self.cached_prompt_tokens.snapshot(),
+            # Share of all prompt tokens served from the provider's prompt cache
+            "prompt_cache_hit_rate": round(self.cached_prompt_tokens.sum / self.prompt_tokens.sum, 4) if self.prompt_tokens.sum else 0.0,
+            "memory_tokens_per_request": self.memory_tokens.snapshot()
+        }
@@ -0,0 +1,225 @@
+"""
+Travel agent configuration - settings read from the environment (.env).
+"""
+
+import json
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables before any setting is read
+load_dotenv()
+
+# Session pool - one conversation memory per browser session
+SESSION_COOKIE_NAME = os.getenv("SESSION_COOKIE_NAME", "travel_session")
+SESSION_HEADER_NAME = "X-Session-Id"
+DEFAULT_SESSION_ID = "default"
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", 500))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", 30 * 60))
+SESSION_MAX_TOTAL_BYTES = int(os.getenv("SESSION_MAX_TOTAL_BYTES", 64 * 1024 * 1024))
+
+# Admission control - bounded concurrency for agent runs
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", 8))
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", 32))
+AGENT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", 30))
+AGENT_REQUEST_DEADLINE_SECONDS = float(os.getenv("AGENT_REQUEST_DEADLINE_SECONDS", 120))
+# How often POST / checks whether its client is still connected (the run is cancelled if not)
+CLIENT_DISCONNECT_POLL_SECONDS = float(os.getenv("CLIENT_DISCONNECT_POLL_SECONDS", 0.5))
+
+# Batches (POST /batch, ask_batch) - questions answered at once across all batches (each also takes an agent slot), and most per batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+
+# Background jobs (POST /jobs) - worker pool, queue bound, and how long finished results are kept
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", 100))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", 3600))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", 600))
+
+# WebSocket chat (/ws) - runs in flight and unsent run events allowed per connection
+WS_MAX_RUNS_PER_CONNECTION = int(os.getenv("WS_MAX_RUNS_PER_CONNECTION", 4))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+
+# Tool result cache - identical read-only MCP tool calls are answered from memory
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", 1024))
+TOOL_CACHE_DEFAULT_TTL_SECONDS = float(os.getenv("TOOL_CACHE_DEFAULT_TTL_SECONDS", 300))
+
+# Seconds a result stays fresh, per tool; others use the default TTL
+TOOL_CACHE_TTL_SECONDS = {
+    "get_current_weather": 300,
+    "get_weather_forecast": 1800,
+    "search_attractions": 3600,
+    "search_and_format_attractions": 3600,
+    "get_attraction_details": 3600,
+    "get_suggested_packing_list": 3600,
+    "list_activities": 3600,
+    "get_activity_details": 3600,
+    "get_endorsements": 60,
+    "get_endorsement_stats": 60,
+    "get_endorsement_summary": 60,
+    "get_endorsement_invitation": 60,
+    "retrieve_saved_packing_list": 60,
+    **json.loads(os.getenv("TOOL_CACHE_TTL_SECONDS", "{}"))
+}
+
+# Tools that change state or return something different on every call
+TOOL_CACHE_NO_CACHE = [
+    "book_attraction",
+    "add_endorsement",
+    "remove_endorsement",
+    "update_saved_packing_list",
+    "get_random_attraction"
+]
+
+# Cached results dropped when a side-effecting tool runs
+TOOL_CACHE_INVALIDATES = {
+    "add_endorsement": ["get_endorsements", "get_endorsement_stats", "get_endorsement_summary", "get_endorsement_invitation"],
+    "remove_endorsement": ["get_endorsements", "get_endorsement_stats", "get_endorsement_summary", "get_endorsement_invitation"],
+    "update_saved_packing_list": ["retrieve_saved_packing_list"]
+}
+
+# Tool arguments the MCP servers match regardless of case; calls differing only in their case are
+# the same call for the cache and prefetching. Every other string argument is compared as given.
+TOOL_CASE_INSENSITIVE_ARGUMENTS = {
+    "get_current_weather": ["location"],
+    "get_weather_forecast": ["location"],
+    "search_attractions": ["location", "category"],
+    "search_and_format_attractions": ["location", "category"],
+    "get_suggested_packing_list": ["activity"],
+    "list_activities": ["category"],
+    "get_activity_details": ["activity"],
+    **json.loads(os.getenv("TOOL_CASE_INSENSITIVE_ARGUMENTS", "{}"))
+}
+
+# MCP servers the agent loads tools from (servers without a URL are skipped)
+MCP_SERVER_URLS = {
+    "attractions": os.getenv("ATTRACTIONS_MCP_URL"),
+    "weather": os.getenv("WEATHER_MCP_URL"),
+    "packing_list": os.getenv("PACKING_LIST_MCP_URL"),
+    "endorsements": os.getenv("ENDORSEMENTS_MCP_URL"),
+    "persist": os.getenv("PERSIST_PACKING_LIST_MCP_URL")
+}
+
+# How the agent reaches the MCP servers: "http" (MCP_SERVER_URLS) or "inprocess" (bundled
+# servers imported into the agent process; servers not in MCP_INPROCESS_SERVERS stay on HTTP)
+MCP_TOOL_MODE = os.getenv("MCP_TOOL_MODE", "http")
+MCP_SERVERS_DIR = Path(os.getenv("MCP_SERVERS_DIR", Path(__file__).parent.parent / "mcp"))
+MCP_SERVER_DIRS = {
+    "attractions": MCP_SERVERS_DIR / "attractions-mcp",
+    "weather": MCP_SERVERS_DIR / "weather-mcp",
+    "packing_list": MCP_SERVERS_DIR / "packing-suggestions-mcp",
+    "endorsements": MCP_SERVERS_DIR / "endorsements-mcp",
+    "persist": MCP_SERVERS_DIR / "persist-packing-list-mcp"
+}
+MCP_INPROCESS_SERVERS = os.getenv("MCP_INPROCESS_SERVERS", ",".join(MCP_SERVER_DIRS)).split(",")
+# In-process servers whose tools block on network I/O run each call in a worker thread
+MCP_INPROCESS_THREADED_SERVERS = os.getenv("MCP_INPROCESS_THREADED_SERVERS", "weather").split(",")
+
+# Tool discovery - per-server timeout and background retry of failed servers
+MCP_DISCOVERY_TIMEOUT_SECONDS = float(os.getenv("MCP_DISCOVERY_TIMEOUT_SECONDS", 10))
+MCP_DISCOVERY_RETRY_SECONDS = float(os.getenv("MCP_DISCOVERY_RETRY_SECONDS", 15))
+MCP_DISCOVERY_MAX_RETRY_SECONDS = float(os.getenv("MCP_DISCOVERY_MAX_RETRY_SECONDS", 120))
+
+# Tool schema cache - lets the agent start from the schemas seen on the last run
+MCP_SCHEMA_CACHE_ENABLED = os.getenv("MCP_SCHEMA_CACHE_ENABLED", "true").lower() == "true"
+MCP_SCHEMA_CACHE_PATH = Path(os.getenv("MCP_SCHEMA_CACHE_PATH", Path(__file__).parent / ".mcp_tool_cache.json"))
+
+# Tool results longer than ARTIFACT_THRESHOLD_CHARS are kept out of the LLM context: the model gets
+# a summary and a handle, and reads the full result in pages with the read_artifact tool
+ARTIFACT_STORE_ENABLED = os.getenv("ARTIFACT_STORE_ENABLED", "true").lower() == "true"
+ARTIFACT_THRESHOLD_CHARS = int(os.getenv("ARTIFACT_THRESHOLD_CHARS", 3000))
+ARTIFACT_PREVIEW_CHARS = int(os.getenv("ARTIFACT_PREVIEW_CHARS", 600))
+ARTIFACT_PAGE_CHARS = int(os.getenv("ARTIFACT_PAGE_CHARS", 2000))
+ARTIFACT_MAX_ENTRIES = int(os.getenv("ARTIFACT_MAX_ENTRIES", 500))
+ARTIFACT_TTL_SECONDS = float(os.getenv("ARTIFACT_TTL_SECONDS", 3600))
+
+# Per-query tool selection - only the MCP servers whose tools match the message are sent to the LLM.
+# Companions are servers a workflow needs alongside another, e.g. packing lists check the weather.
+TOOL_SELECTION_ENABLED = os.getenv("TOOL_SELECTION_ENABLED", "true").lower() == "true"
+TOOL_SELECTION_MIN_SCORE = float(os.getenv("TOOL_SELECTION_MIN_SCORE", 1.0))
+TOOL_SELECTION_RELATIVE_THRESHOLD = float(os.getenv("TOOL_SELECTION_RELATIVE_THRESHOLD", 0.35))
+TOOL_SELECTION_COMPANIONS = json.loads(os.getenv("TOOL_SELECTION_COMPANIONS", json.dumps({
+    "packing_list": ["weather", "persist"],
+    "persist": ["packing_list"]
+})))
+
+# Tool execution within one agent step - "concurrent" or "sequential"
+TOOL_EXECUTION_MODE = os.getenv("TOOL_EXECUTION_MODE", "concurrent")
+TOOL_MAX_CONCURRENCY_PER_STEP = int(os.getenv("TOOL_MAX_CONCURRENCY_PER_STEP", 4))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", 30))
+# Per-tool overrides, e.g. TOOL_TIMEOUTS={"get_weather_forecast": 10}
+TOOL_TIMEOUTS = json.loads(os.getenv("TOOL_TIMEOUTS", "{}"))
+
+# Speculative prefetch - start the weather, attractions and packing list calls a message probably
+# needs (from the places and activities it names) while the LLM is still deciding, see prefetch.py
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+PREFETCH_MAX_PLACES = int(os.getenv("PREFETCH_MAX_PLACES", 2))
+
+# Circuit breaker per MCP server: opens when at least BREAKER_FAILURE_RATE of the last
+# BREAKER_WINDOW_SIZE calls failed (or BREAKER_SLOW_CALL_RATE took BREAKER_SLOW_CALL_SECONDS or
+# longer), then fails that server's tools fast for BREAKER_OPEN_SECONDS before probing it again
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_WINDOW_SIZE = int(os.getenv("BREAKER_WINDOW_SIZE", 20))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 5))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", 10))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", 0.8))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", 30))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", 1))
+
+# Per-request budget across all LLM and tool calls; when it runs out the agent answers from
+# the tool results so far, using up to AGENT_ANSWER_RESERVE_SECONDS more for that answer
+AGENT_TIME_BUDGET_SECONDS = float(os.getenv("AGENT_TIME_BUDGET_SECONDS", 60))
+AGENT_ANSWER_RESERVE_SECONDS = float(os.getenv("AGENT_ANSWER_RESERVE_SECONDS", 10))
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", 8))
+
+# Fast path - answer simple single-tool requests ("weather in Paris") without the LLM, see router.py
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+
+# Conversation memory - recent turns verbatim, older turns folded into a summary
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 2000))
+MEMORY_KEEP_LAST_TURNS = int(os.getenv("MEMORY_KEEP_LAST_TURNS", 4))
+
+# Chat history store: "memory" (this process only) or "sqlite" (shared by all workers)
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "memory")
+CHAT_HISTORY_SQLITE_PATH = Path(os.getenv("CHAT_HISTORY_SQLITE_PATH", Path(__file__).parent / "chat_history.db"))
+# Most unsummarized messages loaded for one session
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", 200))
+
+# Share of successful requests, LLM calls and tool calls logged as JSON lines (errors are always logged)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))
+# Print LangChain's full agent trace (every tool input and output) to stdout
+AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
+
+# Chat model: "azure" (Azure OpenAI), "scripted" (offline stand-in for load tests, see scripted_llm.py)
+# or "replay" (recorded outputs from TRACE_REPLAY_PATH, see traces.py)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "azure")
+SCRIPTED_LLM_LATENCY_SECONDS = float(os.getenv("SCRIPTED_LLM_LATENCY_SECONDS", 0))
+
+# Several deployments for LLM_PROVIDER=azure, routed by recent latency and health (see llm_router.py), e.g.
+# [{"name": "eastus", "deployment_name": "gpt-4o", "azure_endpoint": "https://east.openai.azure.com"},
+#  {"name": "stub", "provider": "openai", "base_url": "http://localhost:9000/v1", "model": "stub"}]
+# Settings left out of an Azure entry come from DEPLOYMENT_NAME, AZURE_OPENAI_* and AZURE_API_VERSION
+LLM_DEPLOYMENTS = json.loads(os.getenv("LLM_DEPLOYMENTS", "[]"))
+LLM_ROUTER_WINDOW_SIZE = int(os.getenv("LLM_ROUTER_WINDOW_SIZE", 50))
+# A deployment unused this long is measured again
+LLM_ROUTER_STALE_SECONDS = float(os.getenv("LLM_ROUTER_STALE_SECONDS", 300))
+# Per-deployment breaker, like the MCP server breakers
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", 5))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", 0.5))
+LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", 60))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", 30))
+# Send a call still running after the deployment's LLM_HEDGE_PERCENTILE latency (at least
+# LLM_HEDGE_MIN_SECONDS) to the next deployment too, keeping whichever answers first
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.95))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", 1.0))
+
+# Request traces (see traces.py) - record every LLM and MCP tool call of each request to a JSONL file
+TRACE_RECORD_PATH = os.getenv("TRACE_RECORD_PATH", "")
+# Replaying a trace with LLM_PROVIDER=replay: tool results "live" from the MCP servers or "recorded"
+TRACE_REPLAY_PATH = os.getenv("TRACE_REPLAY_PATH", "")
+TRACE_REPLAY_TOOLS = os.getenv("TRACE_REPLAY_TOOLS", "live")
+# Wait as long as the recorded LLM (and recorded tool) calls took, instead of answering at once
+TRACE_REPLAY_SIMULATE_LATENCY = os.getenv("TRACE_REPLAY_SIMULATE_LATENCY", "false").lower() == "true"
@@ -0,0 +1,177 @@
+"""
+WebSocket chat connections - several conversations over one connection.
+
+The client sends JSON messages:
+
+    {"type": "message", "id": "r1", "session_id": "tab-1", "message": "Weather in Paris?"}
+    {"type": "cancel", "id": "r1"}
+
+and gets back the events of `stream_user_input` (`tool_start`, `tool_end`, `token`,
+`final`, `error`) tagged with the `id` and `session_id` of the message they answer, plus
+`cancelled` when a run was aborted. Runs on the same connection proceed concurrently
+(runs in the same session still take turns on the session lock), each goes through
+admission control like an HTTP request, and cancelling one aborts its agent run and
+tool calls.
+
+Backpressure: at most `send_queue_size` run events wait to be sent, so a client that
+reads slowly pauses its own runs instead of growing server memory, and a connection
+can have at most `max_runs` runs in flight; further messages are answered with an
+`error`. Replies to the client's own messages (errors, `cancelled`) skip the limit, so
+a cancel still works while the client is behind.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from admission import AdmissionController, AdmissionRejected, DeadlineExceeded
+
+
+class ConnectionStats:
+    """Counters across all WebSocket connections"""
+
+    def __init__(self):
+        self.open = 0
+        self.connections = 0
+        self.runs = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.send_waits = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "open_connections": self.open,
+            "connections": self.connections,
+            "runs": self.runs,
+            "cancelled_runs": self.cancelled,
+            "rejected_messages": self.rejected,
+            # Events that found the send queue full, i.e. the client was reading slower than the agent wrote
+            "send_queue_full": self.send_waits
+        }
+
+
+class ChatConnection:
+    """One WebSocket connection carrying the runs of any number of sessions"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        default_session_id: str,
+        stream: Callable[[str, str], AsyncIterator[Dict[str, Any]]],
+        admission: AdmissionController,
+        stats: ConnectionStats,
+        max_runs: int,
+        send_queue_size: int
+    ):
+        self.websocket = websocket
+        self.default_session_id = default_session_id
+        self.stream = stream
+        self.admission = admission
+        self.stats = stats
+        self.max_runs = max_runs
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        # One slot per run event waiting in the outbox
+        self.send_slots = asyncio.Semaphore(send_queue_size)
+        self.runs: Dict[str, asyncio.Task] = {}
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        """Queue a run event for the client, waiting while too many are unsent"""
+        if self.send_slots.locked():
+            self.stats.send_waits += 1
+        await self.send_slots.acquire()
+        self.outbox.put_nowait((event, True))
+
+    def reply(self, event: Dict[str, Any]) -> None:
+        """Queue a reply to a client message, without waiting"""
+        self.outbox.put_nowait((event, False))
+
+    async def sender(self) -> None:
+        while True:
+            event, counted = await self.outbox.get()
+            try:
+                await self.websocket.send_text(json.dumps(event, default=str))
+            finally:
+                if counted:
+                    self.send_slots.release()
+
+    async def run(self, request_id: str, session_id: str, message: str) -> None:
+        """Stream one agent run's events to the client"""
+        tag = {"id": request_id, "session_id": session_id}
+        admitted_at = None
+        try:
+            admitted_at = await self.admission.acquire()
+            async with self.admission.deadline():
+                async for event in self.stream(message, session_id):
+                    await self.send({**event, **tag})
+        except AdmissionRejected as e:
+            self.reply({"type": "error", **tag, "message": e.reason, "retry_after": e.retry_after})
+        except DeadlineExceeded as e:
+            self.reply({"type": "error", **tag, "message": str(e)})
+        except asyncio.CancelledError:
+            self.stats.cancelled += 1
+            self.reply({"type": "cancelled", **tag})
+            raise
+        finally:
+            if admitted_at is not None:
+                self.admission.release(admitted_at)
+
+    def start(self, request_id: str, session_id: str, message: str) -> Optional[str]:
+        """Start a run, or return why it can't be started"""
+        if not message.strip():
+            return "Empty message"
+        if request_id in self.runs:
+            return f"A request with id {request_id} is already running"
+        if len(self.runs) >= self.max_runs:
+            return f"At most {self.max_runs} requests can run at once on a connection"
+        task = asyncio.create_task(self.run(request_id, session_id, message))
+        self.runs[request_id] = task
+        task.add_done_callback(lambda _: self.runs.pop(request_id, None))
+        self.stats.runs += 1
+        return None
+
+    def handle(self, data: Dict[str, Any]) -> None:
+        kind = data.get("type")
+        request_id = str(data.get("id") or "")
+        if kind == "message":
+            session_id = str(data.get("session_id") or self.default_session_id)
+            problem = "Message needs an id" if not request_id else self.start(request_id, session_id, str(data.get("message") or ""))
+            if problem:
+                self.stats.rejected += 1
+                self.reply({"type": "error", "id": request_id, "session_id": session_id, "message": problem})
+        elif kind == "cancel":
+            task = self.runs.get(request_id)
+            if task:
+                task.cancel()
+        elif kind == "ping":
+            self.reply({"type": "pong", "id": request_id})
+        else:
+            self.reply({"type": "error", "id": request_id, "message": f"Unknown message type {kind!r}"})
+
+    async def serve(self) -> None:
+        """Read client messages until the connection closes, then cancel its runs"""
+        self.stats.open += 1
+        self.stats.connections += 1
+        sender = asyncio.create_task(self.sender())
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                try:
+                    data = json.loads(text)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    self.reply({"type": "error", "message": "Messages must be JSON objects"})
+                    continue
+                self.handle(data)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.stats.open -= 1
+            runs = list(self.runs.values())
+            for task in runs:
+                task.cancel()
+            await asyncio.gather(*runs, return_exceptions=True)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
@@ -0,0 +1,220 @@
+"""
+MCP tool discovery - lists tools from every configured MCP server concurrently.
+
+Each server gets its own timeout, so one slow or dead server neither delays startup
+beyond the slowest healthy server nor empties the tool list. Servers that failed are
+retried in the background and their tools are handed to a callback once they recover.
+
+With a schema cache, servers seen before start from their cached schemas straight
+away and are revalidated against the live server in the background.
+
+Connections with the "inprocess" transport name the directory of a bundled FastMCP
+server instead of a URL; its tools are listed and called in process (see inprocess.py).
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession
+from mcp.types import Tool as MCPTool
+
+from inprocess import INPROCESS, convert_inprocess_tool, load_server, server_version
+from schema_cache import ToolSchemaCache
+
+
+def describe_error(error: BaseException) -> str:
+    """Readable message for an error, unwrapping task group errors from the MCP client"""
+    while isinstance(error, BaseExceptionGroup) and error.exceptions:
+        error = error.exceptions[0]
+    return str(error) or type(error).__name__
+
+
+async def list_all_tools(session: ClientSession) -> List[MCPTool]:
+    """List every tool of a server, following pagination"""
+    tools: List[MCPTool] = []
+    cursor = None
+    while True:
+        page = await session.list_tools(cursor)
+        tools.extend(page.tools)
+        cursor = page.nextCursor
+        if not cursor:
+            return tools
+
+
+class ToolDiscovery:
+    """Discovers and tracks the tools offered by a set of MCP servers"""
+
+    def __init__(
+        self,
+        connections: Dict[str, Dict[str, Any]],
+        timeout_seconds: float,
+        retry_seconds: float,
+        max_retry_seconds: float,
+        on_tools_changed: Optional[Callable[[List[BaseTool]], None]] = None,
+        schema_cache: Optional[ToolSchemaCache] = None
+    ):
+        self.connections = connections
+        self.timeout_seconds = timeout_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.on_tools_changed = on_tools_changed
+        self.schema_cache = schema_cache
+        self.client = MultiServerMCPClient({
+            name: connection for name, connection in connections.items() if connection["transport"] != INPROCESS
+        })
+
+        self.tools_by_server: Dict[str, List[BaseTool]] = {}
+        self.schemas: Dict[str, List[Dict[str, Any]]] = {}
+        self.server_versions: Dict[str, Optional[str]] = {}
+        self.from_cache: set = set()
+        self.errors: Dict[str, str] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self._retry_task: Optional[asyncio.Task] = None
+        self._revalidate_task: Optional[asyncio.Task] = None
+
+    @property
+    def tools(self) -> List[BaseTool]:
+        """All tools from the servers that are currently loaded"""
+        return [tool for name in self.connections for tool in self.tools_by_server.get(name, [])]
+
+    @property
+    def tool_servers(self) -> Dict[str, str]:
+        """Map of tool name to the name of the server offering it"""
+        return {tool.name: name for name, tools in self.tools_by_server.items() for tool in tools}
+
+    async def discover(self) -> List[BaseTool]:
+        """List tools from all servers at once, keeping whatever the healthy ones return"""
+        live = [name for name in self.connections if not self._load_cached(name)]
+        await asyncio.gather(*(self._load_server(name) for name in live))
+        if self.from_cache:
+            self._revalidate_task = asyncio.create_task(self._revalidate_cached())
+        if self.errors:
+            self.start_retrying()
+        return self.tools
+
+    def is_inprocess(self, name: str) -> bool:
+        return self.connections[name]["transport"] == INPROCESS
+
+    def _load_cached(self, name: str) -> bool:
+        # In-process servers list their tools without any I/O, so they need no cache
+        if self.schema_cache is None or self.is_inprocess(name):
+            return False
+        entry = self.schema_cache.get(self.connections[name].get("url"))
+        if not entry:
+            return False
+        self._set_tools(name, self.schema_cache.tools_from_entry(entry), entry.get("server_version"))
+        self.from_cache.add(name)
+        print(f"MCP server '{name}' loaded {len(self.tools_by_server[name])} tools from the schema cache")
+        return True
+
+    async def _list_server(self, name: str) -> Tuple[Optional[str], List[MCPTool]]:
+        """Ask a server for its version and the definitions of all its tools"""
+        if self.is_inprocess(name):
+            server = load_server(self.connections[name]["path"])
+            return server_version(server), await server.list_tools()
+        async with self.client.session(name, auto_initialize=False) as session:
+            initialized = await session.initialize()
+            tools = await list_all_tools(session)
+        return initialized.serverInfo.version, tools
+
+    async def _load_server(self, name: str) -> bool:
+        started = time.monotonic()
+        try:
+            server_version, mcp_tools = await asyncio.wait_for(self._list_server(name), self.timeout_seconds)
+        except Exception as e:
+            self.errors[name] = describe_error(e)
+            print(f"MCP server '{name}' unavailable: {self.errors[name]}")
+            return False
+
+        self.load_seconds[name] = time.monotonic() - started
+        self.errors.pop(name, None)
+        self.from_cache.discard(name)
+        changed = self._set_tools(name, mcp_tools, server_version)
+        if changed and self.schema_cache is not None and not self.is_inprocess(name):
+            try:
+                self.schema_cache.put(self.connections[name].get("url"), server_version, mcp_tools)
+            except Exception as e:
+                # The cache only speeds up the next start, the tools are loaded either way
+                print(f"Could not update the MCP schema cache: {describe_error(e)}")
+        print(f"MCP server '{name}' loaded {len(mcp_tools)} tools in {self.load_seconds[name]:.2f}s")
+        return True
+
+    def _set_tools(self, name: str, mcp_tools: List[MCPTool], server_version: Optional[str]) -> bool:
+        """Install a server's tools, returning whether they differ from what it had before"""
+        schemas = [tool.model_dump(mode="json", exclude_none=True) for tool in mcp_tools]
+        changed = schemas != self.schemas.get(name) or server_version != self.server_versions.get(name)
+        self.schemas[name] = schemas
+        self.server_versions[name] = server_version
+        if changed or name not in self.tools_by_server:
+            self.tools_by_server[name] = [self._convert_tool(name, tool) for tool in mcp_tools]
+        return changed
+
+    def _convert_tool(self, name: str, tool: MCPTool) -> BaseTool:
+        connection = self.connections[name]
+        if connection["transport"] == INPROCESS:
+            server = load_server(connection["path"])
+            return convert_inprocess_tool(server, tool, name, threaded=connection.get("threaded", False))
+        # Tools open a session per call from the connection config, like MultiServerMCPClient.get_tools
+        return convert_mcp_tool_to_langchain_tool(None, tool, connection=connection, server_name=name)
+
+    async def _revalidate_cached(self) -> None:
+        # Check cached schemas against the live servers and swap in any that changed
+        names = list(self.from_cache)
+        before = {name: (self.schemas.get(name), self.server_versions.get(name)) for name in names}
+        await asyncio.gather(*(self._load_server(name) for name in names))
+        changed = [
+            name for name in names
+            if name not in self.errors and before[name] != (self.schemas.get(name), self.server_versions.get(name))
+        ]
+        if changed:
+            print(f"MCP tool schemas changed on {changed}, updating the agent")
+            if self.on_tools_changed:
+                self.on_tools_changed(self.tools)
+        if self.errors:
+            self.start_retrying()
+
+    def start_retrying(self) -> None:
+        """Start retrying failed servers in the background, if not already running"""
+        if self._retry_task is None or self._retry_task.done():
+            self._retry_task = asyncio.create_task(self._retry_failed())
+
+    async def _retry_failed(self) -> None:
+        delay = self.retry_seconds
+        while self.errors:
+            await asyncio.sleep(delay)
+            results = await asyncio.gather(*(self._load_server(name) for name in list(self.errors)))
+            if any(results) and self.on_tools_changed:
+                self.on_tools_changed(self.tools)
+            # Back off while servers stay down
+            delay = self.retry_seconds if any(results) else min(delay * 2, self.max_retry_seconds)
+
+    async def stop(self) -> None:
+        """Stop background revalidation and retries"""
+        for task in (self._revalidate_task, self._retry_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._revalidate_task = None
+        self._retry_task = None
+
+    def status(self) -> Dict[str, Any]:
+        """Get the discovery state of every server"""
+        return {
+            name: {
+                "healthy": name in self.tools_by_server and name not in self.errors,
+                "transport": self.connections[name]["transport"],
+                "from_cache": name in self.from_cache,
+                "server_version": self.server_versions.get(name),
+                "tools": [tool.name for tool in self.tools_by_server.get(name, [])],
+                "load_seconds": round(self.load_seconds[name], 3) if name in self.load_seconds else None,
+                "error": self.errors.get(name)
+            }
+            for name in self.connections
+        }
@@ -0,0 +1,221 @@
+"""
+Agent executor that controls how the tool calls of one agent step are run.
+
+When the LLM asks for several tools in the same turn (e.g. `get_weather_forecast` and
+`search_attractions`) they are dispatched concurrently across MCP servers, up to a
+per-step cap, or one after another in sequential mode. Each call gets a timeout, and
+every step records its wall time against the summed time of its tool calls so the
+gain from running them in parallel is visible.
+
+A request also has a time budget across all its LLM and tool calls. When it runs out
+(or the iteration limit is hit) the tool calls still in flight are cancelled and the
+request answers from the tool results gathered so far, instead of LangChain's
+"Agent stopped" message.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentFinish, AgentStep
+from pydantic import PrivateAttr
+
+from metrics import Counter, Histogram
+from tool_wrappers import ToolTimeout, current_tool_timeout
+
+CONCURRENT = "concurrent"
+SEQUENTIAL = "sequential"
+
+# Start of the output LangChain returns when it stops an agent early
+STOPPED_PREFIX = "Agent stopped due to"
+
+PARTIAL_ANSWER_PROMPT = """You are a helpful travel assistant. You ran out of time before you could finish \
+answering the user. Answer as well as you can using only the tool results below, and briefly say what you \
+could not check.
+
+User question: {question}
+
+Tool results:
+{results}
+
+Answer:"""
+
+
+def preview_observation(observation: Any, limit: int = 1000) -> str:
+    text = getattr(observation, "content", observation)
+    text = text if isinstance(text, str) else str(text)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def format_tool_results(steps: List[AgentStep]) -> str:
+    return "\n".join(
+        f"- {step.action.tool}({step.action.tool_input}): {preview_observation(step.observation)}" for step in steps
+    )
+
+
+async def run_with_timeout(call: Awaitable[Any], timeout: ToolTimeout) -> Any:
+    """Like asyncio.wait_for, but marks the call as timed out before cancelling it, so the
+    tool wrappers (the circuit breaker) see a timeout rather than just a cancellation"""
+
+    async def run() -> Any:
+        current_tool_timeout.set(timeout)
+        return await call
+
+    task = asyncio.create_task(run())
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout.seconds)
+    except asyncio.CancelledError:
+        # Cancelled from outside, e.g. the time budget ran out
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+    if done:
+        return task.result()
+    timeout.expired = True
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    raise asyncio.TimeoutError()
+
+
+class StepStats:
+    """Wall time versus summed tool time of agent steps, shared across requests"""
+
+    def __init__(self, logger: Optional[Any] = None):
+        self.logger = logger
+        self.steps = 0
+        self.tool_calls = 0
+        self.timeouts = 0
+        self.wall_time = Histogram()
+        self.tool_time = Histogram()
+        # Requests stopped early, by reason ("time" or "iterations")
+        self.budget_exhausted = Counter(("reason",))
+
+    def record(self, tools: List[str], wall_seconds: float, tool_seconds: float) -> None:
+        self.steps += 1
+        self.tool_calls += len(tools)
+        self.wall_time.observe(wall_seconds)
+        self.tool_time.observe(tool_seconds)
+        if self.logger:
+            self.logger.log(
+                "agent_step", tools=tools, wall_seconds=round(wall_seconds, 4), tool_seconds=round(tool_seconds, 4)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "steps": self.steps,
+            "tool_calls": self.tool_calls,
+            "timeouts": self.timeouts,
+            "budget_exhausted": {reason: int(count) for (reason,), count in self.budget_exhausted.values.items()},
+            "step_wall_seconds": self.wall_time.snapshot(),
+            "step_tool_seconds": self.tool_time.snapshot(),
+            # Above 1.0 means the steps' tool calls overlapped
+            "parallelism": round(self.tool_time.sum / self.wall_time.sum, 3) if self.wall_time.sum else 0.0
+        }
+
+
+class ToolStepExecutor(AgentExecutor):
+    """AgentExecutor with a per-step tool concurrency cap, per-tool timeouts, step timing
+    and a per-request time budget with partial answers
+
+    The time budget is `max_execution_time`, which LangChain enforces by cancelling the
+    run; `answer_reserve_seconds` on top of it are left for `answer_llm` to write the
+    partial answer.
+    """
+
+    tool_execution_mode: str = CONCURRENT
+    max_concurrent_tools: int = 4
+    default_tool_timeout: Optional[float] = None
+    tool_timeouts: Dict[str, float] = {}
+    step_stats: Optional[Any] = None
+    answer_llm: Optional[Any] = None
+    answer_reserve_seconds: float = 0.0
+
+    _step_semaphore: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+    _step_calls: List[Tuple[str, float, float]] = PrivateAttr(default_factory=list)
+    _gathered_steps: List[AgentStep] = PrivateAttr(default_factory=list)
+    _iterations: int = PrivateAttr(default=0)
+    _question: str = PrivateAttr(default="")
+
+    async def _aiter_next_step(self, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        # args are (name_to_tool_map, color_mapping, inputs, intermediate_steps, ...)
+        if self._iterations == 0:
+            self._gathered_steps = []
+            self._question = str((args[2] if len(args) > 2 else kwargs.get("inputs", {})).get("input", ""))
+        self._iterations += 1
+
+        # Tool calls of one step are gathered inside the parent's step, so bracket it
+        limit = 1 if self.tool_execution_mode == SEQUENTIAL else self.max_concurrent_tools
+        self._step_semaphore = asyncio.Semaphore(limit)
+        self._step_calls = []
+
+        async for output in super()._aiter_next_step(*args, **kwargs):
+            yield output
+
+        if self._step_calls and self.step_stats is not None:
+            first_start = min(start for _, start, _ in self._step_calls)
+            last_end = max(end for _, _, end in self._step_calls)
+            self.step_stats.record(
+                [name for name, _, _ in self._step_calls],
+                wall_seconds=last_end - first_start,
+                tool_seconds=sum(end - start for _, start, end in self._step_calls)
+            )
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        semaphore = self._step_semaphore or asyncio.Semaphore(self.max_concurrent_tools)
+        timeout = self.tool_timeouts.get(agent_action.tool, self.default_tool_timeout)
+        perform = super()._aperform_agent_action
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                step = await run_with_timeout(
+                    perform(name_to_tool_map, color_mapping, agent_action, run_manager),
+                    ToolTimeout(timeout)
+                )
+                # Kept here too, so results of a step cut short by the budget are not lost
+                self._gathered_steps.append(step)
+                return step
+            except asyncio.TimeoutError:
+                if self.step_stats is not None:
+                    self.step_stats.timeouts += 1
+                # Tell the LLM, so it can answer without this tool or try something else
+                return AgentStep(
+                    action=agent_action,
+                    observation=f"Tool '{agent_action.tool}' timed out after {timeout:g} seconds and returned no result."
+                )
+            finally:
+                self._step_calls.append((agent_action.tool, started, time.monotonic()))
+
+    async def _areturn(self, output: AgentFinish, intermediate_steps: list, run_manager=None) -> Dict[str, Any]:
+        if str(output.return_values.get("output", "")).startswith(STOPPED_PREFIX):
+            reason = "iterations" if self._iterations >= (self.max_iterations or float("inf")) else "time"
+            if self.step_stats is not None:
+                self.step_stats.budget_exhausted.inc(reason)
+            output = AgentFinish(
+                {"output": await self._partial_answer(run_manager), "budget_exhausted": reason},
+                output.log
+            )
+        return await super()._areturn(output, intermediate_steps, run_manager)
+
+    async def _partial_answer(self, run_manager=None) -> str:
+        """Best answer from the tool results gathered before the budget ran out"""
+        steps = self._gathered_steps
+        if not steps:
+            return "Sorry, I ran out of time before I could look anything up. Please try again or ask a narrower question."
+        results = format_tool_results(steps)
+        if self.answer_llm is not None and self.answer_reserve_seconds > 0:
+            try:
+                response = await asyncio.wait_for(
+                    self.answer_llm.ainvoke(
+                        PARTIAL_ANSWER_PROMPT.format(question=self._question, results=results),
+                        config={"callbacks": run_manager.get_child() if run_manager else None}
+                    ),
+                    self.answer_reserve_seconds
+                )
+                answer = getattr(response, "content", response)
+                if isinstance(answer, str) and answer.strip():
+                    return answer
+            except Exception as e:
+                # Timed out or failed; fall back to listing the results
+                print(f"Failed to write a partial answer: {e!r}")
+        return f"I ran out of time before I could finish, but here is what I found so far:\n{results}"
@@ -0,0 +1,295 @@
+"""
+Chat history stores - where each session's messages and running summary live.
+
+`InMemoryChatStore` keeps history in the process (lost on restart, one worker only).
+`SQLiteChatStore` keeps it in a SQLite database in WAL mode, so every uvicorn worker
+can serve every session and conversations survive restarts. SQLite histories load
+lazily, read only the unsummarized tail of a conversation (one page at most), and
+write each turn's messages and summary in a single batched transaction. Reads are
+served from the last load; `arefresh` picks up changes made by other workers, and the
+async methods run the database work in a thread so it never blocks the event loop.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from abc import abstractmethod
+from pathlib import Path
+from typing import List, Optional, Sequence, Set
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+
+class SessionHistory(BaseChatMessageHistory):
+    """Chat history of one session: unsummarized messages plus the running summary"""
+
+    summary: str = ""
+
+    @abstractmethod
+    def fold_point(self, count: int) -> int:
+        """Marker for the end of the oldest `count` messages, still valid after more are added"""
+
+    @abstractmethod
+    def fold(self, upto: int, summary: str) -> None:
+        """Replace the messages up to a `fold_point` with an updated summary"""
+
+    def flush(self) -> None:
+        """Persist buffered writes"""
+
+    def flush_later(self) -> None:
+        """Persist buffered writes without making the caller wait, e.g. for an evicted session"""
+        self.flush()
+
+    async def arefresh(self) -> None:
+        """Pick up changes made elsewhere since the history was loaded"""
+
+    async def aflush(self) -> None:
+        self.flush()
+
+    async def afold(self, upto: int, summary: str) -> None:
+        self.fold(upto, summary)
+
+
+class InMemorySessionHistory(SessionHistory):
+    """History held in process memory"""
+
+    def __init__(self):
+        self._messages: List[BaseMessage] = []
+        self.summary = ""
+        # Messages folded into the summary so far
+        self._folded = 0
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return list(self._messages)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._messages.extend(messages)
+
+    def fold_point(self, count: int) -> int:
+        return self._folded + count
+
+    def fold(self, upto: int, summary: str) -> None:
+        self._messages = self._messages[upto - self._folded:]
+        self._folded = upto
+        self.summary = summary
+
+    def clear(self) -> None:
+        self._messages = []
+        self._folded = 0
+        self.summary = ""
+
+
+class InMemoryChatStore:
+    """Default store: each session's history lives only as long as its session object"""
+
+    def history(self, session_id: str) -> SessionHistory:
+        return InMemorySessionHistory()
+
+    def flush_all(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteSessionHistory(SessionHistory):
+    """History of one session in a SQLiteChatStore"""
+
+    def __init__(self, store: "SQLiteChatStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+        # Loaded on first access, then reloaded by refresh() when another worker changed the session
+        self._loaded_version: Optional[int] = None
+        self._messages: List[BaseMessage] = []
+        # Row ids of the loaded messages
+        self._ids: List[int] = []
+        self._summary = ""
+        self._pending_messages: List[BaseMessage] = []
+        self._pending_fold: Optional[tuple] = None
+
+    def refresh(self) -> None:
+        version = self.store.session_version(self.session_id)
+        if version == self._loaded_version:
+            return
+        self._summary, self._messages, self._ids = self.store.load_session(self.session_id)
+        self._loaded_version = version
+
+    def _load(self) -> None:
+        if self._loaded_version is None:
+            self.refresh()
+
+    async def arefresh(self) -> None:
+        await asyncio.to_thread(self.refresh)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        self._load()
+        return self._messages + self._pending_messages
+
+    @property
+    def summary(self) -> str:
+        self._load()
+        return self._pending_fold[1] if self._pending_fold else self._summary
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._pending_messages.extend(messages)
+        self.store.mark_dirty(self)
+
+    def fold_point(self, count: int) -> int:
+        """Row id of the last of the oldest `count` messages (written first if still buffered)"""
+        self._load()
+        if count > len(self._ids):
+            self.flush()
+        return self._ids[count - 1]
+
+    def fold(self, upto: int, summary: str) -> None:
+        self.flush()
+        self._pending_fold = (upto, summary)
+        self.store.mark_dirty(self)
+        self.flush()
+
+    def flush(self) -> None:
+        if not self._pending_messages and not self._pending_fold:
+            return
+        messages, fold = self._pending_messages, self._pending_fold
+        self._pending_messages, self._pending_fold = [], None
+        try:
+            self._loaded_version = self.store.write_session(self.session_id, messages, fold)
+        except Exception:
+            self._pending_messages = messages + self._pending_messages
+            self._pending_fold = self._pending_fold or fold
+            raise
+        self.store.mark_clean(self)
+        self._summary, self._messages, self._ids = self.store.load_session(self.session_id)
+
+    def flush_later(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        loop.run_in_executor(None, self.flush)
+
+    async def aflush(self) -> None:
+        await asyncio.to_thread(self.flush)
+
+    async def afold(self, upto: int, summary: str) -> None:
+        await asyncio.to_thread(self.fold, upto, summary)
+
+    def clear(self) -> None:
+        self._pending_messages = []
+        self._pending_fold = None
+        self.store.mark_clean(self)
+        self._loaded_version = self.store.clear_session(self.session_id)
+        self._messages = []
+        self._ids = []
+        self._summary = ""
+
+
+class SQLiteChatStore:
+    """Chat histories for all sessions in one SQLite database (WAL mode)"""
+
+    def __init__(self, path: Path, page_size: int = 200):
+        self.path = Path(path)
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._dirty: Set[SQLiteSessionHistory] = set()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                folded_upto INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_by_session ON messages (session_id, id);
+        """)
+
+    def history(self, session_id: str) -> SessionHistory:
+        return SQLiteSessionHistory(self, session_id)
+
+    def session_version(self, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def load_session(self, session_id: str):
+        """Read the summary and the newest page of unsummarized messages, with their row ids"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, folded_upto FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            summary, folded_upto = row if row else ("", 0)
+            rows = self._conn.execute(
+                "SELECT id, message FROM messages WHERE session_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+                (session_id, folded_upto, self.page_size)
+            ).fetchall()
+        rows.reverse()
+        return summary, messages_from_dict([json.loads(message) for _, message in rows]), [row_id for row_id, _ in rows]
+
+    def write_session(self, session_id: str, messages: Sequence[BaseMessage], fold: Optional[tuple]) -> int:
+        """Append messages and/or apply a fold in one transaction, returning the new version"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+                if messages:
+                    self._conn.executemany(
+                        "INSERT INTO messages (session_id, message) VALUES (?, ?)",
+                        [(session_id, json.dumps(message_to_dict(message))) for message in messages]
+                    )
+                if fold:
+                    # The summary covers exactly the messages up to this row, whatever else was added since
+                    upto, summary = fold
+                    self._conn.execute(
+                        "UPDATE sessions SET summary = ?, folded_upto = MAX(folded_upto, ?) WHERE session_id = ?",
+                        (summary, upto, session_id)
+                    )
+                self._conn.execute("UPDATE sessions SET version = version + 1 WHERE session_id = ?", (session_id,))
+                version = self._conn.execute(
+                    "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def clear_session(self, session_id: str) -> int:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, version) VALUES (?, 1) ON CONFLICT(session_id) DO UPDATE "
+                "SET summary = '', folded_upto = 0, version = version + 1",
+                (session_id,)
+            )
+            row = self._conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0]
+
+    def mark_dirty(self, history: SQLiteSessionHistory) -> None:
+        self._dirty.add(history)
+
+    def mark_clean(self, history: SQLiteSessionHistory) -> None:
+        """Forget a history once it has nothing buffered, so evicted sessions can be freed"""
+        self._dirty.discard(history)
+
+    def flush_all(self) -> None:
+        """Write everything still buffered, e.g. before shutdown"""
+        dirty, self._dirty = self._dirty, set()
+        for history in dirty:
+            history.flush()
+
+    def close(self) -> None:
+        self.flush_all()
+        self._conn.close()
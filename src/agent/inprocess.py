@@ -0,0 +1,104 @@
+"""
+In-process MCP servers - mounts bundled FastMCP servers inside the agent process.
+
+On a single host the agent can import a server's `main.py` and call its tools through
+the FastMCP object directly instead of over streamable HTTP. Tools keep the schemas the
+server publishes and return the same content as over HTTP, without the JSON-RPC,
+HTTP and session set-up on every call.
+
+The bundled servers each have top-level `config`, `utils` and `models` modules (and
+the agent has its own `config`), so every server is imported with its own directory
+first on `sys.path` and its modules are taken out of `sys.modules` again afterwards.
+"""
+
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.exceptions import ToolError
+from mcp.types import TextContent
+from mcp.types import Tool as MCPTool
+
+INPROCESS = "inprocess"
+
+# Loaded servers by directory, so a server is only imported once per process
+_servers: Dict[Path, FastMCP] = {}
+
+
+def load_server(directory: Path, module_name: str = "main", attribute: str = "mcp") -> FastMCP:
+    """Import a FastMCP server from its directory without leaking its modules into sys.modules"""
+    directory = Path(directory).resolve()
+    if directory in _servers:
+        return _servers[directory]
+
+    local_modules = {path.stem for path in directory.glob("*.py")}
+    saved = {name: sys.modules.pop(name) for name in local_modules if name in sys.modules}
+    sys.path.insert(0, str(directory))
+    try:
+        spec = importlib.util.spec_from_file_location(f"inprocess_mcp_{directory.name.replace('-', '_')}", directory / f"{module_name}.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(directory))
+        # The server's functions keep references to their own modules
+        for name in local_modules:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+    server = getattr(module, attribute)
+    _servers[directory] = server
+    return server
+
+
+def server_version(server: FastMCP) -> Optional[str]:
+    """The version the server would report in its initialize response"""
+    return getattr(server._mcp_server, "version", None)
+
+
+def convert_result(result: Any) -> Tuple[Any, Optional[List[Any]]]:
+    """FastMCP call result -> (text content, non-text artifacts), as the HTTP adapter returns them"""
+    # Tools with an output schema return (content, structured content)
+    content = result[0] if isinstance(result, tuple) else result
+    texts = [block.text for block in content if isinstance(block, TextContent)]
+    others = [block for block in content if not isinstance(block, TextContent)]
+    if not texts:
+        text = ""
+    elif len(texts) == 1:
+        text = texts[0]
+    else:
+        text = texts
+    return text, others or None
+
+
+def convert_inprocess_tool(server: FastMCP, tool: MCPTool, server_name: str, threaded: bool = False) -> BaseTool:
+    """LangChain tool calling a FastMCP tool in process
+
+    `threaded` runs each call in a worker thread with its own event loop, for servers
+    whose tools block on network I/O and would otherwise stall the agent's event loop.
+    """
+
+    async def call_tool(runtime: Any = None, **arguments: Any) -> Tuple[Any, Optional[List[Any]]]:
+        try:
+            if threaded:
+                result = await asyncio.to_thread(lambda: asyncio.run(server.call_tool(tool.name, arguments)))
+            else:
+                result = await server.call_tool(tool.name, arguments)
+        except ToolError as e:
+            raise ToolException(str(e)) from e
+        return convert_result(result)
+
+    annotations = tool.annotations.model_dump() if tool.annotations is not None else {}
+    meta = {"_meta": tool.meta} if getattr(tool, "meta", None) is not None else {}
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description or "",
+        args_schema=tool.inputSchema,
+        coroutine=call_tool,
+        response_format="content_and_artifact",
+        metadata={**annotations, **meta} or None
+    )
@@ -0,0 +1,234 @@
+"""
+Background jobs - agent requests that run after the HTTP request has returned.
+
+`POST /jobs` queues a message and answers at once with a job id; a fixed pool of
+workers takes jobs off the queue in order. The job's events (`tool_start`, `tool_end`,
+`token`, then `final` or `error`, and last a `job` event with its status) are kept with
+it, so clients either poll the job for its status and answer or subscribe to the events
+as server-sent events, from the start, at any time. Finished jobs are kept for
+`result_ttl_seconds`, then dropped.
+
+With an `AdmissionController`, a worker holds one of its agent slots while it runs a
+job, so jobs share `max_concurrency` with interactive requests instead of adding to it.
+A job's own `timeout_seconds` is its deadline, from when it gets the slot.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from admission import AdmissionController
+from metrics import Counter, Histogram
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is full"""
+
+
+@dataclass
+class Job:
+    job_id: str
+    session_id: str
+    message: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    queued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    output: Optional[str] = None
+    error: Optional[str] = None
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    # Set and replaced whenever an event is added, to wake subscribers
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        self.events.append(event)
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def summary(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "queued_seconds": round((self.started_at or now) - self.queued_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "output": self.output,
+            "error": self.error
+        }
+
+
+class JobQueue:
+    """Bounded queue of agent jobs served by a fixed pool of workers"""
+
+    def __init__(
+        self,
+        run: Callable[[str, str], AsyncIterator[Dict[str, Any]]],
+        workers: int,
+        max_queue: int,
+        result_ttl_seconds: float,
+        timeout_seconds: float,
+        admission: Optional[AdmissionController] = None
+    ):
+        self.run = run
+        self.admission = admission
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl_seconds = result_ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+        # Metrics
+        self.running = 0
+        self.completed = Counter(("outcome",))
+        self.queue_time = Histogram()
+        self.run_time = Histogram()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        """Start the workers (needs a running event loop)"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for job in self.jobs.values():
+            if job.task:
+                job.task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, message: str, session_id: str) -> Job:
+        """Queue a message, raising JobQueueFull when the queue is at its limit"""
+        self._expire()
+        if self._queue is None:
+            raise RuntimeError("Job workers not started")
+        job = Job(job_id=uuid.uuid4().hex, session_id=session_id, message=message)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_queue} waiting), please retry later")
+        self.jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self.jobs.get(job_id)
+
+    def cancel(self, job: Job) -> None:
+        """Cancel a queued or running job"""
+        if job.finished:
+            return
+        if job.task:
+            job.task.cancel()
+        else:
+            # Still queued: the worker skips it
+            self._finish(job, CANCELLED, error="Cancelled before it started")
+
+    async def subscribe(self, job: Job) -> AsyncIterator[Dict[str, Any]]:
+        """The job's events so far, then new ones as they happen, until it finishes"""
+        sent = 0
+        while True:
+            changed = job.changed
+            while sent < len(job.events):
+                sent += 1
+                yield job.events[sent - 1]
+            if job.finished:
+                return
+            await changed.wait()
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.finished:
+                continue
+            admitted_at = await self.admission.acquire(background=True) if self.admission else None
+            try:
+                # Cancelled while waiting for an agent slot
+                if job.finished:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.monotonic()
+                self.queue_time.observe(job.started_at - job.queued_at)
+                self.running += 1
+                job.task = asyncio.create_task(self._run(job))
+                try:
+                    await asyncio.shield(job.task)
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                finally:
+                    self.running -= 1
+            finally:
+                if admitted_at is not None:
+                    self.admission.release(admitted_at)
+
+    async def _run(self, job: Job) -> None:
+        try:
+            async with asyncio.timeout(self.timeout_seconds):
+                async for event in self.run(job.message, job.session_id):
+                    job.add_event(event)
+                    if event["type"] == "final":
+                        job.output = event.get("output")
+                    elif event["type"] == "error":
+                        job.error = event.get("message")
+        except TimeoutError:
+            self._finish(job, FAILED, error=f"Job took longer than {self.timeout_seconds:g}s")
+        except asyncio.CancelledError:
+            self._finish(job, CANCELLED, error="Cancelled")
+            raise
+        else:
+            self._finish(job, FAILED if job.error else DONE)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = job.error or error
+        job.finished_at = time.monotonic()
+        if job.started_at is not None:
+            self.run_time.observe(job.finished_at - job.started_at)
+        self.completed.inc(status)
+        if status != DONE and not any(event["type"] in ("final", "error") for event in job.events):
+            job.add_event({"type": "error", "message": job.error})
+        job.add_event({"type": "job", **job.summary()})
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished and now - job.finished_at >= self.result_ttl_seconds
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self.depth,
+            "running": self.running,
+            "held": len(self.jobs),
+            "completed": {labels[0]: int(count) for labels, count in self.completed.values.items()},
+            "queue_time_seconds": self.queue_time.snapshot(),
+            "run_time_seconds": self.run_time.snapshot()
+        }
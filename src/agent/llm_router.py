@@ -0,0 +1,329 @@
+"""
+Latency-aware routing over several LLM deployments, with optional hedged requests.
+
+`RoutingChatModel` stands in for one chat model but sends each call to one of several
+deployments (Azure OpenAI deployments in other regions, OpenAI-compatible endpoints, or
+scripted stand-ins for local tests). Every deployment has a circuit breaker over its
+recent calls and keeps its recent latencies; a call goes to the deployment with the
+lowest recent median latency among those whose breaker is closed. A deployment that
+hasn't been used for a while counts as unmeasured and is tried again, so one that
+recovered gets back into rotation.
+
+With hedging on, a call still running after the primary deployment's recent p95 latency
+(at least `hedge_min_seconds`) is also sent to the next deployment; the first to answer
+wins and the other is cancelled. Streamed calls race to their first chunk and then
+stream from the winner. A call that fails moves on to the next deployment at once.
+Sync calls go through the same ranking and failover, without hedging.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextvars import copy_context
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import var_child_runnable_config
+
+from breaker import CLOSED, CircuitBreaker
+
+# Latencies of complete calls, and of streamed calls up to their first chunk
+COMPLETE = "complete"
+FIRST_CHUNK = "first_chunk"
+
+
+def percentile(values: Sequence[float], share: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+
+class Deployment:
+    """One LLM deployment, with the health and latency of its recent calls"""
+
+    def __init__(self, name: str, model: BaseChatModel, window_size: int, breaker: CircuitBreaker):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        self.latencies: Dict[str, Deque[float]] = {
+            COMPLETE: deque(maxlen=window_size),
+            FIRST_CHUNK: deque(maxlen=window_size)
+        }
+        self.last_used = 0.0
+        self.in_flight = 0
+
+        # Metrics
+        self.calls = 0
+        self.wins = 0
+        self.cancelled = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state == CLOSED
+
+    def latency(self, kind: str, share: float) -> Optional[float]:
+        return percentile(self.latencies[kind], share)
+
+    def status(self) -> Dict[str, Any]:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 4) if value is not None else None
+
+        return {
+            "healthy": self.healthy,
+            "calls": self.calls,
+            "wins": self.wins,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "latency_seconds": {
+                kind: {"p50": rounded(self.latency(kind, 0.5)), "p95": rounded(self.latency(kind, 0.95))}
+                for kind in (COMPLETE, FIRST_CHUNK)
+            },
+            "breaker": self.breaker.status()
+        }
+
+
+class DeploymentPool:
+    """Picks deployments by recent latency and health, hedging and failing over between them"""
+
+    def __init__(
+        self,
+        deployments: Sequence[Tuple[str, BaseChatModel]],
+        window_size: int = 50,
+        stale_seconds: float = 300.0,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_seconds: float = 1.0,
+        **breaker_settings: Any
+    ):
+        self.deployments = [
+            Deployment(name, model, window_size, CircuitBreaker(f"llm:{name}", **breaker_settings))
+            for name, model in deployments
+        ]
+        self.stale_seconds = stale_seconds
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_seconds = hedge_min_seconds
+
+        # Metrics
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def ranked(self, kind: str) -> List[Deployment]:
+        """Deployments to try in order: healthy ones first, fastest (or unmeasured) first"""
+        now = time.monotonic()
+
+        def score(deployment: Deployment) -> Tuple[bool, float, int]:
+            median = deployment.latency(kind, 0.5)
+            if median is None or now - deployment.last_used >= self.stale_seconds:
+                median = 0.0
+            return (not deployment.healthy, median, deployment.in_flight)
+
+        return sorted(self.deployments, key=score)
+
+    def hedge_delay(self, deployment: Deployment, kind: str) -> float:
+        tail = deployment.latency(kind, self.hedge_percentile)
+        return max(tail or 0.0, self.hedge_min_seconds)
+
+    async def _attempt(self, deployment: Deployment, kind: str, call: Callable[[Deployment], Awaitable[Any]]) -> Any:
+        if not deployment.breaker.allow():
+            raise RuntimeError(f"LLM deployment '{deployment.name}' is unavailable")
+        deployment.calls += 1
+        deployment.in_flight += 1
+        deployment.last_used = time.monotonic()
+        started = time.monotonic()
+        try:
+            result = await call(deployment)
+        except asyncio.CancelledError:
+            # Lost a hedge race, or the request was cancelled: says nothing about the deployment
+            deployment.cancelled += 1
+            deployment.breaker.release()
+            raise
+        except Exception as e:
+            deployment.breaker.record(False, time.monotonic() - started, error=repr(e))
+            raise
+        finally:
+            deployment.in_flight -= 1
+        seconds = time.monotonic() - started
+        deployment.breaker.record(True, seconds)
+        deployment.latencies[kind].append(seconds)
+        return result
+
+    def call_sync(self, call: Callable[[Deployment], Any], kind: str = COMPLETE) -> Tuple[Deployment, Any]:
+        """Run `call` on the best deployment, failing over to the others (no hedging without an event loop)"""
+        self.requests += 1
+        error: Optional[BaseException] = None
+        for attempt, deployment in enumerate(self.ranked(kind)):
+            if not deployment.breaker.allow():
+                continue
+            if attempt:
+                self.failovers += 1
+            deployment.calls += 1
+            deployment.in_flight += 1
+            deployment.last_used = time.monotonic()
+            started = time.monotonic()
+            try:
+                result = call(deployment)
+            except Exception as e:
+                deployment.breaker.record(False, time.monotonic() - started, error=repr(e))
+                print(f"LLM deployment '{deployment.name}' failed: {e!r}")
+                error = e
+                continue
+            finally:
+                deployment.in_flight -= 1
+            seconds = time.monotonic() - started
+            deployment.breaker.record(True, seconds)
+            deployment.latencies[kind].append(seconds)
+            deployment.wins += 1
+            return deployment, result
+        raise error or RuntimeError("No LLM deployment available")
+
+    async def call(self, call: Callable[[Deployment], Awaitable[Any]], kind: str = COMPLETE) -> Tuple[Deployment, Any]:
+        """Run `call` on the best deployment, hedging or failing over to the others"""
+        self.requests += 1
+        candidates = self.ranked(kind)
+        # Attempts in flight, with their deployment and start time
+        tasks: Dict[asyncio.Task, Tuple[Deployment, float]] = {}
+        hedged = False
+        error: Optional[BaseException] = None
+
+        def launch() -> bool:
+            if not candidates:
+                return False
+            deployment = candidates.pop(0)
+            tasks[asyncio.create_task(self._attempt(deployment, kind, call))] = (deployment, time.monotonic())
+            return True
+
+        launch()
+        primary = next(iter(tasks.values()))[0]
+        try:
+            while tasks:
+                timeout = None
+                if self.hedge and not hedged and candidates and candidates[0].healthy:
+                    timeout = self.hedge_delay(primary, kind)
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than this deployment's usual tail: ask the next one too
+                    hedged = True
+                    self.hedged += 1
+                    launch()
+                    continue
+                for task in done:
+                    deployment, _ = tasks.pop(task)
+                    if task.exception() is None:
+                        deployment.wins += 1
+                        if deployment is not primary and hedged:
+                            self.hedge_wins += 1
+                        # The losers took at least this long; without it a deployment that always loses looks unmeasured
+                        now = time.monotonic()
+                        for loser, started in tasks.values():
+                            loser.latencies[kind].append(now - started)
+                        return deployment, task.result()
+                    error = task.exception()
+                    print(f"LLM deployment '{deployment.name}' failed: {error!r}")
+                if not tasks:
+                    if not launch():
+                        break
+                    self.failovers += 1
+            raise error or RuntimeError("No LLM deployment available")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            # Hedged requests the second deployment answered first
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "hedging": self.hedge,
+            "deployments": {deployment.name: deployment.status() for deployment in self.deployments}
+        }
+
+
+class RoutingChatModel(BaseChatModel):
+    """Chat model sending each call to the fastest healthy deployment of a pool"""
+
+    pool: DeploymentPool
+    # The deployments' models with the agent's tools bound, by deployment name
+    bound: Dict[str, Runnable] = {}
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @property
+    def _llm_type(self) -> str:
+        return "routing"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        bound = {deployment.name: deployment.model.bind_tools(tools, **kwargs) for deployment in self.pool.deployments}
+        return self.model_copy(update={"bound": bound})
+
+    def model_for(self, deployment: Deployment) -> Runnable:
+        # Each attempt runs in its own task: drop the routing model's run from its context, so the
+        # deployment's call isn't reported to the request's callbacks a second time (or when cancelled)
+        var_child_runnable_config.set(None)
+        return self.bound.get(deployment.name, deployment.model)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        async def invoke(deployment: Deployment) -> BaseMessage:
+            return await self.model_for(deployment).ainvoke(messages, stop=stop, **kwargs)
+
+        _, message = await self.pool.call(invoke)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async def first_chunk(deployment: Deployment) -> Tuple[Optional[AIMessageChunk], AsyncIterator]:
+            stream = self.model_for(deployment).astream(messages, stop=stop, **kwargs)
+            try:
+                return await anext(stream), stream
+            except StopAsyncIteration:
+                return None, stream
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        deployment, (chunk, stream) = await self.pool.call(first_chunk, kind=FIRST_CHUNK)
+        try:
+            while chunk is not None:
+                if not isinstance(chunk, AIMessageChunk):
+                    # Models that can't stream answer with one whole message
+                    chunk = AIMessageChunk(**chunk.model_dump(exclude={"type"}))
+                yield ChatGenerationChunk(message=chunk)
+                chunk = await anext(stream, None)
+        except Exception as e:
+            # Failed after it started answering: too late to fail over, but it counts against the deployment
+            deployment.breaker.record(False, 0.0, error=repr(e))
+            raise
+        finally:
+            await stream.aclose()
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        def invoke(deployment: Deployment) -> BaseMessage:
+            # In a copy of the context, so dropping the routing model's run doesn't leak to the caller
+            return copy_context().run(lambda: self.model_for(deployment).invoke(messages, stop=stop, **kwargs))
+
+        _, message = self.pool.call_sync(invoke)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def create_deployment_model(settings: Dict[str, Any], defaults: Dict[str, Any]) -> BaseChatModel:
+    """A chat model for one entry of LLM_DEPLOYMENTS"""
+    settings = dict(settings)
+    settings.pop("name", None)
+    provider = settings.pop("provider", "azure")
+    if provider == "scripted":
+        from scripted_llm import ScriptedChatModel
+        return ScriptedChatModel(**settings)
+    if provider == "openai":
+        # Any OpenAI-compatible endpoint, e.g. a local stub: {"provider": "openai", "base_url": "http://localhost:9000/v1"}
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(**{"api_key": "unused", "stream_usage": True, **settings})
+    from langchain_openai import AzureChatOpenAI
+    return AzureChatOpenAI(**{**defaults, **settings})
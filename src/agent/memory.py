@@ -0,0 +1,103 @@
+"""
+Token-budgeted conversation memory with a rolling summary.
+
+The last few turns are kept verbatim; older turns are folded into a running summary
+so the prompt stays within a fixed token budget however long the chat gets. Folding
+calls the LLM, so it runs in the background after the response has been sent rather
+than on the request path. The messages and the summary are kept in the session's
+chat history (see history.py), so they persist with whichever store is configured.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from pydantic import Field
+
+from history import InMemorySessionHistory, SessionHistory
+
+SUMMARY_PROMPT = """Progressively summarize the conversation between a user and a travel assistant, \
+adding onto the previous summary and returning a new summary. Keep every detail the assistant may need \
+later: names, locations, dates, activities, bookings, preferences and open questions.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+
+def count_tokens(messages: List[BaseMessage]) -> int:
+    """Cheap token estimate (~4 characters per token plus per-message overhead)"""
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+class RollingSummaryMemory(BaseChatMemory):
+    """Keeps the last turns verbatim and older turns as an incrementally updated summary"""
+
+    chat_memory: SessionHistory = Field(default_factory=InMemorySessionHistory)
+    llm: Optional[BaseLanguageModel] = None
+    memory_key: str = "chat_history"
+    output_key: Optional[str] = "output"
+    return_messages: bool = True
+    max_token_budget: int = 2000
+    keep_last_turns: int = 4
+    folding: bool = False
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def summary(self) -> str:
+        return self.chat_memory.summary
+
+    def summary_message(self) -> List[BaseMessage]:
+        if not self.summary:
+            return []
+        return [SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")]
+
+    def recent_messages(self) -> List[BaseMessage]:
+        """Messages sent verbatim: the last turns, cut down further if they exceed the budget"""
+        messages = self.chat_memory.messages[-self.keep_last_turns * 2:] if self.keep_last_turns else []
+        budget = self.max_token_budget - count_tokens(self.summary_message())
+        # Drop whole turns from the front until the rest fits, always keeping the last one
+        while len(messages) > 2 and count_tokens(messages) > budget:
+            messages = messages[2:]
+        return messages
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.summary_message() + self.recent_messages()
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages)}
+
+    def prompt_tokens(self) -> int:
+        """Estimated tokens the memory adds to the next prompt"""
+        return count_tokens(self.summary_message() + self.recent_messages())
+
+    def needs_fold(self) -> bool:
+        """Whether there are messages outside the verbatim window waiting to be summarized"""
+        return self.llm is not None and len(self.chat_memory.messages) > len(self.recent_messages())
+
+    async def afold(self) -> None:
+        """Fold the messages that fell out of the verbatim window into the summary"""
+        if self.folding or not self.needs_fold():
+            return
+        self.folding = True
+        try:
+            # Stored first, so every folded message has its place in the history
+            await self.chat_memory.aflush()
+            messages = self.chat_memory.messages
+            folded = messages[:len(messages) - len(self.recent_messages())]
+            upto = self.chat_memory.fold_point(len(folded))
+            prompt = SUMMARY_PROMPT.format(summary=self.summary or "(none)", new_lines=get_buffer_string(folded))
+            response = await self.llm.ainvoke(prompt)
+
+            # Turns added while summarizing stay after `upto`
+            await self.chat_memory.afold(upto, getattr(response, "content", response).strip())
+        finally:
+            self.folding = False
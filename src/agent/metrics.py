@@ -0,0 +1,163 @@
+"""
+Lightweight in-process metrics for the travel agent server.
+
+`MetricsRegistry.render()` writes every registered metric in the Prometheus text
+exposition format for the server's `/metrics` endpoint.
+"""
+
+import bisect
+import json
+import random
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Cumulative bucketed histogram of observed values"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one observation"""
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get count, sum and mean of the observations so far"""
+        return {"count": self.count, "sum": round(self.sum, 6), "mean": round(self.mean, 6)}
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """Prometheus samples: cumulative buckets, sum and count"""
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": f"{bound:g}"}, cumulative
+        yield f"{name}_bucket", {**labels, "le": "+Inf"}, self.count
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class LabeledHistogram:
+    """One histogram per combination of label values"""
+
+    def __init__(self, label_names: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self.children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        histogram = self.children.get(values)
+        if histogram is None:
+            histogram = self.children[values] = Histogram(self.buckets)
+        return histogram
+
+    def observe(self, value: float, *label_values: str) -> None:
+        self.labels(*label_values).observe(value)
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for values, histogram in sorted(self.children.items()):
+            yield from histogram.samples(name, {**labels, **dict(zip(self.label_names, values))})
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+
+    def __init__(self, label_names: Sequence[str] = ()):
+        self.label_names = tuple(label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for values, value in sorted(self.values.items()):
+            yield f"{name}_total", {**labels, **dict(zip(self.label_names, values))}, value
+
+
+class Gauge:
+    """Value read from a callback when the metrics are rendered"""
+
+    def __init__(self, read: Callable[[], float]):
+        self.read = read
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        yield name, labels, self.read()
+
+
+class CallbackCounter:
+    """Monotonic total read from a callback when the metrics are rendered, e.g. a component's own tally"""
+
+    def __init__(self, read: Callable[[], float]):
+        self.read = read
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        yield f"{name}_total", labels, self.read()
+
+
+def escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """Named metrics with help text, rendered together for Prometheus"""
+
+    def __init__(self, prefix: str = "travel_agent"):
+        self.prefix = prefix
+        self._metrics: Dict[str, Tuple[str, str, Any]] = {}
+
+    def register(self, name: str, kind: str, help_text: str, metric: Any) -> Any:
+        """Add an existing metric (e.g. a component's Histogram) under a name"""
+        self._metrics[f"{self.prefix}_{name}"] = (kind, help_text, metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        metric = LabeledHistogram(label_names, buckets) if label_names else Histogram(buckets)
+        return self.register(name, "histogram", help_text, metric)
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(name, "counter", help_text, Counter(label_names))
+
+    def callback_counter(self, name: str, help_text: str, read: Callable[[], float]) -> CallbackCounter:
+        """Counter whose total is kept by a component and read at render time"""
+        return self.register(name, "counter", help_text, CallbackCounter(read))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self.register(name, "gauge", help_text, Gauge(read))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, (kind, help_text, metric) in self._metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in metric.samples(name, {}):
+                lines.append(f"{sample_name}{format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class SampledLogger:
+    """Prints one JSON line per event for a random sample of events; errors are always logged"""
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+
+    def log(self, event: str, error: bool = False, **fields: Any) -> None:
+        if not error and random.random() >= self.sample_rate:
+            return
+        print(json.dumps({"event": event, **fields}, default=str))
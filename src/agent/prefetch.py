@@ -0,0 +1,325 @@
+"""
+Speculative prefetch - starts likely tool calls while the LLM is still reading the message.
+
+For "what should I pack for a hike in Edinburgh" the agent's first LLM call only decides
+to call `get_weather_forecast("Edinburgh")` and `get_suggested_packing_list("day_hike")`.
+The prefetcher finds the places and activities in the message locally - against the
+places in the attractions catalog plus a list of major cities, and the activity names
+from `list_activities` - and starts those read-only calls through the tool result
+cache as the request begins. When the LLM asks for them, the result is cached already
+or the call is in flight and shared.
+
+A call only helps if the LLM makes it with the same arguments, so the prefetcher
+watches the agent's calls to these tools and uses the arguments it most often adds
+(e.g. `days`). Prefetched calls the agent used are hits, the others are waste.
+"""
+
+import asyncio
+import json
+import re
+import time
+from collections import Counter as CallCounter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.tools import BaseTool
+
+from router import parse_result
+from tool_selection import stem
+from tool_wrappers import ToolCall, normalize_arguments, schema_defaults, wrap_tool
+
+# The prefetch of the request being handled, for the tool wrapper
+current_prefetch: ContextVar[Optional["PrefetchRun"]] = ContextVar("current_prefetch", default=None)
+
+# Places known without asking any MCP server, added to those in the attractions catalog
+MAJOR_CITIES = (
+    "Amsterdam", "Athens", "Auckland", "Bangkok", "Barcelona", "Beijing", "Berlin", "Boston", "Brussels",
+    "Budapest", "Buenos Aires", "Cairo", "Cape Town", "Chicago", "Copenhagen", "Delhi", "Denver", "Dubai",
+    "Dublin", "Edinburgh", "Florence", "Geneva", "Hong Kong", "Istanbul", "Kyoto", "Lisbon", "London",
+    "Los Angeles", "Madrid", "Melbourne", "Mexico City", "Miami", "Milan", "Montreal", "Moscow", "Mumbai",
+    "Munich", "Nairobi", "New York", "Oslo", "Paris", "Prague", "Reykjavik", "Rio de Janeiro", "Rome",
+    "San Francisco", "Seattle", "Seoul", "Shanghai", "Singapore", "Stockholm", "Sydney", "Tokyo",
+    "Toronto", "Vancouver", "Venice", "Vienna", "Warsaw", "Zurich"
+)
+
+# Words of activity names too generic to name the activity on their own ("day", "trip", ...)
+GENERIC_ACTIVITY_WORDS = {"day", "multi", "trip", "travel", "break", "city", "road", "workout"}
+
+# A capitalized place after a preposition, for places in no catalog: "a hike in Glen Coe"
+PLACE_AFTER_PREPOSITION = re.compile(r"\b(?:in|to|at|near|around|visiting)\s+((?:[A-Z][\w.'-]*)(?:\s+[A-Z][\w.'-]*){0,2})")
+
+WORD = re.compile(r"[A-Za-z][A-Za-z.'-]*")
+
+ATTRACTIONS_TOOL = "search_attractions"
+ACTIVITIES_TOOL = "list_activities"
+
+
+def match_stem(word: str) -> str:
+    """Stem for matching, so "hike", "hikes" and "hiking" agree"""
+    return stem(word.lower().strip(".'-")).rstrip("e")
+
+
+class PhraseMatcher:
+    """Finds known phrases of up to a few words in a text, longest first"""
+
+    def __init__(self, normalize: Callable[[str], str] = str.lower, max_words: int = 3):
+        self.normalize = normalize
+        self.max_words = max_words
+        self.phrases: Dict[Tuple[str, ...], str] = {}
+
+    def add(self, phrase: str, value: str, replace: bool = True) -> None:
+        key = tuple(self.normalize(word) for word in WORD.findall(phrase))
+        if key and len(key) <= self.max_words and (replace or key not in self.phrases):
+            self.phrases[key] = value
+
+    def find(self, text: str) -> List[str]:
+        words = [self.normalize(word) for word in WORD.findall(text)]
+        found: List[str] = []
+        index = 0
+        while index < len(words):
+            for size in range(min(self.max_words, len(words) - index), 0, -1):
+                value = self.phrases.get(tuple(words[index:index + size]))
+                if value is not None:
+                    if value not in found:
+                        found.append(value)
+                    index += size
+                    break
+            else:
+                index += 1
+        return found
+
+
+def catalog_places(result: Any) -> List[str]:
+    """Cities, regions and countries of the attractions in a search_attractions result"""
+    places = []
+    for attraction in (result.get("attractions") or []) if isinstance(result, dict) else []:
+        location = attraction.get("location") or {}
+        places.extend(value for key, value in location.items() if key != "coordinates" and isinstance(value, str) and value)
+    return places
+
+
+def catalog_activities(result: Any) -> List[str]:
+    """Activity names in a list_activities result"""
+    activities = (result.get("activities") or []) if isinstance(result, dict) else []
+    return [activity["name"] for activity in activities if isinstance(activity, dict) and activity.get("name")]
+
+
+@dataclass
+class PrefetchRule:
+    """A tool worth calling early when the message names a place or activity and mentions a keyword"""
+    tool: str
+    # "place" or "activity", and the tool argument it fills
+    slot: str
+    argument: str
+    # Stems of which at least one must be in the message
+    keywords: Sequence[str]
+
+
+DEFAULT_RULES = [
+    PrefetchRule("get_weather_forecast", "place", "location",
+                 ("weather", "forecast", "rain", "temperatur", "pack", "bring", "wear", "cold", "warm", "snow", "sunny")),
+    PrefetchRule("search_attractions", "place", "location",
+                 ("attraction", "see", "visit", "sight", "sightsee", "museum", "landmark", "tour", "thing")),
+    PrefetchRule("get_suggested_packing_list", "activity", "activity",
+                 ("pack", "bring", "need", "take", "wear", "list"))
+]
+
+
+@dataclass
+class PrefetchRun:
+    """The calls prefetched for one request, and which of them the agent used"""
+    keys: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    used: Set[Tuple[str, str]] = field(default_factory=set)
+    # Calls that returned a result
+    completed: Set[Tuple[str, str]] = field(default_factory=set)
+    tasks: List[asyncio.Task] = field(default_factory=list)
+    # Set once the request is done; no prefetches start after it
+    finished: bool = False
+
+
+class Prefetcher:
+    """Starts the calls a message probably needs, and measures how many the agent used"""
+
+    def __init__(
+        self,
+        get_tools: Callable[[], Sequence[BaseTool]],
+        rules: Optional[Sequence[PrefetchRule]] = None,
+        max_places: int = 2,
+        timeout_seconds: float = 30.0,
+        case_insensitive: Optional[Dict[str, List[str]]] = None
+    ):
+        self.get_tools = get_tools
+        self.rules = list(rules or DEFAULT_RULES)
+        self.max_places = max_places
+        self.timeout_seconds = timeout_seconds
+        # Arguments per tool whose case doesn't matter, so "paris" from the LLM matches a prefetch for "Paris"
+        self.case_insensitive = case_insensitive or {}
+        self.places = PhraseMatcher()
+        self.activities = PhraseMatcher(match_stem)
+        self._catalogs: Optional[asyncio.Task] = None
+        # Arguments the agent added besides the slot, counted per tool
+        self.argument_shapes: Dict[str, CallCounter] = {rule.tool: CallCounter() for rule in self.rules}
+
+        # Metrics
+        self.requests = 0
+        self.prefetched: Dict[str, int] = {}
+        self.hits: Dict[str, int] = {}
+        self.wasted: Dict[str, int] = {}
+        # Unused calls that ran to completion, the ones that cost a full tool call
+        self.wasted_completed: Dict[str, int] = {}
+        self.agent_calls = 0
+        self.failures = 0
+
+    def update(self) -> None:
+        """The tools changed; reload the catalogs on the next request"""
+        self._catalogs = None
+
+    async def load_catalogs(self) -> None:
+        self.places = PhraseMatcher()
+        for city in MAJOR_CITIES:
+            self.places.add(city, city)
+        self.activities = PhraseMatcher(match_stem)
+        tools = {tool.name: tool for tool in self.get_tools()}
+        if ATTRACTIONS_TOOL in tools:
+            result = parse_result(await tools[ATTRACTIONS_TOOL].ainvoke({"limit": 100}))
+            for place in catalog_places(result):
+                self.places.add(place, place)
+        if ACTIVITIES_TOOL in tools:
+            names = catalog_activities(parse_result(await tools[ACTIVITIES_TOOL].ainvoke({})))
+            # Whole names first, then single distinctive words; shorter names win a shared word ("hike")
+            for name in names:
+                self.activities.add(name.replace("_", " "), name)
+            for name in sorted(names, key=lambda name: name.count("_")):
+                for word in name.split("_"):
+                    if word not in GENERIC_ACTIVITY_WORDS:
+                        self.activities.add(word, name, replace=False)
+
+    def find_places(self, text: str) -> List[str]:
+        places = self.places.find(text)
+        if not places:
+            places = [match.group(1) for match in PLACE_AFTER_PREPOSITION.finditer(text)]
+        return places[:self.max_places]
+
+    def plan(self, text: str) -> List[Tuple[BaseTool, Dict[str, Any]]]:
+        """The calls to start for a message"""
+        terms = {match_stem(word) for word in WORD.findall(text)}
+        slots = {"place": self.find_places(text), "activity": self.activities.find(text)[:1]}
+        tools = {tool.name: tool for tool in self.get_tools()}
+        calls = []
+        for rule in self.rules:
+            tool = tools.get(rule.tool)
+            if tool is None or not any(match_stem(keyword) in terms for keyword in rule.keywords):
+                continue
+            shape = self.argument_shapes[rule.tool].most_common(1)
+            extra = json.loads(shape[0][0]) if shape else {}
+            for value in slots[rule.slot]:
+                calls.append((tool, {**extra, rule.argument: value}))
+        return calls
+
+    def start(self, text: str) -> PrefetchRun:
+        """Start prefetching for a message; tool calls in this context are checked against it"""
+        run = PrefetchRun()
+        current_prefetch.set(run)
+        self.requests += 1
+        run.tasks.append(asyncio.create_task(self._prefetch(run, text)))
+        return run
+
+    async def _prefetch(self, run: PrefetchRun, text: str) -> None:
+        if self._catalogs is None:
+            self._catalogs = asyncio.create_task(self.load_catalogs())
+        try:
+            await asyncio.shield(self._catalogs)
+        except Exception as e:
+            print(f"Failed to load prefetch catalogs: {e}")
+            self._catalogs = None
+            return
+        # The request may have been answered while the catalogs loaded
+        if run.finished:
+            return
+        for tool, arguments in self.plan(text):
+            key = (tool.name, normalize_arguments(arguments, schema_defaults(tool), self.case_insensitive.get(tool.name, ())))
+            if key in run.keys:
+                continue
+            run.keys[key] = tool.name
+            self.count(self.prefetched, tool.name)
+            run.tasks.append(asyncio.create_task(self._call(run, key, tool, arguments)))
+
+    async def _call(self, run: PrefetchRun, key: Tuple[str, str], tool: BaseTool, arguments: Dict[str, Any]) -> None:
+        try:
+            # Through the tool cache, which keeps the result (or shares the call in flight)
+            await asyncio.wait_for(tool.ainvoke(arguments), self.timeout_seconds)
+        except Exception:
+            self.failures += 1
+            return
+        run.completed.add(key)
+        if run.finished and key not in run.used:
+            # Finished after the request did: nobody is left to use it
+            self.count(self.wasted_completed, tool.name)
+
+    @staticmethod
+    def count(counts: Dict[str, int], tool_name: str) -> None:
+        counts[tool_name] = counts.get(tool_name, 0) + 1
+
+    def finish(self, run: PrefetchRun, cancel: bool = False) -> None:
+        """Count the request's unused prefetches; cancel those still running if it was abandoned"""
+        if current_prefetch.get() is run:
+            current_prefetch.set(None)
+        run.finished = True
+        for key, tool_name in run.keys.items():
+            if key not in run.used:
+                self.count(self.wasted, tool_name)
+                if key in run.completed:
+                    self.count(self.wasted_completed, tool_name)
+        if cancel:
+            for task in run.tasks:
+                task.cancel()
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """Return a copy of `tool` whose calls by the agent are matched with the request's prefetches"""
+        rule = next((rule for rule in self.rules if rule.tool == tool.name), None)
+        if rule is None:
+            return tool
+        defaults = schema_defaults(tool)
+        case_insensitive = self.case_insensitive.get(tool.name, ())
+
+        async def observe_call(tool_name: str, arguments: Dict[str, Any], call_next: ToolCall) -> Any:
+            self.agent_calls += 1
+            extra = {name: value for name, value in arguments.items() if name != rule.argument and value is not None}
+            self.argument_shapes[tool_name][json.dumps(extra, sort_keys=True, default=str)] += 1
+            run = current_prefetch.get()
+            key = (tool_name, normalize_arguments(arguments, defaults, case_insensitive))
+            if run is not None and key in run.keys and key not in run.used:
+                run.used.add(key)
+                self.count(self.hits, tool_name)
+            return await call_next(arguments)
+
+        return wrap_tool(tool, observe_call)
+
+    def stats(self) -> Dict[str, Any]:
+        prefetched = sum(self.prefetched.values())
+        hits = sum(self.hits.values())
+        wasted = sum(self.wasted.values())
+        wasted_completed = sum(self.wasted_completed.values())
+        return {
+            "requests": self.requests,
+            "prefetched": prefetched,
+            "hits": hits,
+            "wasted": wasted,
+            "wasted_completed": wasted_completed,
+            # Share of prefetched calls the agent used, and share it never asked for
+            "hit_rate": round(hits / prefetched, 4) if prefetched else 0.0,
+            "waste_rate": round(wasted / prefetched, 4) if prefetched else 0.0,
+            # Share of the agent's calls to these tools that had been prefetched
+            "coverage": round(hits / self.agent_calls, 4) if self.agent_calls else 0.0,
+            "failures": self.failures,
+            "per_tool": {
+                name: {
+                    "prefetched": self.prefetched.get(name, 0),
+                    "hits": self.hits.get(name, 0),
+                    "wasted": self.wasted.get(name, 0),
+                    "wasted_completed": self.wasted_completed.get(name, 0)
+                }
+                for name in sorted(self.prefetched)
+            }
+        }
@@ -0,0 +1,262 @@
+"""
+Fast-path intent router - answers simple, single-tool requests without the LLM.
+
+Messages such as "list endorsements", "show my packing list" or "weather in London"
+need exactly one MCP tool call. The router recognises them with patterns that must
+match the whole message, calls the tool directly and fills in an answer template.
+Anything it does not recognise with confidence (or where the tool fails) goes to the
+full agent. Intents are plain data, so more can be registered.
+"""
+
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.tools import BaseTool
+
+from metrics import Histogram
+from tool_wrappers import is_error_result, is_fallback
+
+# Location in a message: up to four words of letters, dots, apostrophes and hyphens. Words that
+# join clauses are excluded, so "weather in Paris and what to see" is left to the agent.
+LOCATION_WORD = r"(?!(?:and|or|but|then|also|with|what|how|where|when|which|for)\b)[a-z][a-z.'-]*"
+LOCATION = rf"(?P<location>{LOCATION_WORD}(?: {LOCATION_WORD}){{0,3}}?)"
+
+
+@dataclass
+class Intent:
+    """A simple request answered by one tool call and a template"""
+    name: str
+    tool: str
+    # Regexes matched (case-insensitively) against the whole message
+    patterns: Sequence[str]
+    # Answer from the parsed tool result, or None to hand the request to the agent
+    render: Callable[[Any, Dict[str, Any]], Optional[str]]
+    # Tool arguments from the pattern's named groups
+    arguments: Callable[[Dict[str, str]], Dict[str, Any]] = lambda groups: {}
+    compiled: List[re.Pattern] = field(default_factory=list, init=False)
+
+    def __post_init__(self):
+        self.compiled = [re.compile(rf"^(?:{pattern})$", re.IGNORECASE) for pattern in self.patterns]
+
+    def match(self, text: str) -> Optional[Dict[str, str]]:
+        for pattern in self.compiled:
+            match = pattern.match(text)
+            if match:
+                return {key: value.strip() for key, value in match.groupdict().items() if value}
+        return None
+
+
+def normalize_message(text: str) -> str:
+    """Collapse whitespace and drop polite padding and trailing punctuation"""
+    text = re.sub(r"\s+", " ", text).strip()
+    text = re.sub(r"^(?:hi|hello|hey)[,!. ]+", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"^(?:please|can you|could you)\s+", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"[\s,]+please$", "", text, flags=re.IGNORECASE)
+    return text.rstrip(" ?!.")
+
+
+def parse_result(result: Any) -> Any:
+    """Tool output as JSON when it is JSON, otherwise as text"""
+    text = getattr(result, "content", result)
+    if isinstance(text, str):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+    return text
+
+
+def location_arguments(groups: Dict[str, str]) -> Dict[str, Any]:
+    return {"location": groups["location"].title()}
+
+
+def render_endorsements(result: Any, groups: Dict[str, str]) -> Optional[str]:
+    return result.get("formatted_display") if isinstance(result, dict) else None
+
+
+def render_activities(result: Any, groups: Dict[str, str]) -> Optional[str]:
+    if not isinstance(result, dict) or "activities" not in result:
+        return None
+    lines = [f"- **{activity['name']}** ({activity.get('category', '')}): {activity.get('description', '')}"
+             for activity in result["activities"]]
+    categories = ", ".join(result.get("categories", []))
+    return f"I can suggest packing lists for these activities (categories: {categories}):\n" + "\n".join(lines)
+
+
+def render_packing_list(result: Any, groups: Dict[str, str]) -> Optional[str]:
+    if not isinstance(result, str):
+        return None
+    if not result.strip():
+        return "You don't have a saved packing list yet. Tell me about your trip and I can put one together."
+    return f"Here is your saved packing list:\n\n{result}"
+
+
+def render_current_weather(result: Any, groups: Dict[str, str]) -> Optional[str]:
+    if not isinstance(result, dict) or "error" in result:
+        return None
+    temperature = result["temperature"]
+    feels_like = f" (feels like {temperature['feels_like']}°C)" if temperature.get("feels_like") is not None else ""
+    details = [f"wind {result['wind']['speed']} km/h"]
+    if result.get("humidity") is not None:
+        details.append(f"humidity {result['humidity']}%")
+    return (f"Current weather in {result['location']}: {result['weather']['description']}, "
+            f"{temperature['current']}°C{feels_like}, {', '.join(details)}.")
+
+
+def render_forecast(result: Any, groups: Dict[str, str]) -> Optional[str]:
+    if not isinstance(result, dict) or "error" in result:
+        return None
+    lines = [
+        f"- {day['date']}: {day['weather']['description']}, {day['temperature']['min']}–{day['temperature']['max']}°C, "
+        f"{day['precipitation']['total']} mm precipitation"
+        for day in result["forecasts"]
+    ]
+    return f"Forecast for {result['location']}:\n" + "\n".join(lines)
+
+
+def render_attractions(result: Any, groups: Dict[str, str]) -> Optional[str]:
+    # Let the agent deal with unknown places rather than answering "No attractions found"
+    if not isinstance(result, str) or not re.search(r"Found [1-9]", result):
+        return None
+    return result.strip()
+
+
+DEFAULT_INTENTS = [
+    Intent(
+        name="list_endorsements",
+        tool="get_endorsements",
+        patterns=[
+            r"(?:show|list|get|see|display)(?: me)?(?: all)?(?: the)?(?: your)? endorsements",
+            r"who (?:has )?endorsed (?:you|this(?: service| travel agent)?)",
+            r"endorsements",
+        ],
+        render=render_endorsements,
+    ),
+    Intent(
+        name="list_activities",
+        tool="list_activities",
+        patterns=[
+            r"what (?:packing )?(?:activities|categories) (?:are there|do you (?:support|have|know))",
+            r"(?:show|list|get)(?: me)?(?: all)?(?: the)? (?:packing )?(?:activities|categories)",
+        ],
+        render=render_activities,
+    ),
+    Intent(
+        name="show_packing_list",
+        tool="retrieve_saved_packing_list",
+        patterns=[
+            r"(?:show|get|view|open|display|what(?:'s| is))(?: me)? my(?: saved| current)? packing list",
+            r"my(?: saved| current)? packing list",
+        ],
+        render=render_packing_list,
+    ),
+    Intent(
+        name="current_weather",
+        tool="get_current_weather",
+        patterns=[
+            rf"(?:what(?:'s| is) )?(?:the )?(?:current )?weather(?: like)? in {LOCATION}(?: (?:right )?now| today)?",
+            rf"(?:how(?:'s| is) )?(?:the )?weather in {LOCATION}",
+        ],
+        arguments=location_arguments,
+        render=render_current_weather,
+    ),
+    Intent(
+        name="weather_forecast",
+        tool="get_weather_forecast",
+        patterns=[
+            rf"(?:what(?:'s| is) |show(?: me)? |get(?: me)? )?(?:the )?(?:weather )?forecast (?:for|in) {LOCATION}",
+        ],
+        arguments=location_arguments,
+        render=render_forecast,
+    ),
+    Intent(
+        name="attractions_in",
+        tool="search_and_format_attractions",
+        patterns=[
+            rf"(?:show|list|find|search)(?: me)?(?: for)?(?: the)?(?: top)? attractions in {LOCATION}",
+            rf"what attractions are (?:there )?in {LOCATION}",
+            rf"attractions in {LOCATION}",
+        ],
+        arguments=location_arguments,
+        render=render_attractions,
+    ),
+]
+
+
+class IntentRouter:
+    """Matches messages to intents and answers them with a direct tool call"""
+
+    def __init__(self, get_tools: Callable[[], List[BaseTool]], intents: Optional[Sequence[Intent]] = None):
+        # Tools are looked up on every call, so hot-swapped and cache-wrapped tools are used
+        self.get_tools = get_tools
+        self.intents: List[Intent] = list(DEFAULT_INTENTS if intents is None else intents)
+
+        # Metrics
+        self.requests = 0
+        self.hits: Dict[str, int] = {}
+        self.fallbacks: Dict[str, int] = {}
+        self.fast_path_time = Histogram()
+        self.agent_time = Histogram()
+
+    def register(self, intent: Intent) -> None:
+        self.intents.append(intent)
+
+    def match(self, text: str) -> Optional[Tuple[Intent, Dict[str, str]]]:
+        """The first intent whose pattern matches the whole (normalized) message"""
+        message = normalize_message(text)
+        for intent in self.intents:
+            groups = intent.match(message)
+            if groups is not None:
+                return intent, groups
+        return None
+
+    async def route(self, text: str) -> Optional[str]:
+        """Answer a message on the fast path, or return None to use the agent"""
+        self.requests += 1
+        matched = self.match(text)
+        if matched is None:
+            return None
+
+        intent, groups = matched
+        started = time.monotonic()
+        tool = next((tool for tool in self.get_tools() if tool.name == intent.tool), None)
+        answer = None
+        if tool is not None:
+            try:
+                result = await tool.ainvoke(intent.arguments(groups))
+                # The circuit breaker's message or an error from the server is not an answer
+                if is_fallback(result) or is_error_result(result):
+                    print(f"Fast path '{intent.name}' got no result, using the agent")
+                else:
+                    answer = intent.render(parse_result(result), groups)
+            except Exception as e:
+                print(f"Fast path '{intent.name}' failed, using the agent: {e}")
+        if answer is None:
+            self.fallbacks[intent.name] = self.fallbacks.get(intent.name, 0) + 1
+            return None
+
+        self.hits[intent.name] = self.hits.get(intent.name, 0) + 1
+        self.fast_path_time.observe(time.monotonic() - started)
+        return answer
+
+    def record_agent(self, seconds: float) -> None:
+        """Record how long a request took on the full agent, to estimate the time saved"""
+        self.agent_time.observe(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        saved_per_hit = max(self.agent_time.mean - self.fast_path_time.mean, 0.0) if self.agent_time.count else 0.0
+        return {
+            "requests": self.requests,
+            "fast_path_hits": hits,
+            "hit_rate": round(hits / self.requests, 4) if self.requests else 0.0,
+            "fallbacks": dict(self.fallbacks),
+            "per_intent": dict(self.hits),
+            "fast_path_seconds": self.fast_path_time.snapshot(),
+            "agent_seconds": self.agent_time.snapshot(),
+            # Each hit is assumed to have taken as long as an average agent request
+            "estimated_saved_seconds": round(hits * saved_per_hit, 3)
+        }
@@ -0,0 +1,59 @@
+"""
+On-disk cache of MCP tool schemas, so the agent can start serving before any MCP
+server has answered list_tools.
+
+Entries are keyed by server URL and record the server version the schemas came from.
+"""
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from mcp.types import Tool as MCPTool
+
+
+class ToolSchemaCache:
+    """JSON file of tool schemas per MCP server URL"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Read every cached entry, or nothing if the file is missing or unreadable"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            return {}
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the cached entry for a server URL"""
+        return self.load().get(url)
+
+    def put(self, url: str, server_version: Optional[str], tools: List[MCPTool]) -> None:
+        """Store the schemas listed by a server, replacing the file atomically"""
+        entries = self.load()
+        entries[url] = {
+            "server_version": server_version,
+            "saved_at": time.time(),
+            "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools]
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A file of its own, so workers starting together don't write over each other
+        file = tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.path.parent,
+                                           prefix=self.path.name, suffix=".tmp", delete=False)
+        try:
+            with file:
+                json.dump(entries, file, indent=2)
+            os.replace(file.name, self.path)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+
+    @staticmethod
+    def tools_from_entry(entry: Dict[str, Any]) -> List[MCPTool]:
+        """Rebuild MCP tool definitions from a cached entry"""
+        return [MCPTool.model_validate(tool) for tool in entry.get("tools", [])]
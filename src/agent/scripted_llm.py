@@ -0,0 +1,136 @@
+"""
+Scripted chat model for offline runs and load tests (`LLM_PROVIDER=scripted`).
+
+It answers without calling any LLM provider but drives the agent the same way a real
+model does. For a new user message it asks for tool calls picked from keywords in the
+message (weather and attractions for the mentioned city by default, packing lists,
+endorsements), all in one step so they run concurrently. Once the tool results are
+in, it writes a short final answer from them. Token usage is estimated, so the token
+metrics stay populated, and so are prompt cache reads: like a provider's prompt cache,
+the tokens of the longest run of leading messages (with the same tools) it has seen
+before count as cached.
+"""
+
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+DEFAULT_LOCATION = "Paris"
+
+# Keyword -> (tool, arguments); "{location}" is replaced by the city in the message
+KEYWORD_TOOLS = (
+    (("weather", "forecast", "rain", "temperature"), "get_weather_forecast", {"location": "{location}", "days": 3}),
+    (("attraction", "see", "visit", "do in", "sights"), "search_attractions", {"location": "{location}", "limit": 5}),
+    (("pack", "bring"), "get_suggested_packing_list", {"activity": "day_hike"}),
+    (("endorse",), "get_endorsements", {}),
+)
+
+# Tools asked for when the message matches no keyword
+DEFAULT_TOOLS = ("get_weather_forecast", "search_attractions")
+
+# Prompt prefixes remembered for the simulated prompt cache; forgotten all at once when full
+MAX_CACHED_PREFIXES = 10000
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+def find_location(text: str) -> str:
+    """The capitalized words after 'in', 'to', 'for' or 'at', e.g. 'weather in New York' -> 'New York'"""
+    match = re.search(r"\b(?:in|to|for|at)\s+([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)*)", text)
+    return match.group(1) if match else DEFAULT_LOCATION
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic chat model that emits tool calls from keywords, then answers"""
+
+    latency_seconds: float = 0.0
+    tool_names: List[str] = []
+    # Hashes of the prompt prefixes seen so far, shared with the copies made by bind_tools
+    cached_prefixes: Set[int] = set()
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.model_copy(update={"tool_names": names})
+
+    def plan_tool_calls(self, text: str) -> List[Dict[str, Any]]:
+        location = find_location(text)
+        lowered = text.lower()
+        picked = [(tool, args) for keywords, tool, args in KEYWORD_TOOLS if any(word in lowered for word in keywords)]
+        if not picked:
+            picked = [(tool, args) for _, tool, args in KEYWORD_TOOLS if tool in DEFAULT_TOOLS]
+        calls = []
+        for index, (tool, args) in enumerate(picked):
+            if tool not in self.tool_names:
+                continue
+            arguments = {key: value.format(location=location) if isinstance(value, str) else value
+                         for key, value in args.items()}
+            calls.append({"name": tool, "args": arguments, "id": f"call_{index}_{tool}", "type": "tool_call"})
+        return calls
+
+    def respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1] if messages else None
+        if isinstance(last, HumanMessage) and self.tool_names:
+            calls = self.plan_tool_calls(str(last.content))
+            if calls:
+                return AIMessage(content="", tool_calls=calls)
+
+        results = []
+        for message in reversed(messages):
+            if not isinstance(message, ToolMessage):
+                break
+            name = message.name or message.additional_kwargs.get("name", "tool")
+            results.append(f"{name}: {str(message.content)[:200]}")
+        if results:
+            content = "Here is what I found:\n" + "\n".join(reversed(results))
+        else:
+            content = f"Summary: {str(last.content)[:200] if last else ''}"
+        return AIMessage(content=content)
+
+    def cached_tokens(self, messages: List[BaseMessage]) -> int:
+        """Tokens of the longest prefix of `messages` seen before, as a provider's prompt cache would read"""
+        if len(self.cached_prefixes) >= MAX_CACHED_PREFIXES:
+            self.cached_prefixes.clear()
+        prefix = hash(tuple(self.tool_names))
+        tokens = cached = 0
+        for message in messages:
+            prefix = hash((prefix, message.type, str(message.content)))
+            tokens += estimate_tokens([message])
+            if prefix in self.cached_prefixes:
+                cached = tokens
+            else:
+                self.cached_prefixes.add(prefix)
+        return cached
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        message = self.respond(messages)
+        input_tokens = estimate_tokens(messages)
+        output_tokens = estimate_tokens([message]) + 10 * len(message.tool_calls)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": self.cached_tokens(messages)}
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._result(messages)
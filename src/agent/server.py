@@ -1,7 +1,7 @@
 # Step to ensure that the venv is being used for the project not local copies, should point at .venv in project.
 import sys, shutil
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
 from pydantic import BaseModel
 print("python:", sys.executable)
 print("uv:", shutil.which("uv")) 
@@ -12,8 +12,8 @@ from dotenv import load_dotenv
 import asyncio
 import json
 import requests
-from typing import Dict, Any, List
-from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Union
+from contextlib import aclosing, asynccontextmanager
 
 
 # LangChain imports
@@ -29,7 +29,29 @@ from langchain_mcp_adapters.tools import load_mcp_tools
 
 from fastapi.middleware.cors import CORSMiddleware
 
-from attractions import main, ask_assistant
+from attractions import (
+    main, shutdown, ask_assistant, ask_batch, stream_user_input, session_manager, tool_cache, step_stats, token_stats,
+    metrics_registry, intent_router, tool_selector, artifact_store, prefetcher, llm_pool, health_status
+)
+from admission import AdmissionController, AdmissionRejected, AdmittedStreamingResponse, ClientDisconnected, DeadlineExceeded, DisconnectWatcher
+from connections import ChatConnection, ConnectionStats
+from jobs import JobQueue, JobQueueFull
+from config import (
+    SESSION_COOKIE_NAME,
+    SESSION_HEADER_NAME,
+    AGENT_MAX_CONCURRENCY,
+    AGENT_MAX_QUEUE,
+    AGENT_QUEUE_TIMEOUT_SECONDS,
+    AGENT_REQUEST_DEADLINE_SECONDS,
+    CLIENT_DISCONNECT_POLL_SECONDS,
+    BATCH_MAX_ITEMS,
+    JOB_WORKERS,
+    JOB_MAX_QUEUE,
+    JOB_RESULT_TTL_SECONDS,
+    JOB_TIMEOUT_SECONDS,
+    WS_MAX_RUNS_PER_CONNECTION,
+    WS_SEND_QUEUE_SIZE
+)
 
 # Load environment variables
 load_dotenv()
@@ -39,13 +61,16 @@ print("✅ Updated imports with official MCP adapter loaded successfully!")
 # MCP Client Setup using Official Adapter with HTTP Transport
 import subprocess
 import time
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await main()
+    jobs.start()
     yield
+    await jobs.stop()
+    await shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -57,12 +82,263 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bounded concurrency for agent runs: POST /, /stream, each question of a /batch, and each background job
+admission = AdmissionController(
+    max_concurrency=AGENT_MAX_CONCURRENCY,
+    max_queue=AGENT_MAX_QUEUE,
+    queue_timeout_seconds=AGENT_QUEUE_TIMEOUT_SECONDS,
+    deadline_seconds=AGENT_REQUEST_DEADLINE_SECONDS
+)
+metrics_registry.register("admission_queue_seconds", "histogram", "Time requests waited for an agent slot", admission.queue_time)
+metrics_registry.register("admission_run_seconds", "histogram", "Time requests held an agent slot", admission.run_time)
+metrics_registry.gauge("admission_waiting", "Requests waiting for an agent slot", lambda: admission.waiting)
+metrics_registry.gauge("admission_running", "Requests holding an agent slot", lambda: admission.running)
+metrics_registry.callback_counter("admission_rejected", "Requests rejected by admission control", lambda: sum(admission.rejected.values()))
+
+# Background jobs, run by a fixed pool of workers that take their agent slots from admission
+jobs = JobQueue(
+    stream_user_input,
+    workers=JOB_WORKERS,
+    max_queue=JOB_MAX_QUEUE,
+    result_ttl_seconds=JOB_RESULT_TTL_SECONDS,
+    timeout_seconds=JOB_TIMEOUT_SECONDS,
+    admission=admission
+)
+metrics_registry.gauge("job_queue_depth", "Jobs waiting for a worker", lambda: jobs.depth)
+metrics_registry.gauge("jobs_running", "Jobs being run by a worker", lambda: jobs.running)
+metrics_registry.register("jobs_finished", "counter", "Finished jobs by outcome", jobs.completed)
+metrics_registry.register("job_queue_seconds", "histogram", "Time jobs waited for a worker and an agent slot", jobs.queue_time)
+metrics_registry.register("job_run_seconds", "histogram", "Time from a job starting to finishing", jobs.run_time)
+
+# Runs cancelled because their client went away
+disconnects = DisconnectWatcher(CLIENT_DISCONNECT_POLL_SECONDS, typical_run_seconds=lambda: admission.run_time.mean)
+metrics_registry.register("client_disconnect_cancelled_runs", "counter", "Agent runs cancelled because the client disconnected", disconnects.cancelled)
+metrics_registry.register("client_disconnect_run_seconds", "histogram", "Time cancelled runs had been running when the client disconnected", disconnects.run_time)
+metrics_registry.callback_counter("client_disconnect_seconds_saved", "Estimated agent run time saved by cancelling runs of disconnected clients", lambda: disconnects.estimated_seconds_saved)
+
+# WebSocket chat connections
+connection_stats = ConnectionStats()
+metrics_registry.gauge("websocket_connections", "Open WebSocket chat connections", lambda: connection_stats.open)
+metrics_registry.callback_counter("websocket_cancelled_runs", "Agent runs cancelled by WebSocket clients", lambda: connection_stats.cancelled)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening; 499 as nginx logs it
+    return Response(status_code=499)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 class Item(BaseModel):
     message: str
 
+class BatchQuestion(BaseModel):
+    id: Optional[str] = None
+    message: str
+
+class Batch(BaseModel):
+    messages: List[Union[str, BatchQuestion]]
+
+def get_session_id(request: Request) -> str:
+    """Get the caller's session id from the header or cookie, issuing a new one if missing"""
+    session_id = request.headers.get(SESSION_HEADER_NAME) or request.cookies.get(SESSION_COOKIE_NAME)
+    return session_id or session_manager.new_session_id()
+
+def remember_session(response: Response, session_id: str) -> None:
+    """Send the session id back as a cookie so clients without the header keep their session"""
+    response.set_cookie(SESSION_COOKIE_NAME, session_id, httponly=True, samesite="lax")
+
 @app.post("/")
-async def send_message(item: Item):
-    return await ask_assistant(item.message)
+async def send_message(item: Item, request: Request, response: Response):
+    session_id = get_session_id(request)
+    remember_session(response, session_id)
+    async with admission.admit():
+        async with admission.deadline():
+            return await disconnects.run(request, "message", ask_assistant(item.message, session_id))
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format an agent event as a server-sent event"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.post("/stream")
+async def stream_message(item: Item, request: Request):
+    session_id = get_session_id(request)
+    # Admit before the response starts so a rejection can still be a 429/503
+    admitted_at = await admission.acquire()
+
+    async def events():
+        try:
+            async with admission.deadline():
+                async for event in stream_user_input(item.message, session_id):
+                    yield format_sse(event)
+        except DeadlineExceeded as e:
+            yield format_sse({"type": "error", "message": str(e)})
+        except asyncio.CancelledError:
+            # The response stops streaming, and cancels the run, when the client disconnects
+            disconnects.record("stream", admitted_at)
+            raise
+
+    # The response frees the slot once it is done, even if the client left before it started
+    response = AdmittedStreamingResponse(
+        events(),
+        admission,
+        admitted_at,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    remember_session(response, session_id)
+    return response
+
+@app.post("/batch")
+async def batch_messages(batch: Batch):
+    if len(batch.messages) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} messages per batch")
+    questions = [item.model_dump() if isinstance(item, BatchQuestion) else item for item in batch.messages]
+
+    async def results():
+        # Closing the generator (the client went away) cancels the questions not answered yet
+        async with aclosing(ask_batch(questions, admission)) as answers:
+            async for result in answers:
+                yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/jobs", status_code=202)
+async def submit_job(item: Item, request: Request, response: Response):
+    session_id = get_session_id(request)
+    remember_session(response, session_id)
+    try:
+        job = jobs.submit(item.message, session_id)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.job_id}",
+        "events_url": f"/jobs/{job.job_id}/events"
+    }
+
+def find_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return jobs.stats()
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return find_job(job_id).summary()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = find_job(job_id)
+
+    async def events():
+        async for event in jobs.subscribe(job):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = find_job(job_id)
+    jobs.cancel(job)
+    return job.summary()
+
+@app.websocket("/ws")
+async def chat_socket(websocket: WebSocket):
+    # Messages name their session; this one is used for messages that don't
+    session_id = (
+        websocket.query_params.get("session_id")
+        or websocket.headers.get(SESSION_HEADER_NAME)
+        or websocket.cookies.get(SESSION_COOKIE_NAME)
+        or session_manager.new_session_id()
+    )
+    await websocket.accept()
+    connection = ChatConnection(
+        websocket,
+        session_id,
+        stream_user_input,
+        admission,
+        connection_stats,
+        max_runs=WS_MAX_RUNS_PER_CONNECTION,
+        send_queue_size=WS_SEND_QUEUE_SIZE
+    )
+    await connection.serve()
+
+@app.get("/ws/stats")
+async def websocket_stats():
+    return connection_stats.snapshot()
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return session_manager.stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    return admission.stats()
+
+@app.get("/disconnects/stats")
+async def disconnect_stats():
+    return disconnects.stats()
+
+@app.get("/tools/cache/stats")
+async def tool_cache_stats():
+    return tool_cache.stats()
+
+@app.get("/tools/steps/stats")
+async def tool_step_stats():
+    return step_stats.stats()
+
+@app.get("/tools/selection/stats")
+async def tool_selection_stats():
+    return tool_selector.stats() if tool_selector else {"enabled": False}
+
+@app.get("/tools/prefetch/stats")
+async def prefetch_stats():
+    return prefetcher.stats() if prefetcher else {"enabled": False}
+
+@app.get("/tools/artifacts/stats")
+async def artifact_stats():
+    return artifact_store.stats() if artifact_store else {"enabled": False}
+
+@app.get("/tokens/stats")
+async def token_usage_stats():
+    return token_stats.stats()
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return llm_pool.stats() if llm_pool else {"enabled": False}
+
+@app.get("/router/stats")
+async def router_stats():
+    return intent_router.stats() if intent_router else {"enabled": False}
+
+@app.get("/health")
+async def health():
+    status = health_status()
+    # Degraded still serves requests, with some tools unavailable
+    return JSONResponse(status, status_code=503 if status["status"] == "starting" else 200)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -0,0 +1,138 @@
+"""
+Conversation sessions - one chat memory per user, held in a bounded LRU pool.
+
+Sessions are created lazily on first use and evicted when the pool holds too many
+sessions, when a session has been idle for longer than the TTL, or when the memory
+held by all sessions together goes over the byte cap.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class Session:
+    session_id: str
+    memory: Any
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    size_bytes: int = 0
+
+
+def estimate_memory_bytes(memory: Any) -> int:
+    """Estimate the number of bytes of chat history held by a LangChain memory"""
+    chat_memory = getattr(memory, "chat_memory", None)
+    messages = getattr(chat_memory, "messages", None) or []
+    total = len(getattr(memory, "summary", "").encode("utf-8"))
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            total += len(content.encode("utf-8"))
+        else:
+            total += len(str(content).encode("utf-8"))
+    return total
+
+
+class SessionManager:
+    """Bounded LRU pool of conversation sessions keyed by session id"""
+
+    def __init__(
+        self,
+        memory_factory: Callable[[str], Any],
+        max_sessions: int,
+        idle_ttl_seconds: float,
+        max_total_bytes: int
+    ):
+        self._memory_factory = memory_factory
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_total_bytes = max_total_bytes
+
+        # Counters
+        self.created = 0
+        self.evictions = {"lru": 0, "idle": 0, "memory": 0}
+        self.total_bytes = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        """Generate a new random session id"""
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> Session:
+        """Get the session for an id, creating it if it does not exist yet"""
+        now = time.monotonic()
+        self._evict_idle(now)
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(session_id=session_id, memory=self._memory_factory(session_id))
+            self._sessions[session_id] = session
+            self.created += 1
+            self._evict_overflow(keep=session_id)
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.last_used = now
+        return session
+
+    def record_usage(self, session: Session) -> None:
+        """Re-measure a session after a conversation turn and enforce the byte cap"""
+        size = estimate_memory_bytes(session.memory)
+        if session.session_id in self._sessions:
+            self.total_bytes += size - session.size_bytes
+            self._sessions.move_to_end(session.session_id)
+        session.size_bytes = size
+        session.last_used = time.monotonic()
+        self._evict_overflow(keep=session.session_id)
+
+    def remove(self, session_id: str) -> None:
+        """Drop a session and its memory"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.total_bytes -= session.size_bytes
+            # Write anything still buffered, so the store holds no reference to the dropped session
+            session.memory.chat_memory.flush_later()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get counters for live sessions, evictions and bytes held"""
+        return {
+            "live_sessions": len(self._sessions),
+            "created": self.created,
+            "evictions": dict(self.evictions),
+            "bytes_held": self.total_bytes
+        }
+
+    def _evict_idle(self, now: float) -> None:
+        # Oldest sessions are at the front, so stop at the first one used recently
+        idle = []
+        for session_id, session in self._sessions.items():
+            if now - session.last_used < self.idle_ttl_seconds:
+                break
+            # A long turn keeps its session, however long ago it started
+            if not session.lock.locked():
+                idle.append(session_id)
+        for session_id in idle:
+            self.remove(session_id)
+            self.evictions["idle"] += 1
+
+    def _evict_overflow(self, keep: Optional[str] = None) -> None:
+        while len(self._sessions) > self.max_sessions or self.total_bytes > self.max_total_bytes:
+            victim = self._oldest_evictable(keep)
+            if victim is None:
+                break
+            reason = "lru" if len(self._sessions) > self.max_sessions else "memory"
+            self.remove(victim)
+            self.evictions[reason] += 1
+
+    def _oldest_evictable(self, keep: Optional[str]) -> Optional[str]:
+        # Never evict the session being served or one with a turn in flight
+        for session_id, session in self._sessions.items():
+            if session_id != keep and not session.lock.locked():
+                return session_id
+        return None
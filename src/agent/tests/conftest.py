@@ -0,0 +1,19 @@
+"""
+Shared setup for the agent tests.
+
+The agent's modules import each other as top-level modules (they run from src/agent),
+so the tests put that directory on the path. Async code is driven with asyncio.run.
+"""
+
+import os
+import sys
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AGENT_DIR not in sys.path:
+    sys.path.insert(0, AGENT_DIR)
+
+# Offline settings for anything that reads config.py
+os.environ.setdefault("LLM_PROVIDER", "scripted")
+os.environ.setdefault("MCP_TOOL_MODE", "inprocess")
+os.environ.setdefault("MCP_SCHEMA_CACHE_ENABLED", "false")
+os.environ.setdefault("LOG_SAMPLE_RATE", "0")
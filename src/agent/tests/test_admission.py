@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from admission import AdmissionController, AdmissionRejected, AdmittedStreamingResponse, DeadlineExceeded
+
+
+def new_controller(**settings):
+    return AdmissionController(**{
+        "max_concurrency": 1, "max_queue": 1, "queue_timeout_seconds": 5, "deadline_seconds": 5, **settings
+    })
+
+
+def test_full_queue_is_rejected_with_429():
+    admission = new_controller()
+
+    async def run():
+        await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        waiting.cancel()
+        return rejected.value
+
+    assert asyncio.run(run()).status_code == 429
+    assert admission.rejected["queue_full"] == 1
+
+
+def test_waiting_too_long_is_rejected_with_503():
+    admission = new_controller(queue_timeout_seconds=0.05)
+
+    async def run():
+        await admission.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        return rejected.value
+
+    assert asyncio.run(run()).status_code == 503
+    assert admission.waiting == 0
+
+
+def test_slot_is_handed_to_the_next_request_on_release():
+    admission = new_controller()
+
+    async def run():
+        first = await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        admission.release(first)
+        admission.release(await waiting)
+
+    asyncio.run(run())
+    assert admission.running == 0 and admission.admitted == 2
+
+
+def test_deadline_cancels_the_block():
+    admission = new_controller(deadline_seconds=0.05)
+
+    async def run():
+        async with admission.deadline():
+            await asyncio.sleep(1)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert admission.deadline_exceeded == 1
+
+
+async def body(started):
+    started.append(True)
+    yield "data: 1\n\n"
+
+
+async def call_response(response, send):
+    async def receive():
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+
+
+def test_streaming_response_frees_its_slot_after_sending():
+    admission = new_controller()
+    sent, started = [], []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        response = AdmittedStreamingResponse(body(started), admission, await admission.acquire())
+        await call_response(response, send)
+
+    asyncio.run(run())
+    assert started and sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+    assert admission.running == 0
+
+
+def test_streaming_response_frees_its_slot_when_the_client_left_before_the_body_started():
+    admission = new_controller()
+    started = []
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def run():
+        response = AdmittedStreamingResponse(body(started), admission, await admission.acquire())
+        with pytest.raises(ClientDisconnect):
+            await call_response(response, send)
+        # Freed once, however many times it is asked
+        response.release()
+
+    asyncio.run(run())
+    assert not started
+    assert admission.running == 0
+    assert admission.run_time.count == 1
@@ -0,0 +1,58 @@
+"""
+End to end through the agent: the scripted chat model and the bundled MCP servers in-process.
+
+The questions only ask for attractions, which the attractions server answers from its
+own data, so the run needs no network.
+"""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def attractions(tmp_path_factory, monkeypatch_module):
+    monkeypatch_module.setenv("ROUTER_ENABLED", "false")
+    monkeypatch_module.setenv("TRACE_RECORD_PATH", "")
+    monkeypatch_module.setenv("CHAT_HISTORY_BACKEND", "memory")
+    import attractions
+    return attractions
+
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        yield monkeypatch
+
+
+def test_agent_answers_with_tools_caches_them_and_keeps_each_session(attractions):
+    async def run():
+        await attractions.initialize_agent()
+        try:
+            first = await attractions.process_user_input("What attractions should I see in Rome?", "alice")
+            cache_misses = attractions.tool_cache.stats()["misses"]
+            again = await attractions.process_user_input("What attractions should I see in Rome?", "bob")
+            other = await attractions.process_user_input("Which sights can I visit in London?", "alice")
+            return first, again, other, cache_misses
+        finally:
+            await attractions.shutdown()
+
+    first, again, other, cache_misses = asyncio.run(run())
+
+    assert "search_attractions" in first and "Colosseum" in first
+    assert again == first
+    assert "London" in other
+
+    # The second session's identical lookup was served from the tool cache
+    stats = attractions.tool_cache.stats()
+    assert stats["hits"] >= 1 and stats["misses"] == cache_misses + 1
+
+    # Each session has its own conversation
+    alice = attractions.session_manager.get("alice").memory.chat_memory.messages
+    bob = attractions.session_manager.get("bob").memory.chat_memory.messages
+    assert [message.type for message in alice] == ["human", "ai", "human", "ai"]
+    assert [message.content for message in bob][0] == "What attractions should I see in Rome?"
+    assert len(bob) == 2
+
+    # Token usage was recorded for every turn
+    assert attractions.token_stats.stats()["prompt_tokens_per_request"]["count"] == 3
@@ -0,0 +1,54 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from langchain_core.tools import StructuredTool
+
+from artifacts import ArtifactStore
+
+
+def make_store():
+    return ArtifactStore(threshold_chars=500, preview_chars=100, page_chars=400, max_entries=10, ttl_seconds=60)
+
+
+def make_tool(size):
+    async def search_attractions(location: str) -> str:
+        """Search attractions"""
+        return json.dumps({"attractions": [{"name": f"Place {i}", "description": "x" * 40} for i in range(size)]})
+
+    return StructuredTool.from_function(coroutine=search_attractions, name="search_attractions", description="Search attractions")
+
+
+def test_large_results_are_offloaded_and_readable_in_pages():
+    store = make_store()
+    tool = store.wrap(make_tool(50))
+    summary = asyncio.run(tool.ainvoke({"location": "Rome"}))
+    assert "stored as artifact" in summary and "attractions: 50 items" in summary
+
+    handle = summary.split("stored as artifact ")[1].split("]")[0]
+    page = store.read(handle, offset=0)
+    assert page.startswith('{"attractions"') and "next offset 400" in page
+    assert store.stats()["stored"] == 1
+
+
+def test_turns_are_measured_with_and_without_offloading():
+    store = make_store()
+    big, small = store.wrap(make_tool(50)), store.wrap(make_tool(1))
+
+    async def turn(tool, prompt_tokens):
+        usage = SimpleNamespace(llm_calls=1, prompt_tokens=0, llm_seconds=0.0)
+        artifact_turn = store.start_turn(usage)
+        await tool.ainvoke({"location": "Rome"})
+        # The LLM call that reads the tool result
+        usage.llm_calls, usage.prompt_tokens, usage.llm_seconds = 2, prompt_tokens, 1.5
+        store.finish_turn(artifact_turn)
+
+    asyncio.run(turn(big, 900))
+    asyncio.run(turn(small, 400))
+
+    stats = store.stats()
+    assert stats["turns"]["offloaded"]["prompt_tokens"]["sum"] == 900
+    assert stats["turns"]["not_offloaded"]["prompt_tokens"]["sum"] == 400
+    assert stats["turns"]["offloaded"]["llm_seconds"]["mean"] == 1.5
+    # One later LLM call would have read the whole result
+    assert stats["offloaded_turns_estimated_prompt_tokens_inlined"]["sum"] == 900 + stats["estimated_tokens_offloaded"]
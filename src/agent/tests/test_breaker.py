@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import StructuredTool, ToolException
+
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ServerBreakers
+from executor import run_with_timeout
+from tool_wrappers import ToolTimeout, is_fallback
+
+
+def make_tool(behaviour):
+    async def lookup(city: str) -> str:
+        """Look something up for a city"""
+        return await behaviour(city)
+
+    return StructuredTool.from_function(coroutine=lookup, name="lookup", description="Look something up for a city")
+
+
+def new_breakers(**settings):
+    return ServerBreakers(**{"window_size": 4, "min_calls": 2, "failure_rate": 0.5, "open_seconds": 60, **settings})
+
+
+async def hang(city):
+    await asyncio.sleep(10)
+
+
+def test_breaker_opens_on_failures_and_probes_after_cool_down():
+    breaker = CircuitBreaker("weather", window_size=4, min_calls=2, failure_rate=0.5, open_seconds=0.05)
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1, error="boom")
+    assert breaker.state == OPEN and not breaker.allow()
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and not breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_unreachable_server_becomes_a_fallback_result_and_opens_the_breaker():
+    async def unreachable(city):
+        raise ConnectionError("refused")
+
+    breakers = new_breakers()
+    tool = breakers.wrap(make_tool(unreachable), "weather")
+
+    async def run():
+        return [await tool.ainvoke({"city": "Rome"}) for _ in range(3)]
+
+    results = asyncio.run(run())
+    assert all(is_fallback(result) for result in results)
+    assert "temporarily unavailable" in results[-1]
+    assert breakers.unavailable_servers() == {"weather"}
+
+
+def test_errors_reported_by_the_server_do_not_count_against_it():
+    async def invalid(city):
+        raise ToolException("Unknown city")
+
+    breakers = new_breakers()
+    tool = breakers.wrap(make_tool(invalid), "weather")
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(ToolException):
+                await tool.ainvoke({"city": "Atlantis"})
+
+    asyncio.run(run())
+    assert breakers.get("weather").state == CLOSED
+
+
+def test_tool_timeouts_shorter_than_the_slow_call_threshold_open_the_breaker():
+    breakers = new_breakers(slow_call_seconds=10)
+    tool = breakers.wrap(make_tool(hang), "weather")
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await run_with_timeout(tool.ainvoke({"city": "Rome"}), ToolTimeout(0.02))
+
+    asyncio.run(run())
+    breaker = breakers.get("weather")
+    assert breaker.state == OPEN and breaker.last_error == "timed out"
+
+
+def test_cancelled_requests_do_not_count_against_the_server():
+    breakers = new_breakers()
+    tool = breakers.wrap(make_tool(hang), "weather")
+
+    async def run():
+        for _ in range(3):
+            # The client went away: the call is cancelled from outside, not timed out
+            call = asyncio.create_task(run_with_timeout(tool.ainvoke({"city": "Rome"}), ToolTimeout(5)))
+            await asyncio.sleep(0.02)
+            call.cancel()
+            await asyncio.gather(call, return_exceptions=True)
+
+    asyncio.run(run())
+    breaker = breakers.get("weather")
+    assert breaker.state == CLOSED and not breaker.calls
@@ -0,0 +1,143 @@
+import asyncio
+import gc
+import weakref
+
+import pytest
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from history import InMemorySessionHistory, SessionHistory, SQLiteChatStore
+from memory import RollingSummaryMemory
+from sessions import SessionManager
+
+
+def turn(question, answer):
+    return [HumanMessage(content=question), AIMessage(content=answer)]
+
+
+def test_sqlite_history_survives_a_new_store(tmp_path):
+    store = SQLiteChatStore(tmp_path / "chat.db")
+    history = store.history("s1")
+    history.add_messages(turn("Weather in Oslo?", "Cold."))
+    history.flush()
+    store.close()
+
+    reopened = SQLiteChatStore(tmp_path / "chat.db")
+    assert [message.content for message in reopened.history("s1").messages] == ["Weather in Oslo?", "Cold."]
+    assert reopened.history("s2").messages == []
+    reopened.close()
+
+
+def test_writes_are_buffered_until_flush(tmp_path):
+    store = SQLiteChatStore(tmp_path / "chat.db")
+    writer, reader = store.history("s1"), store.history("s1")
+    writer.add_messages(turn("Hi", "Hello"))
+    assert reader.messages == []
+    writer.flush()
+    # Served from the last load until refreshed, as at the start of a turn
+    assert reader.messages == []
+    reader.refresh()
+    assert len(reader.messages) == 2
+    store.close()
+
+
+def test_flushed_histories_leave_the_dirty_set(tmp_path):
+    store = SQLiteChatStore(tmp_path / "chat.db")
+    history = store.history("s1")
+    history.add_messages(turn("Hi", "Hello"))
+    assert history in store._dirty
+    history.flush()
+    assert not store._dirty
+
+    history.add_messages(turn("Again", "Hello again"))
+    history.clear()
+    assert not store._dirty
+
+    history.add_messages(turn("Hi", "Hello"))
+    history.fold(history.fold_point(2), "They said hello.")
+    assert not store._dirty
+    assert history.summary == "They said hello."
+    assert history.messages == []
+    store.close()
+
+
+def test_evicted_sessions_are_flushed_and_freed(tmp_path):
+    store = SQLiteChatStore(tmp_path / "chat.db")
+    manager = SessionManager(
+        memory_factory=lambda session_id: RollingSummaryMemory(
+            chat_memory=store.history(session_id), memory_key="chat_history", return_messages=True
+        ),
+        max_sessions=1,
+        idle_ttl_seconds=3600,
+        max_total_bytes=10 ** 9
+    )
+    first = manager.get("s1")
+    first.memory.chat_memory.add_messages(turn("Hi", "Hello"))
+    history = weakref.ref(first.memory.chat_memory)
+    del first
+
+    manager.get("s2")
+    assert manager.stats()["evictions"]["lru"] == 1
+    assert not store._dirty
+    gc.collect()
+    assert history() is None
+    assert len(store.history("s1").messages) == 2
+    store.close()
+
+
+def test_in_memory_history_fold():
+    history = InMemorySessionHistory()
+    history.add_messages(turn("a", "b") + turn("c", "d"))
+    history.fold(history.fold_point(2), "summary of a and b")
+    assert [message.content for message in history.messages] == ["c", "d"]
+    assert history.summary == "summary of a and b"
+
+
+def test_fold_covers_exactly_the_summarized_messages_with_a_backlog_beyond_one_page(tmp_path):
+    store = SQLiteChatStore(tmp_path / "chat.db", page_size=4)
+    history = store.history("s1")
+    history.add_messages(turn("q1", "a1") + turn("q2", "a2") + turn("q3", "a3") + turn("q4", "a4"))
+    history.flush()
+
+    # After a restart only the newest page is loaded: q3..a4
+    reloaded = SQLiteChatStore(tmp_path / "chat.db", page_size=4).history("s1")
+    assert [message.content for message in reloaded.messages] == ["q3", "a3", "q4", "a4"]
+    upto = reloaded.fold_point(2)
+    reloaded.add_messages(turn("q5", "a5"))
+    reloaded.fold(upto, "They asked q3.")
+    assert reloaded.summary == "They asked q3."
+    assert [message.content for message in reloaded.messages] == ["q4", "a4", "q5", "a5"]
+    # Everything up to the summarized messages is folded, not just the oldest two rows
+    everything = SQLiteChatStore(tmp_path / "chat.db", page_size=100).history("s1")
+    assert [message.content for message in everything.messages] == ["q4", "a4", "q5", "a5"]
+    store.close()
+
+
+def test_async_history_methods_run_off_the_event_loop(tmp_path):
+    store = SQLiteChatStore(tmp_path / "chat.db")
+    history, other = store.history("s1"), store.history("s1")
+
+    async def run():
+        history.add_messages(turn("Hi", "Hello"))
+        await history.aflush()
+        await other.arefresh()
+        await history.afold(history.fold_point(2), "Greetings.")
+        await other.arefresh()
+
+    asyncio.run(run())
+    assert other.messages == [] and other.summary == "Greetings."
+    store.close()
+
+
+def test_histories_must_implement_fold():
+    class Incomplete(SessionHistory):
+        messages = []
+
+        def add_messages(self, messages):
+            pass
+
+        def clear(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,64 @@
+import asyncio
+
+from admission import AdmissionController
+from jobs import CANCELLED, DONE, JobQueue
+
+
+def new_queue(run, admission=None):
+    return JobQueue(run, workers=2, max_queue=10, result_ttl_seconds=60, timeout_seconds=5, admission=admission)
+
+
+async def finished(job):
+    while not job.finished:
+        await asyncio.sleep(0.01)
+
+
+def test_jobs_share_agent_slots_with_interactive_requests():
+    admission = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout_seconds=1, deadline_seconds=5)
+    running = []
+
+    async def run(message, session_id):
+        running.append(admission.running)
+        yield {"type": "final", "output": message}
+
+    async def main():
+        queue = new_queue(run, admission)
+        queue.start()
+        # An interactive request holds the only slot: the jobs wait for it instead of running next to it
+        admitted_at = await admission.acquire()
+        first, second = queue.submit("a", "s"), queue.submit("b", "s")
+        await asyncio.sleep(0.05)
+        assert running == [] and admission.waiting_background == 2
+        admission.release(admitted_at)
+        await finished(first)
+        await finished(second)
+        await queue.stop()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert (first.status, first.output, second.status) == (DONE, "a", DONE)
+    assert running == [1, 1] and admission.running == 0
+
+
+def test_job_cancelled_while_waiting_for_a_slot_never_runs():
+    admission = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout_seconds=1, deadline_seconds=5)
+    ran = []
+
+    async def run(message, session_id):
+        ran.append(message)
+        yield {"type": "final", "output": message}
+
+    async def main():
+        queue = new_queue(run, admission)
+        queue.start()
+        admitted_at = await admission.acquire()
+        job = queue.submit("a", "s")
+        await asyncio.sleep(0.05)
+        queue.cancel(job)
+        admission.release(admitted_at)
+        await asyncio.sleep(0.05)
+        await queue.stop()
+        return job
+
+    assert asyncio.run(main()).status == CANCELLED
+    assert ran == [] and admission.running == 0
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from llm_router import DeploymentPool, RoutingChatModel
+
+
+class StubModel(BaseChatModel):
+    """Answers with its name after `latency_seconds`, or fails; records its calls"""
+
+    name: str
+    latency_seconds: float = 0.0
+    fail: bool = False
+    # Shared with the test, not copied by validation
+    events: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools, **kwargs: Any):
+        return self
+
+    def answer(self) -> ChatResult:
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        self.events.append(f"{self.name}:done")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.name))])
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self.events.append(f"{self.name}:start")
+        time.sleep(self.latency_seconds)
+        return self.answer()
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self.events.append(f"{self.name}:start")
+        try:
+            await asyncio.sleep(self.latency_seconds)
+        except asyncio.CancelledError:
+            self.events.append(f"{self.name}:cancelled")
+            raise
+        return self.answer()
+
+
+def routing_model(*models: StubModel, **settings: Any) -> RoutingChatModel:
+    pool = DeploymentPool([(model.name, model) for model in models], **{"min_calls": 2, **settings})
+    return RoutingChatModel(pool=pool)
+
+
+def ask(model: RoutingChatModel) -> str:
+    return asyncio.run(model.ainvoke([HumanMessage(content="hi")])).content
+
+
+def test_calls_go_to_the_fastest_deployment_once_measured():
+    events = []
+    model = routing_model(StubModel(name="slow", latency_seconds=0.05, events=events),
+                          StubModel(name="fast", latency_seconds=0.0, events=events))
+    # Both start unmeasured; after one call each the faster one takes the traffic
+    answers = [ask(model) for _ in range(5)]
+    assert set(answers[:2]) == {"slow", "fast"}
+    assert answers[2:] == ["fast"] * 3
+    assert model.pool.stats()["deployments"]["fast"]["wins"] == 4
+
+
+def test_failed_deployment_fails_over_and_its_breaker_opens():
+    events = []
+    down, up = StubModel(name="down", fail=True, events=events), StubModel(name="up", events=events)
+    model = routing_model(down, up)
+
+    assert [ask(model) for _ in range(4)] == ["up"] * 4
+    stats = model.pool.stats()
+    assert stats["failovers"] >= 1
+    assert stats["deployments"]["down"]["healthy"] is False
+    # Once open, the broken deployment isn't tried first any more
+    assert events.count("down:start") == 2
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    events = []
+    model = routing_model(StubModel(name="stuck", latency_seconds=1.0, events=events),
+                          StubModel(name="quick", latency_seconds=0.0, events=events),
+                          hedge=True, hedge_min_seconds=0.05)
+    # Rank "stuck" first: it looks fastest until measured
+    model.pool.deployments[1].latencies["complete"].append(0.5)
+    model.pool.deployments[1].last_used = time.monotonic()
+
+    started = time.monotonic()
+    assert ask(model) == "quick"
+    assert 0.05 <= time.monotonic() - started < 0.5
+    assert events == ["stuck:start", "quick:start", "quick:done", "stuck:cancelled"]
+    stats = model.pool.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+    assert stats["deployments"]["stuck"]["cancelled"] == 1
+
+
+def test_no_hedge_before_hedge_min_seconds():
+    events = []
+    model = routing_model(StubModel(name="a", latency_seconds=0.02, events=events),
+                          StubModel(name="b", events=events),
+                          hedge=True, hedge_min_seconds=0.5)
+    model.pool.deployments[1].latencies["complete"].append(0.5)
+    model.pool.deployments[1].last_used = time.monotonic()
+    assert ask(model) == "a"
+    assert model.pool.stats()["hedged"] == 0 and "b:start" not in events
+
+
+def test_sync_invoke_routes_and_fails_over():
+    events = []
+    model = routing_model(StubModel(name="down", fail=True, events=events), StubModel(name="up", events=events))
+    assert model.invoke([HumanMessage(content="hi")]).content == "up"
+    assert model.pool.stats()["failovers"] == 1
+
+
+def test_every_deployment_failing_raises_the_last_error():
+    model = routing_model(StubModel(name="a", fail=True, events=[]), StubModel(name="b", fail=True, events=[]))
+    with pytest.raises(ConnectionError):
+        ask(model)
+    with pytest.raises(ConnectionError):
+        model.invoke([HumanMessage(content="hi")])
@@ -0,0 +1,15 @@
+from metrics import MetricsRegistry
+
+
+def test_component_tallies_are_exposed_as_counters_and_current_values_as_gauges():
+    tally = {"hits": 3}
+    registry = MetricsRegistry()
+    registry.callback_counter("tool_cache_hits", "Tool calls answered from the result cache", lambda: tally["hits"])
+    registry.gauge("live_sessions", "Conversation sessions held in memory", lambda: 2)
+    tally["hits"] += 1
+
+    lines = registry.render().splitlines()
+    assert "# TYPE travel_agent_tool_cache_hits counter" in lines
+    assert "travel_agent_tool_cache_hits_total 4" in lines
+    assert "# TYPE travel_agent_live_sessions gauge" in lines
+    assert "travel_agent_live_sessions 2" in lines
@@ -0,0 +1,62 @@
+import asyncio
+
+from langchain_core.tools import StructuredTool
+
+from prefetch import PrefetchRule, Prefetcher
+
+
+def make_prefetcher(delay=0.0):
+    calls = []
+
+    async def get_weather_forecast(city: str, days: int = 3) -> str:
+        """Weather forecast for a city"""
+        calls.append(city)
+        await asyncio.sleep(delay)
+        return f"Sunny in {city}"
+
+    tool = StructuredTool.from_function(coroutine=get_weather_forecast, name="get_weather_forecast",
+                                        description="Weather forecast for a city")
+    rules = [PrefetchRule("get_weather_forecast", "place", "city", ("weather",))]
+    # Prefetches call the tool directly, the agent through the prefetcher's wrapper
+    prefetcher = Prefetcher(lambda: [tool], rules=rules)
+    return prefetcher, prefetcher.wrap(tool), calls
+
+
+def test_prefetched_call_the_agent_makes_is_a_hit():
+    prefetcher, tool, calls = make_prefetcher()
+
+    async def run():
+        run = prefetcher.start("What is the weather in Rome?")
+        await asyncio.sleep(0.05)
+        await tool.ainvoke({"city": "Rome"})
+        prefetcher.finish(run)
+
+    asyncio.run(run())
+    stats = prefetcher.stats()
+    assert (stats["prefetched"], stats["hits"], stats["wasted"]) == (1, 1, 0)
+
+
+def test_unused_results_count_as_waste_even_when_they_complete_after_the_request():
+    prefetcher, tool, calls = make_prefetcher(delay=0.05)
+
+    async def run():
+        run = prefetcher.start("What is the weather in Rome?")
+        await asyncio.sleep(0.01)
+        prefetcher.finish(run)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    stats = prefetcher.stats()
+    assert (stats["prefetched"], stats["wasted"], stats["wasted_completed"]) == (1, 1, 1)
+
+
+def test_no_prefetches_start_once_the_request_is_finished():
+    prefetcher, tool, calls = make_prefetcher()
+
+    async def run():
+        # Answered before the catalogs were loaded and the plan made
+        prefetcher.finish(prefetcher.start("What is the weather in Rome?"))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert calls == [] and prefetcher.stats()["prefetched"] == 0
@@ -0,0 +1,35 @@
+import asyncio
+
+from langchain_core.tools import StructuredTool
+
+from breaker import ServerBreakers
+from router import IntentRouter
+
+
+def packing_list_tool(behaviour):
+    async def retrieve_saved_packing_list() -> str:
+        """The user's saved packing list"""
+        return await behaviour()
+
+    return StructuredTool.from_function(coroutine=retrieve_saved_packing_list, name="retrieve_saved_packing_list",
+                                        description="The user's saved packing list")
+
+
+def test_saved_packing_list_is_answered_on_the_fast_path():
+    async def saved():
+        return "- boots\n- water"
+
+    router = IntentRouter(lambda: [packing_list_tool(saved)])
+    answer = asyncio.run(router.route("show my packing list"))
+    assert answer == "Here is your saved packing list:\n\n- boots\n- water"
+
+
+def test_unreachable_server_hands_the_request_to_the_agent():
+    async def unreachable():
+        raise ConnectionError("refused")
+
+    # The breaker turns the failure into a message for the LLM rather than raising
+    tool = ServerBreakers().wrap(packing_list_tool(unreachable), "persist")
+    router = IntentRouter(lambda: [tool])
+    assert asyncio.run(router.route("show my packing list")) is None
+    assert router.stats()["fallbacks"] == {"show_packing_list": 1}
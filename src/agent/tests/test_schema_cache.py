@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+from mcp.types import Tool as MCPTool
+
+from discovery import ToolDiscovery
+from schema_cache import ToolSchemaCache
+
+
+def tool(name):
+    return MCPTool(name=name, description=f"The {name} tool", inputSchema={"type": "object", "properties": {}})
+
+
+def test_concurrent_writers_leave_a_complete_file(tmp_path):
+    cache = ToolSchemaCache(tmp_path / "schemas.json")
+    writers = [threading.Thread(target=cache.put, args=(f"http://server-{i}/mcp", "1.0", [tool(f"tool_{i}")]))
+               for i in range(8)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    # Each write replaces the whole file, so some entries may be lost, but the file always parses
+    assert cache.load()
+    assert [path.name for path in tmp_path.iterdir()] == ["schemas.json"]
+
+
+def test_failed_cache_write_does_not_stop_discovery(tmp_path):
+    class ReadOnlyCache(ToolSchemaCache):
+        def put(self, url, server_version, tools):
+            raise PermissionError("read-only file system")
+
+    connections = {"remote": {"transport": "streamable_http", "url": "http://remote/mcp"}}
+    discovery = ToolDiscovery(connections, timeout_seconds=1, retry_seconds=1, max_retry_seconds=1,
+                              schema_cache=ReadOnlyCache(tmp_path / "schemas.json"))
+
+    async def list_server(name):
+        return "1.0", [tool("search")]
+
+    discovery._list_server = list_server
+    assert asyncio.run(discovery._load_server("remote"))
+    assert [t.name for t in discovery.tools] == ["search"]
@@ -0,0 +1,26 @@
+import asyncio
+
+from memory import RollingSummaryMemory
+from sessions import SessionManager
+
+
+def test_idle_eviction_skips_sessions_with_a_turn_in_flight():
+    manager = SessionManager(
+        memory_factory=lambda session_id: RollingSummaryMemory(memory_key="chat_history", return_messages=True),
+        max_sessions=10,
+        idle_ttl_seconds=60,
+        max_total_bytes=10 ** 9
+    )
+
+    async def scenario():
+        busy = manager.get("busy")
+        manager.get("idle")
+        async with busy.lock:
+            # Both were last used long ago; only the busy one is still running a turn
+            for session in manager._sessions.values():
+                session.last_used -= 120
+            manager.get("new")
+            assert set(manager._sessions) == {"busy", "new"}
+        assert manager.stats()["evictions"]["idle"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+from langchain_core.tools import StructuredTool
+
+from tool_cache import ToolResultCache
+from tool_wrappers import FallbackResult, is_error_result
+
+
+def counting_tool(name, results):
+    """A tool answering with `results` in turn, counting its calls"""
+    calls = []
+
+    async def call(location: str):
+        calls.append(location)
+        await asyncio.sleep(0.01)
+        return results[min(len(calls), len(results)) - 1]
+
+    tool = StructuredTool.from_function(coroutine=call, name=name, description="test tool")
+    return tool, calls
+
+
+def new_cache(**settings):
+    return ToolResultCache(max_entries=10, default_ttl_seconds=60, **settings)
+
+
+def test_identical_calls_are_answered_from_the_cache():
+    tool, calls = counting_tool("get_current_weather", ['{"temperature": 12}'])
+    cache = new_cache(case_insensitive={"get_current_weather": ["location"]})
+    cached = cache.wrap(tool)
+
+    async def run():
+        first = await cached.ainvoke({"location": "Oslo"})
+        second = await cached.ainvoke({"location": " oslo"})
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == '{"temperature": 12}'
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+
+def test_case_only_counts_for_arguments_not_declared_case_insensitive():
+    tool, calls = counting_tool("lookup_item", ['"first"', '"second"'])
+    cached = new_cache().wrap(tool)
+
+    async def run():
+        return [await cached.ainvoke({"location": value}) for value in ("Tent ID AB12", "tent id ab12", "Tent ID AB12 ")]
+
+    assert asyncio.run(run()) == ['"first"', '"second"', '"first"']
+    assert calls == ["Tent ID AB12", "tent id ab12"]
+
+def test_error_results_are_not_cached():
+    error = json.dumps({"error": "Failed to get weather for Oslo"})
+    tool, calls = counting_tool("get_current_weather", [error, '{"temperature": 12}'])
+    cache = new_cache()
+    cached = cache.wrap(tool)
+
+    async def run():
+        failed = await cached.ainvoke({"location": "Oslo"})
+        retried = await cached.ainvoke({"location": "oslo "})
+        return failed, retried
+
+    failed, retried = asyncio.run(run())
+    assert failed == error
+    assert retried == '{"temperature": 12}'
+    assert len(calls) == 2
+    assert cache.stats()["errors_not_cached"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_fallback_results_are_not_cached():
+    tool, calls = counting_tool("get_current_weather", [FallbackResult("service unavailable"), "ok"])
+    cached = new_cache().wrap(tool)
+
+    async def run():
+        await cached.ainvoke({"location": "Oslo"})
+        return await cached.ainvoke({"location": "Oslo"})
+
+    assert asyncio.run(run()) == "ok"
+    assert len(calls) == 2
+
+
+def test_concurrent_identical_calls_share_one_call():
+    tool, calls = counting_tool("search_attractions", ['{"attractions": []}'])
+    cache = new_cache()
+    cached = cache.wrap(tool)
+
+    async def run():
+        return await asyncio.gather(*(cached.ainvoke({"location": "Paris"}) for _ in range(5)))
+
+    assert len(set(asyncio.run(run()))) == 1
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_no_cache_tools_invalidate_what_they_make_stale():
+    reads, read_calls = counting_tool("get_endorsements", ['{"endorsements": []}'])
+    writes, write_calls = counting_tool("add_endorsement", ['{"ok": true}'])
+    cache = new_cache(no_cache=["add_endorsement"], invalidates={"add_endorsement": ["get_endorsements"]})
+    cached_reads, cached_writes = cache.wrap(reads), cache.wrap(writes)
+
+    async def run():
+        await cached_reads.ainvoke({"location": "x"})
+        await cached_writes.ainvoke({"location": "x"})
+        await cached_writes.ainvoke({"location": "x"})
+        await cached_reads.ainvoke({"location": "x"})
+
+    asyncio.run(run())
+    assert len(write_calls) == 2
+    assert len(read_calls) == 2
+
+
+def test_is_error_result():
+    assert is_error_result(('{"error": "boom"}', None))
+    assert is_error_result({"is_error": True})
+    assert is_error_result("Error executing tool get_weather: timeout")
+    assert is_error_result([{"type": "text", "text": '{"error": "boom"}'}])
+    assert not is_error_result('{"error": null, "temperature": 3}')
+    assert not is_error_result(('{"attractions": []}', None))
+    assert not is_error_result("Sunny and 20 degrees")
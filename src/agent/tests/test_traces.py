@@ -0,0 +1,45 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+
+from traces import RecordedRequest, ReplayChatModel, Trace, TraceRecorder, current_replay
+
+
+def test_requests_are_recorded_with_how_they_ended(tmp_path):
+    recorder = TraceRecorder(tmp_path / "trace.jsonl")
+
+    ok = recorder.request("s", "What should I see in Rome?")
+    ok.finish("The Colosseum")
+    # Written once, even if the request's cleanup finishes it again
+    ok.finish(None, error=RuntimeError("late"))
+
+    failed = recorder.request("s", "Weather in Paris?")
+    failed.add_tool_call("get_weather_forecast", {"city": "Paris"}, None, 0.1, error="refused")
+    failed.finish(None, error=RuntimeError("LLM unavailable"))
+
+    recorder.request("s", "Hikes near Denver?").finish(None, error=asyncio.CancelledError())
+
+    requests = Trace.load(tmp_path / "trace.jsonl").requests
+    assert [(request.status, request.output) for request in requests] == [
+        ("ok", "The Colosseum"), ("error", None), ("cancelled", None)
+    ]
+    assert requests[1].tool_calls[0]["error"] == "refused"
+    assert recorder.requests == 3
+
+
+def test_replay_model_serves_recorded_outputs_to_sync_and_async_calls():
+    request = RecordedRequest("r", "s", "Hikes near Denver?", "Try Mount Falcon", 1.0, llm_calls=[
+        {"type": "llm", "output": message_to_dict(AIMessage(content=answer)), "seconds": 0.5}
+        for answer in ("Looking for hikes", "Try Mount Falcon")
+    ])
+    model = ReplayChatModel()
+    prompt = [HumanMessage(content="Hikes near Denver?")]
+
+    token = current_replay.set(request)
+    try:
+        assert model.invoke(prompt).content == "Looking for hikes"
+        assert asyncio.run(model.ainvoke(prompt)).content == "Try Mount Falcon"
+        assert model.invoke(prompt).content == "[replay: no recorded LLM output]"
+    finally:
+        current_replay.reset(token)
+    assert request.mismatches == ["more LLM calls than recorded"]
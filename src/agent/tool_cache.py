@@ -0,0 +1,158 @@
+"""
+TTL result cache for MCP tool calls.
+
+Identical read-only calls (same tool, same normalized arguments; case only counts
+for arguments the tool does not declare case-insensitive) within a tool's TTL are answered from memory instead of going over HTTP to the MCP server. Concurrent
+identical calls, e.g. from the questions of a batch, share the one call in flight.
+Results reporting an error are passed on but not kept. Side-effecting tools are never
+cached, and calling one drops the cached results it makes stale.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+from tool_wrappers import ToolCall, is_error_result, is_fallback, normalize_arguments, schema_defaults, wrap_tool
+
+
+class ToolResultCache:
+    """LRU cache of tool results with a TTL per tool"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        default_ttl_seconds: float,
+        ttl_seconds: Optional[Dict[str, float]] = None,
+        no_cache: Iterable[str] = (),
+        invalidates: Optional[Dict[str, List[str]]] = None,
+        case_insensitive: Optional[Dict[str, List[str]]] = None
+    ):
+        self.max_entries = max_entries
+        self.default_ttl_seconds = default_ttl_seconds
+        self.ttl_seconds = ttl_seconds or {}
+        self.no_cache = set(no_cache)
+        self.invalidates = invalidates or {}
+        # Arguments per tool whose case the MCP server ignores, e.g. place names
+        self.case_insensitive = case_insensitive or {}
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        # Result of each call still waiting for its MCP server
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        # Metrics
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+        # Failed results passed on without being cached
+        self.errors: Dict[str, int] = {}
+        self.evictions = 0
+
+    def ttl_for(self, tool_name: str) -> float:
+        """Get how long results of a tool stay fresh (0 disables caching)"""
+        if tool_name in self.no_cache:
+            return 0
+        return self.ttl_seconds.get(tool_name, self.default_ttl_seconds)
+
+    def get(self, key: Tuple[str, str]) -> Tuple[bool, Any]:
+        """Look up a fresh cached result, returning (found, result)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, result
+
+    def put(self, key: Tuple[str, str], result: Any, ttl: float) -> None:
+        """Store a result, evicting the least recently used entries over the size bound"""
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tool_name: str) -> None:
+        """Drop every cached result of a tool"""
+        for key in [key for key in self._entries if key[0] == tool_name]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """Return a copy of `tool` that answers from this cache when it can"""
+        defaults = schema_defaults(tool)
+        case_insensitive = self.case_insensitive.get(tool.name, ())
+
+        async def cached_call(tool_name: str, arguments: Dict[str, Any], call_next: ToolCall) -> Any:
+            ttl = self.ttl_for(tool_name)
+            if ttl <= 0:
+                result = await call_next(arguments)
+                for stale_tool in self.invalidates.get(tool_name, []):
+                    self.invalidate(stale_tool)
+                return result
+
+            key = (tool_name, normalize_arguments(arguments, defaults, case_insensitive))
+            found, result = self.get(key)
+            if found:
+                self.hits[tool_name] = self.hits.get(tool_name, 0) + 1
+                return result
+
+            waiting = self._in_flight.get(key)
+            if waiting is not None:
+                self.coalesced[tool_name] = self.coalesced.get(tool_name, 0) + 1
+                try:
+                    return await asyncio.shield(waiting)
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                    # The call we waited on was cancelled with its own request; make our own
+
+            self.misses[tool_name] = self.misses.get(tool_name, 0) + 1
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            try:
+                result = await call_next(arguments)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Retrieved here so an error nobody else waited for is not reported as unhandled
+                future.exception()
+                raise
+            finally:
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+            future.set_result(result)
+            # Failures (an open circuit breaker's stand-in, or an error the tool reported) are not worth keeping
+            if is_fallback(result) or is_error_result(result):
+                self.errors[tool_name] = self.errors.get(tool_name, 0) + 1
+            else:
+                self.put(key, result, ttl)
+            return result
+
+        return wrap_tool(tool, cached_call)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters per tool"""
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            # Calls that waited for an identical call in flight instead of making their own
+            "coalesced": sum(self.coalesced.values()),
+            "errors_not_cached": sum(self.errors.values()),
+            "evictions": self.evictions,
+            "per_tool": {
+                name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0), "coalesced": self.coalesced.get(name, 0)}
+                for name in sorted(set(self.hits) | set(self.misses) | set(self.coalesced))
+            }
+        }
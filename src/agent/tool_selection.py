@@ -0,0 +1,174 @@
+"""
+Per-query tool selection - sends the LLM only the tools a message is likely to need.
+
+Every LLM call carries the JSON schema of every tool it may call, and with five MCP
+servers that is around twenty schemas per call. The selector scores each tool against
+the message (plus the user's previous message, for follow-ups such as "book it") with
+a BM25 index over tool names, descriptions and argument names, and keeps the servers
+whose tools match well. A server's tools are kept or dropped together, since they are
+used together (search, then details, then book), and servers that a workflow needs
+alongside another can be named as companions (packing lists check the weather).
+
+When nothing matches confidently the full tool set is used, so selection can narrow
+what the LLM sees but never leave it without a tool it needs.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from callbacks import TOKEN_BUCKETS
+from metrics import Histogram
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "could", "do", "for", "from", "get", "give",
+    "has", "have", "how", "i", "if", "in", "is", "it", "its", "me", "my", "of", "on", "or", "our", "please",
+    "should", "some", "that", "the", "there", "this", "to", "us", "want", "was", "we", "what", "when",
+    "where", "which", "who", "will", "with", "would", "you", "your"
+}
+
+# Everyday words for what the tools do, so "is it going to rain" finds the weather tools
+SYNONYMS = {
+    "rain": "weather", "sunny": "weather", "snow": "weather", "temperature": "weather", "cold": "weather",
+    "hot": "weather", "wind": "weather", "umbrella": "weather",
+    "see": "attraction", "visit": "attraction", "sight": "attraction", "sightseeing": "attraction",
+    "museum": "attraction", "landmark": "attraction", "tour": "attraction",
+    "reserve": "book", "reservation": "book", "ticket": "book",
+    "bring": "pack", "luggage": "pack", "suitcase": "pack", "gear": "pack",
+    "hike": "activity", "hiking": "activity", "camp": "activity", "ski": "activity", "beach": "activity",
+    "review": "endorsement", "recommend": "endorsement", "testimonial": "endorsement", "rate": "endorsement"
+}
+
+
+def stem(word: str) -> str:
+    """Strip common English suffixes so "packing", "packed" and "packs" all match "pack" """
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase stemmed terms of a text, splitting snake_case and camelCase"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    words = [word for word in re.split(r"[^a-z0-9]+", text.lower()) if word and word not in STOPWORDS]
+    terms = []
+    for word in words:
+        terms.append(stem(word))
+        if word in SYNONYMS:
+            terms.append(stem(SYNONYMS[word]))
+    return terms
+
+
+def tool_document(tool: BaseTool) -> List[str]:
+    """Terms describing a tool; the name counts three times as it is the best summary"""
+    schema = tool.args_schema if isinstance(tool.args_schema, dict) else tool.get_input_schema().model_json_schema()
+    arguments = " ".join(
+        f"{name} {spec.get('description', '')}" for name, spec in schema.get("properties", {}).items()
+    )
+    return tokenize(tool.name) * 3 + tokenize(tool.description or "") + tokenize(arguments)
+
+
+def schema_tokens(tool: BaseTool) -> int:
+    """Estimated prompt tokens of a tool's schema (~4 characters per token)"""
+    return len(json.dumps(convert_to_openai_tool(tool))) // 4
+
+
+class ToolIndex:
+    """BM25 index over tool descriptions"""
+
+    def __init__(self, tools: Sequence[BaseTool], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = {tool.name: Counter(tool_document(tool)) for tool in tools}
+        self.lengths = {name: sum(terms.values()) for name, terms in self.documents.items()}
+        self.average_length = sum(self.lengths.values()) / len(self.lengths) if self.lengths else 0.0
+        frequency = Counter(term for terms in self.documents.values() for term in terms)
+        count = len(self.documents)
+        self.idf = {term: math.log(1 + (count - n + 0.5) / (n + 0.5)) for term, n in frequency.items()}
+
+    def scores(self, query: str) -> Dict[str, float]:
+        terms = set(tokenize(query))
+        scores = {}
+        for name, document in self.documents.items():
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[name] / self.average_length)
+            scores[name] = sum(
+                self.idf[term] * document[term] * (self.k1 + 1) / (document[term] + norm)
+                for term in terms if term in document
+            )
+        return scores
+
+
+class ToolSelector:
+    """Picks the servers (and so the tools) relevant to a message"""
+
+    def __init__(
+        self,
+        min_score: float = 1.0,
+        relative_threshold: float = 0.35,
+        companions: Optional[Dict[str, List[str]]] = None
+    ):
+        self.min_score = min_score
+        self.relative_threshold = relative_threshold
+        self.companions = companions or {}
+        self.update([])
+
+        # Metrics
+        self.requests = 0
+        self.fallbacks = 0
+        self.selected_servers: Dict[str, int] = {}
+        self.tokens_saved = Histogram(TOKEN_BUCKETS)
+
+    def update(self, tools: Sequence[BaseTool], tool_servers: Optional[Dict[str, str]] = None) -> None:
+        """Index a new tool set, e.g. when a failed MCP server comes back"""
+        self.tools = list(tools)
+        # Tools not offered by a known server form a group of their own
+        self.tool_servers = {tool.name: (tool_servers or {}).get(tool.name, tool.name) for tool in self.tools}
+        self.index = ToolIndex(self.tools)
+        self.schema_tokens = {tool.name: schema_tokens(tool) for tool in self.tools}
+        self.total_schema_tokens = sum(self.schema_tokens.values())
+
+    def select(self, query: str, context: Iterable[str] = ()) -> Tuple[List[BaseTool], bool]:
+        """Tools for a message, and whether they are the full set (no confident match)"""
+        self.requests += 1
+        scores = self.index.scores(" ".join([query, *context]))
+        server_scores: Dict[str, float] = {}
+        for name, score in scores.items():
+            server = self.tool_servers[name]
+            server_scores[server] = max(server_scores.get(server, 0.0), score)
+
+        best = max(server_scores.values(), default=0.0)
+        if best < self.min_score:
+            return self._full_set()
+
+        servers = {server for server, score in server_scores.items() if score >= best * self.relative_threshold}
+        for server in list(servers):
+            servers.update(self.companions.get(server, []))
+        selected = [tool for tool in self.tools if self.tool_servers[tool.name] in servers]
+        if len(selected) == len(self.tools):
+            return self._full_set()
+
+        for server in servers & set(server_scores):
+            self.selected_servers[server] = self.selected_servers.get(server, 0) + 1
+        self.tokens_saved.observe(self.total_schema_tokens - sum(self.schema_tokens[tool.name] for tool in selected))
+        return selected, False
+
+    def _full_set(self) -> Tuple[List[BaseTool], bool]:
+        self.fallbacks += 1
+        self.tokens_saved.observe(0)
+        return self.tools, True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "full_set_fallbacks": self.fallbacks,
+            "tools": len(self.tools),
+            "schema_tokens_all_tools": self.total_schema_tokens,
+            "schema_tokens_saved_per_request": self.tokens_saved.snapshot(),
+            "selected_servers": dict(self.selected_servers)
+        }
@@ -0,0 +1,116 @@
+"""
+Helpers for wrapping LangChain tools loaded from MCP servers.
+
+A wrapper keeps the tool's name, description and argument schema, so the LLM sees
+exactly the same tool, and replaces how a call is executed.
+"""
+
+import json
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Collection, Dict, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+# async def wrapper(tool_name, arguments, call_next) -> tool result
+ToolCall = Callable[[Dict[str, Any]], Awaitable[Any]]
+ToolWrapper = Callable[[str, Dict[str, Any], ToolCall], Awaitable[Any]]
+
+
+class FallbackResult(str):
+    """Message returned in place of a tool result that could not be fetched; never cached"""
+
+
+def is_fallback(result: Any) -> bool:
+    content = result[0] if isinstance(result, tuple) and len(result) == 2 else result
+    return isinstance(content, FallbackResult)
+
+
+# How tool errors read when an MCP server returns them as text
+ERROR_TEXT_PREFIXES = ("Error executing tool", "Error:")
+
+
+def is_error_result(result: Any) -> bool:
+    """Whether a tool result reports a failure: an "error" key, an is_error flag, or error text"""
+    content = result[0] if isinstance(result, tuple) and len(result) == 2 else result
+    if getattr(content, "isError", False) or getattr(content, "is_error", False):
+        return True
+    if isinstance(content, list):
+        content = "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    if isinstance(content, str):
+        text = content.strip()
+        if text.startswith(ERROR_TEXT_PREFIXES):
+            return True
+        try:
+            content = json.loads(text)
+        except ValueError:
+            return False
+    if isinstance(content, dict):
+        return bool(content.get("error") or content.get("is_error") or content.get("isError"))
+    return False
+
+
+@dataclass
+class ToolTimeout:
+    """Timeout the executor runs one tool call under; `expired` is set before it cancels the call"""
+    seconds: Optional[float]
+    expired: bool = False
+
+
+# Set by the executor for the tool call it is running, so wrappers can tell its timeout
+# from other cancellations (client disconnect, request deadline, the time budget)
+current_tool_timeout: ContextVar[Optional[ToolTimeout]] = ContextVar("current_tool_timeout", default=None)
+
+
+def timed_out() -> bool:
+    """Whether the tool call being cancelled was cut off by its timeout"""
+    timeout = current_tool_timeout.get()
+    return timeout is not None and timeout.expired
+
+
+def wrap_tool(tool: BaseTool, wrapper: ToolWrapper) -> BaseTool:
+    """Return a copy of `tool` whose calls go through `wrapper`"""
+    inner = tool.coroutine
+
+    async def call_next(arguments: Dict[str, Any]) -> Any:
+        return await inner(**arguments)
+
+    async def call_tool(**arguments: Any) -> Any:
+        return await wrapper(tool.name, arguments, call_next)
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=call_tool,
+        response_format=tool.response_format,
+        metadata=tool.metadata,
+        return_direct=tool.return_direct
+    )
+
+
+def schema_defaults(tool: BaseTool) -> Dict[str, Any]:
+    """Get the default value of each tool argument that declares one"""
+    schema = tool.args_schema
+    if not isinstance(schema, dict):
+        schema = tool.get_input_schema().model_json_schema()
+    properties = schema.get("properties", {})
+    return {name: spec["default"] for name, spec in properties.items() if "default" in spec}
+
+
+def normalize_arguments(arguments: Dict[str, Any], defaults: Dict[str, Any], case_insensitive: Collection[str] = ()) -> str:
+    """Canonical form of tool arguments, so equivalent calls compare equal
+
+    Case is only ignored for the arguments named in `case_insensitive`; elsewhere (item text,
+    ids) "Boots" and "boots" are different calls.
+    """
+    normalized = dict(defaults)
+    for name, value in arguments.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if name in case_insensitive:
+                value = value.lower()
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True, default=str)
@@ -0,0 +1,308 @@
+"""
+Request traces - recording agent requests to JSONL and replaying them offline.
+
+With `TRACE_RECORD_PATH` set, every request is written to a JSONL file: the user
+message, the final answer and how the request ended ("ok", "error" or "cancelled"),
+every LLM call (input messages, output message, latency) and every MCP tool call
+(arguments, result, latency). Tool calls are recorded where
+the agent calls the MCP server, below the result cache and the artifact store, so a
+trace holds what the servers actually returned. The MCP tool schemas are written
+whenever the tool set changes.
+
+`LLM_PROVIDER=replay` runs the agent against a recorded trace instead of a real
+model: `ReplayChatModel` answers each LLM call of a request with the recorded output,
+in order, and `recorded_tools` serves tool results from the trace (or the live MCP
+servers are used). `src/bench/replay_trace.py` drives a replay and reports how
+latency compares with the recording.
+
+Lines are JSON objects with a "type": "tools", "request", "llm" or "tool"; the
+events of a request carry its "request_id" and are written together when it ends.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult, LLMResult
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+from memory import SUMMARY_PROMPT
+from tool_wrappers import ToolCall, normalize_arguments, wrap_tool
+
+# The trace of the request being handled, for the tool wrapper (tool calls run in tasks copying the context)
+current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+# The recorded request being replayed
+current_replay: ContextVar[Optional["RecordedRequest"]] = ContextVar("current_replay", default=None)
+
+
+def tool_spec(tool: BaseTool) -> Dict[str, Any]:
+    """Name, description and argument schema of a tool, enough to rebuild it for a replay"""
+    schema = tool.args_schema if isinstance(tool.args_schema, dict) else tool.get_input_schema().model_json_schema()
+    return {
+        "name": tool.name,
+        "description": tool.description,
+        "args_schema": schema,
+        "response_format": tool.response_format
+    }
+
+
+def result_content(result: Any) -> Any:
+    """The JSON-serializable content of a tool result ((content, artifact) results keep the content)"""
+    content = result[0] if isinstance(result, tuple) and len(result) == 2 else result
+    return content if isinstance(content, (str, list, dict, int, float, bool, type(None))) else str(content)
+
+
+class TraceRecorder:
+    """Appends request traces to a JSONL file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def write(self, events: Sequence[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(event, default=str) + "\n" for event in events)
+        with self._lock:
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(lines)
+
+    def record_tools(self, tools: Sequence[BaseTool]) -> None:
+        """Write the current tool schemas"""
+        self.write([{"type": "tools", "time": time.time(), "tools": [tool_spec(tool) for tool in tools]}])
+
+    def request(self, session_id: str, user_input: str) -> "RequestTrace":
+        """Start recording a request; tool calls in this context are added to it"""
+        trace = RequestTrace(self, session_id, user_input)
+        current_trace.set(trace)
+        return trace
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """Return a copy of `tool` whose calls are added to the current request's trace"""
+
+        async def record_call(tool_name: str, arguments: Dict[str, Any], call_next: ToolCall) -> Any:
+            trace = current_trace.get()
+            if trace is None:
+                return await call_next(arguments)
+            started = time.monotonic()
+            try:
+                result = await call_next(arguments)
+            except Exception as e:
+                trace.add_tool_call(tool_name, arguments, None, time.monotonic() - started, error=str(e))
+                raise
+            trace.add_tool_call(tool_name, arguments, result_content(result), time.monotonic() - started)
+            return result
+
+        return wrap_tool(tool, record_call)
+
+
+class RequestTrace(AsyncCallbackHandler):
+    """Events of one request, passed as a callback handler to record its LLM calls"""
+
+    def __init__(self, recorder: TraceRecorder, session_id: str, user_input: str):
+        self.recorder = recorder
+        self.request_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.user_input = user_input
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.events: List[Dict[str, Any]] = []
+        self.llm_started: Dict[UUID, tuple] = {}
+        self.finished = False
+
+    def add_tool_call(self, tool: str, arguments: Dict[str, Any], output: Any, seconds: float, error: Optional[str] = None) -> None:
+        self.events.append({
+            "type": "tool", "request_id": self.request_id, "tool": tool, "args": arguments,
+            "output": output, "error": error, "seconds": round(seconds, 6)
+        })
+
+    async def on_chat_model_start(self, serialized, messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any) -> None:
+        self.llm_started[run_id] = (time.monotonic(), messages_to_dict(messages[0]) if messages else [])
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started, inputs = self.llm_started.pop(run_id, (time.monotonic(), []))
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        self.events.append({
+            "type": "llm", "request_id": self.request_id, "input": inputs,
+            "output": message_to_dict(message) if message is not None else None,
+            "seconds": round(time.monotonic() - started, 6)
+        })
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started, inputs = self.llm_started.pop(run_id, (time.monotonic(), []))
+        self.events.append({
+            "type": "llm", "request_id": self.request_id, "input": inputs, "output": None,
+            "error": repr(error), "seconds": round(time.monotonic() - started, 6)
+        })
+
+    def finish(self, output: Optional[str], fast_path: bool = False, error: Optional[BaseException] = None) -> None:
+        """Write the request and its events to the trace file, once, with how it ended"""
+        if self.finished:
+            return
+        self.finished = True
+        if current_trace.get() is self:
+            current_trace.set(None)
+        if error is None:
+            status = "ok"
+        elif isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            # Client disconnected, deadline passed, or the caller stopped reading the stream
+            status = "cancelled"
+        else:
+            status = "error"
+        self.recorder.requests += 1
+        self.recorder.write([{
+            "type": "request", "request_id": self.request_id, "session_id": self.session_id,
+            "time": self.started_at, "input": self.user_input, "output": output, "fast_path": fast_path,
+            "status": status, "error": repr(error) if status == "error" else None,
+            "seconds": round(time.monotonic() - self.started, 6)
+        }, *self.events])
+
+
+@dataclass
+class RecordedRequest:
+    """A recorded request and a cursor over its LLM outputs and tool results for replaying it"""
+    request_id: str
+    session_id: str
+    input: str
+    output: Optional[str]
+    seconds: float
+    fast_path: bool = False
+    # "ok", "error" or "cancelled"
+    status: str = "ok"
+    llm_calls: List[Dict[str, Any]] = field(default_factory=list)
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    # Replay progress
+    llm_served: int = 0
+    tools_served: set = field(default_factory=set)
+    mismatches: List[str] = field(default_factory=list)
+
+    def next_llm_call(self) -> Optional[Dict[str, Any]]:
+        if self.llm_served >= len(self.llm_calls):
+            self.mismatches.append("more LLM calls than recorded")
+            return None
+        self.llm_served += 1
+        return self.llm_calls[self.llm_served - 1]
+
+    def find_tool_call(self, tool: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The recorded result of the same call, preferring one not served yet"""
+        key = normalize_arguments(arguments, {})
+        matches = [
+            index for index, call in enumerate(self.tool_calls)
+            if call["tool"] == tool and normalize_arguments(call["args"], {}) == key
+        ]
+        unused = [index for index in matches if index not in self.tools_served]
+        if not matches:
+            self.mismatches.append(f"no recorded result for {tool}({key})")
+            return None
+        index = (unused or matches)[0]
+        self.tools_served.add(index)
+        return self.tool_calls[index]
+
+
+class Trace:
+    """A parsed trace file"""
+
+    def __init__(self, requests: List[RecordedRequest], tools: List[Dict[str, Any]]):
+        self.requests = requests
+        self.tools = tools
+
+    @classmethod
+    def load(cls, path: Path) -> "Trace":
+        requests: Dict[str, RecordedRequest] = {}
+        events: Dict[str, List[Dict[str, Any]]] = {}
+        tools: List[Dict[str, Any]] = []
+        with Path(path).open(encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event["type"] == "tools":
+                    tools = event["tools"]
+                elif event["type"] == "request":
+                    requests[event["request_id"]] = RecordedRequest(
+                        request_id=event["request_id"], session_id=event["session_id"], input=event["input"],
+                        output=event["output"], seconds=event["seconds"], fast_path=event.get("fast_path", False),
+                        status=event.get("status", "ok")
+                    )
+                else:
+                    events.setdefault(event["request_id"], []).append(event)
+        for request_id, request in requests.items():
+            for event in events.get(request_id, []):
+                (request.llm_calls if event["type"] == "llm" else request.tool_calls).append(event)
+        return cls(list(requests.values()), tools)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model answering each call of the current request with its recorded output"""
+
+    simulate_latency: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self
+
+    def _next_output(self, messages: List[BaseMessage]) -> Tuple[BaseMessage, float]:
+        """The recorded output for this call and how long it took"""
+        # Summaries are made off the request path and not recorded; keep the recent lines instead
+        if messages and str(messages[-1].content).startswith(SUMMARY_PROMPT[:40]):
+            return AIMessage(content=str(messages[-1].content)[-1000:]), 0.0
+
+        request = current_replay.get()
+        recorded = request.next_llm_call() if request is not None else None
+        if recorded is None or recorded.get("output") is None:
+            return AIMessage(content="[replay: no recorded LLM output]"), 0.0
+        return messages_from_dict([recorded["output"]])[0], recorded["seconds"]
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message, seconds = self._next_output(messages)
+        if self.simulate_latency and seconds:
+            await asyncio.sleep(seconds)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message, seconds = self._next_output(messages)
+        if self.simulate_latency and seconds:
+            time.sleep(seconds)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def recorded_tools(trace: Trace, simulate_latency: bool = False) -> List[BaseTool]:
+    """Tools with the recorded schemas that answer from the current request's recorded results"""
+
+    def make_tool(spec: Dict[str, Any]) -> BaseTool:
+        name = spec["name"]
+        content_and_artifact = spec.get("response_format") == "content_and_artifact"
+
+        async def call_tool(**arguments: Any) -> Any:
+            request = current_replay.get()
+            recorded = request.find_tool_call(name, arguments) if request is not None else None
+            if recorded is None:
+                raise ToolException(f"No recorded result for {name}")
+            if simulate_latency:
+                await asyncio.sleep(recorded["seconds"])
+            if recorded.get("error"):
+                raise ToolException(recorded["error"])
+            return (recorded["output"], None) if content_and_artifact else recorded["output"]
+
+        return StructuredTool(
+            name=name,
+            description=spec.get("description") or "",
+            args_schema=spec["args_schema"],
+            coroutine=call_tool,
+            response_format=spec.get("response_format", "content")
+        )
+
+    return [make_tool(spec) for spec in trace.tools]
@@ -0,0 +1,76 @@
+"""
+Local stand-in for the Open-Meteo geocoding and forecast APIs used by weather-mcp.
+
+Answers every location with the same fixed, well-formed data so load tests do not
+depend on (or hammer) the real service. Point weather-mcp at it with
+WEATHER_BASE_URL and GEOCODING_BASE_URL set to http://127.0.0.1:<port>/v1.
+Set OPEN_METEO_STUB_LATENCY_SECONDS to add a delay to every response.
+"""
+
+import asyncio
+import os
+from datetime import date, timedelta
+
+from fastapi import FastAPI
+
+LATENCY_SECONDS = float(os.getenv("OPEN_METEO_STUB_LATENCY_SECONDS", 0))
+
+app = FastAPI()
+
+
+async def simulate_latency():
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+
+
+@app.get("/v1/search")
+async def search(name: str, count: int = 1, language: str = "en", format: str = "json"):
+    await simulate_latency()
+    return {
+        "results": [{
+            "name": name.title(),
+            "latitude": 48.85,
+            "longitude": 2.35,
+            "country": "Stubland",
+            "admin1": "Benchmark Region",
+            "timezone": "Europe/Paris"
+        }]
+    }
+
+
+@app.get("/v1/forecast")
+async def forecast(
+    latitude: float,
+    longitude: float,
+    current_weather: bool = False,
+    daily: str = "",
+    hourly: str = "",
+    timezone: str = "auto",
+    forecast_days: int = 7
+):
+    await simulate_latency()
+    response = {"latitude": latitude, "longitude": longitude, "timezone": timezone}
+    if current_weather:
+        response["current_weather"] = {
+            "temperature": 18.5, "windspeed": 11.2, "winddirection": 240, "weathercode": 2,
+            "time": date.today().isoformat() + "T12:00"
+        }
+    if hourly:
+        values = {
+            "temperature_2m": 18.5, "relative_humidity_2m": 62.0, "apparent_temperature": 17.8,
+            "precipitation": 0.0, "surface_pressure": 1013.0, "wind_speed_10m": 11.2, "wind_direction_10m": 240
+        }
+        response["hourly"] = {field: [values.get(field, 0)] * 24 for field in hourly.split(",")}
+    if daily:
+        days = [(date.today() + timedelta(days=offset)).isoformat() for offset in range(forecast_days)]
+        values = {
+            "weather_code": 3, "temperature_2m_max": 21.0, "temperature_2m_min": 12.0,
+            "apparent_temperature_max": 20.0, "apparent_temperature_min": 11.0,
+            "precipitation_sum": 1.2, "rain_sum": 1.0, "showers_sum": 0.2, "snowfall_sum": 0.0,
+            "precipitation_hours": 2.0, "wind_speed_10m_max": 18.0, "wind_gusts_10m_max": 30.0,
+            "wind_direction_10m_dominant": 250
+        }
+        response["daily"] = {"time": days}
+        for field in daily.split(","):
+            response["daily"][field] = [values.get(field, 0)] * forecast_days
+    return response
@@ -0,0 +1,162 @@
+"""
+Replays a recorded request trace against the current code and reports latency.
+
+Record real conversations with TRACE_RECORD_PATH=trace.jsonl on the agent server,
+then re-run them offline: every LLM call is answered with its recorded output (see
+src/agent/traces.py), and tool results come from the live MCP servers (--tools live,
+the default) or from the trace (--tools recorded, no servers needed). Requests are
+replayed one at a time in their recorded order, each in its recorded session.
+
+The report compares the time spent outside the LLM (tools, agent code, memory and
+serialization) per request with the recording, or with an earlier replay report
+given as --baseline, and flags regressions above --tolerance.
+
+    python replay_trace.py trace.jsonl --tools recorded --output replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+from run_bench import AGENT_DIR, git_revision, percentile
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 0.5), 6),
+        "p95": round(percentile(values, 0.95), 6),
+        "mean": round(sum(values) / len(values), 6) if values else 0.0
+    }
+
+
+def request_timings(request) -> Dict[str, Any]:
+    """Seconds of a recorded or replayed request, split into LLM calls and the rest"""
+    llm_seconds = sum(call["seconds"] for call in request.llm_calls)
+    tool_seconds: Dict[str, float] = {}
+    for call in request.tool_calls:
+        tool_seconds[call["tool"]] = round(tool_seconds.get(call["tool"], 0.0) + call["seconds"], 6)
+    return {
+        "seconds": request.seconds,
+        "llm_seconds": round(llm_seconds, 6),
+        "non_llm_seconds": round(max(request.seconds - llm_seconds, 0.0), 6),
+        "tool_seconds": tool_seconds
+    }
+
+
+def tool_means(requests) -> Dict[str, float]:
+    seconds: Dict[str, List[float]] = {}
+    for request in requests:
+        for call in request.tool_calls:
+            seconds.setdefault(call["tool"], []).append(call["seconds"])
+    return {tool: round(sum(values) / len(values), 6) for tool, values in sorted(seconds.items())}
+
+
+def compare(current: Dict[str, Any], reference: Dict[str, Any], tolerance: float) -> Dict[str, Any]:
+    """Relative change of each figure, and the figures that grew by more than `tolerance`"""
+    changes = {}
+    for name in ("p50", "p95", "mean"):
+        before, after = reference["non_llm_seconds"][name], current["non_llm_seconds"][name]
+        changes[f"non_llm_{name}"] = round(after / before - 1, 4) if before else 0.0
+    for tool, after in current["tool_mean_seconds"].items():
+        before = reference["tool_mean_seconds"].get(tool)
+        if before:
+            changes[f"tool_{tool}"] = round(after / before - 1, 4)
+    return {"changes": changes, "regressions": sorted(name for name, change in changes.items() if change > tolerance)}
+
+
+async def replay(args: argparse.Namespace, record_path: Path) -> Dict[str, Any]:
+    os.environ.update({
+        "LLM_PROVIDER": "replay",
+        "TRACE_REPLAY_PATH": str(Path(args.trace).resolve()),
+        "TRACE_REPLAY_TOOLS": args.tools,
+        "TRACE_REPLAY_SIMULATE_LATENCY": str(args.simulate_latency).lower(),
+        # The replay is itself recorded, to time its LLM and tool calls the same way
+        "TRACE_RECORD_PATH": str(record_path),
+        "LOG_SAMPLE_RATE": "0",
+        **dict(item.split("=", 1) for item in args.env)
+    })
+    sys.path.insert(0, str(AGENT_DIR))
+    import attractions
+    from traces import Trace, current_replay
+
+    recorded = attractions.trace_replay.requests
+    await attractions.initialize_agent()
+    outputs = []
+    try:
+        for request in recorded:
+            current_replay.set(request)
+            outputs.append(await attractions.process_user_input(request.input, request.session_id))
+    finally:
+        await attractions.shutdown()
+
+    replayed = Trace.load(record_path).requests
+    details = []
+    for original, again, output in zip(recorded, replayed, outputs):
+        mismatches = list(original.mismatches)
+        if original.status != again.status:
+            mismatches.append(f"ended {again.status} where the recording ended {original.status}")
+        if original.fast_path != again.fast_path:
+            mismatches.append("fast path " + ("taken" if again.fast_path else "not taken") + " unlike the recording")
+        if original.llm_served < len(original.llm_calls):
+            mismatches.append(f"{len(original.llm_calls) - original.llm_served} recorded LLM calls not made")
+        details.append({
+            "request_id": original.request_id,
+            "input": original.input,
+            "recorded": request_timings(original),
+            "replayed": request_timings(again),
+            "output_matches": output == original.output,
+            "mismatches": mismatches
+        })
+
+    non_llm = [detail["replayed"]["non_llm_seconds"] for detail in details]
+    return {
+        "revision": git_revision(),
+        "config": {
+            "trace": args.trace,
+            "tools": args.tools,
+            "simulate_latency": args.simulate_latency,
+            "agent_env": args.env
+        },
+        "requests": len(details),
+        "outputs_matching": sum(detail["output_matches"] for detail in details),
+        "requests_with_mismatches": sum(bool(detail["mismatches"]) for detail in details),
+        "seconds": summarize([detail["replayed"]["seconds"] for detail in details]),
+        "non_llm_seconds": summarize(non_llm),
+        "tool_mean_seconds": tool_means(replayed),
+        "recording": {
+            "seconds": summarize([detail["recorded"]["seconds"] for detail in details]),
+            "non_llm_seconds": summarize([detail["recorded"]["non_llm_seconds"] for detail in details]),
+            "tool_mean_seconds": tool_means(recorded)
+        },
+        "details": details
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="JSONL trace recorded with TRACE_RECORD_PATH")
+    parser.add_argument("--tools", choices=("live", "recorded"), default="live", help="where tool results come from")
+    parser.add_argument("--simulate-latency", action="store_true", help="wait as long as the recorded LLM (and recorded tool) calls took")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE agent setting, e.g. MCP_TOOL_MODE=inprocess")
+    parser.add_argument("--baseline", help="earlier replay report to compare with instead of the recording")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown reported as a regression")
+    parser.add_argument("--output", default="replay-results.json", help="where to write the JSON report")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="travel-replay-") as work_dir:
+        report = asyncio.run(replay(args, Path(work_dir) / "replayed.jsonl"))
+
+    reference = json.loads(Path(args.baseline).read_text()) if args.baseline else report["recording"]
+    report["comparison"] = {"against": args.baseline or "recording", **compare(report, reference, args.tolerance)}
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps({key: value for key, value in report.items() if key != "details"}, indent=2))
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
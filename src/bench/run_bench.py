@@ -0,0 +1,274 @@
+"""
+Offline end-to-end load test of the travel agent server.
+
+Starts the Open-Meteo stand-in, the five MCP servers and the agent server (with the
+scripted chat model, so no Azure OpenAI), drives `POST /` at a fixed concurrency and
+writes a JSON report with latency percentiles, throughput and a per-component
+breakdown taken from the server's `/metrics`. Reports from two releases can be
+diffed directly.
+
+    python run_bench.py --concurrency 8 --requests 200 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+AGENT_DIR = SRC_DIR / "agent"
+MCP_DIR = SRC_DIR / "mcp"
+
+# Directory, port and agent URL variable of each MCP server
+MCP_SERVERS = {
+    "attractions": ("attractions-mcp", 8008, "ATTRACTIONS_MCP_URL"),
+    "weather": ("weather-mcp", 8009, "WEATHER_MCP_URL"),
+    "packing_list": ("packing-suggestions-mcp", 8010, "PACKING_LIST_MCP_URL"),
+    "endorsements": ("endorsements-mcp", 8004, "ENDORSEMENTS_MCP_URL"),
+    "persist": ("persist-packing-list-mcp", 8011, "PERSIST_PACKING_LIST_MCP_URL")
+}
+
+DEFAULT_MESSAGES = [
+    "What is the weather like in Paris and what should I see?",
+    "What attractions can I visit in Rome?",
+    "What should I pack for a hike in Denver?",
+    "Show me the forecast for London",
+    "Who has endorsed this service?"
+]
+
+
+def wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout:g}s")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Prometheus text -> {"name{labels}": value}, skipping histogram buckets"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#") or "_bucket" in line:
+            continue
+        name, _, value = line.rpartition(" ")
+        samples[name] = float(value)
+    return samples
+
+
+def metric_delta(before: Dict[str, float], after: Dict[str, float], name: str) -> float:
+    return after.get(name, 0.0) - before.get(name, 0.0)
+
+
+def component_breakdown(before: Dict[str, float], after: Dict[str, float], completed: int) -> Dict[str, Any]:
+    """Calls and time per component over the measured run, from the server's metrics"""
+    prefix = "travel_agent_"
+
+    def timing(name: str, labels: str = "") -> Dict[str, Any]:
+        count = metric_delta(before, after, f"{prefix}{name}_count{labels}")
+        total = metric_delta(before, after, f"{prefix}{name}_sum{labels}")
+        return {
+            "calls": int(count),
+            "mean_seconds": round(total / count, 6) if count else 0.0,
+            "seconds_per_request": round(total / completed, 6) if completed else 0.0
+        }
+
+    tools = {}
+    for key in after:
+        if key.startswith(f"{prefix}tool_call_seconds_count{{"):
+            tool = key.split('tool="', 1)[1].split('"', 1)[0]
+            tools[tool] = timing("tool_call_seconds", f'{{tool="{tool}"}}')
+            failed = sum(
+                metric_delta(before, after, f'{prefix}tool_calls_total{{tool="{tool}",outcome="{outcome}"}}')
+                for outcome in ("error", "timeout")
+            )
+            tools[tool]["error_rate"] = round(failed / tools[tool]["calls"], 4) if tools[tool]["calls"] else 0.0
+
+    def tokens(kind: str) -> Dict[str, Any]:
+        count = metric_delta(before, after, f'{prefix}llm_call_tokens_count{{type="{kind}"}}')
+        total = metric_delta(before, after, f'{prefix}llm_call_tokens_sum{{type="{kind}"}}')
+        return {
+            "mean_per_call": round(total / count, 1) if count else 0.0,
+            "per_request": round(total / completed, 1) if completed else 0.0
+        }
+
+    return {
+        "agent_request": timing("request_seconds", '{outcome="ok"}'),
+        "llm": timing("llm_call_seconds"),
+        "llm_tokens": {"input": tokens("input"), "output": tokens("output")},
+        "step_wall": timing("step_wall_seconds"),
+        "admission_queue": timing("admission_queue_seconds"),
+        "tools": dict(sorted(tools.items()))
+    }
+
+
+async def drive_load(url: str, messages: List[str], total: int, concurrency: int, timeout: float) -> Dict[str, Any]:
+    """Send `total` requests with at most `concurrency` in flight; one session per virtual user"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+
+    async def user(client: httpx.AsyncClient) -> None:
+        nonlocal next_index
+        session_id = uuid.uuid4().hex
+        while next_index < total:
+            message = messages[next_index % len(messages)]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json={"message": message}, headers={"X-Session-Id": session_id})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "200":
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    return {
+        "duration_seconds": round(duration, 3),
+        "completed": len(latencies),
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / duration, 3) if duration else 0.0,
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 0.50), 6),
+            "p95": round(percentile(latencies, 0.95), 6),
+            "p99": round(percentile(latencies, 0.99), 6),
+            "mean": round(sum(latencies) / len(latencies), 6) if latencies else 0.0,
+            "max": round(max(latencies), 6) if latencies else 0.0
+        }
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start(command: List[str], cwd: Path, env: Dict[str, str], log_dir: Path, name: str) -> subprocess.Popen:
+    log = open(log_dir / f"{name}.log", "w")
+    return subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--requests", type=int, default=100, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests sent first")
+    parser.add_argument("--message", action="append", help="user message to send (repeatable)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the scripted model waits per call")
+    parser.add_argument("--weather-latency", type=float, default=0.0, help="seconds the Open-Meteo stand-in waits")
+    parser.add_argument("--agent-port", type=int, default=8000)
+    parser.add_argument("--stub-port", type=int, default=8099)
+    parser.add_argument("--python", default=sys.executable, help="interpreter for the servers")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the agent server")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", default="bench-results.json", help="where to write the JSON report")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="travel-bench-"))
+    stub_url = f"http://127.0.0.1:{args.stub_port}/v1"
+    env = {
+        **os.environ,
+        "WEATHER_BASE_URL": stub_url,
+        "GEOCODING_BASE_URL": stub_url,
+        "OPEN_METEO_STUB_LATENCY_SECONDS": str(args.weather_latency),
+        "PACKING_LIST_DB_PATH": str(work_dir / "persist-packing-list.md")
+    }
+    agent_env = {
+        **env,
+        "LLM_PROVIDER": "scripted",
+        "SCRIPTED_LLM_LATENCY_SECONDS": str(args.llm_latency),
+        "MCP_SCHEMA_CACHE_ENABLED": "false",
+        "LOG_SAMPLE_RATE": "0",
+        **{name: f"http://127.0.0.1:{port}/mcp" for _, port, name in MCP_SERVERS.values()},
+        **dict(item.split("=", 1) for item in args.env)
+    }
+
+    processes = []
+    try:
+        processes.append(start(
+            [args.python, "-m", "uvicorn", "open_meteo_stub:app", "--port", str(args.stub_port), "--log-level", "warning"],
+            Path(__file__).parent, env, work_dir, "open-meteo-stub"
+        ))
+        for name, (directory, _, _) in MCP_SERVERS.items():
+            processes.append(start([args.python, "main.py"], MCP_DIR / directory, env, work_dir, name))
+        wait_for_port(args.stub_port, 30)
+        for _, port, _ in MCP_SERVERS.values():
+            wait_for_port(port, 30)
+
+        processes.append(start(
+            [args.python, "-m", "uvicorn", "server:app", "--port", str(args.agent_port), "--log-level", "warning"],
+            AGENT_DIR, agent_env, work_dir, "agent"
+        ))
+        wait_for_port(args.agent_port, 120)
+        base_url = f"http://127.0.0.1:{args.agent_port}/"
+        messages = args.message or DEFAULT_MESSAGES
+
+        print(f"Warming up with {args.warmup} requests (logs in {work_dir})")
+        asyncio.run(drive_load(base_url, messages, args.warmup, min(args.concurrency, max(args.warmup, 1)), args.timeout))
+        before = parse_metrics(httpx.get(base_url + "metrics").text)
+
+        print(f"Sending {args.requests} requests at concurrency {args.concurrency}")
+        load = asyncio.run(drive_load(base_url, messages, args.requests, args.concurrency, args.timeout))
+        after = parse_metrics(httpx.get(base_url + "metrics").text)
+
+        report = {
+            "revision": git_revision(),
+            "config": {
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "llm_latency_seconds": args.llm_latency,
+                "weather_latency_seconds": args.weather_latency,
+                "messages": messages,
+                "agent_env": args.env
+            },
+            **load,
+            "components": component_breakdown(before, after, load["completed"])
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(json.dumps(report, indent=2))
+        print(f"Report written to {args.output}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
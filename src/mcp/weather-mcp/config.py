@@ -2,9 +2,12 @@
 Weather MCP configuration constants.
 """
 
+import os
+
 # Weather API configuration - Open-Meteo (free, no API key required)
-WEATHER_BASE_URL = "https://api.open-meteo.com/v1"
-GEOCODING_BASE_URL = "https://geocoding-api.open-meteo.com/v1"
+# Overridable so the server can be pointed at a local stand-in, e.g. for load tests
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "https://api.open-meteo.com/v1")
+GEOCODING_BASE_URL = os.getenv("GEOCODING_BASE_URL", "https://geocoding-api.open-meteo.com/v1")
 
 # Weather code descriptions (WMO Weather interpretation codes)
 WEATHER_CODES = {